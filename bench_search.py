@@ -0,0 +1,256 @@
+#!/usr/bin/env python2.7
+
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Offline benchmark of the search strategies in dats.search.
+
+The strategies are run against simulated SUTs instead of a testbed, so that
+the number of trials they need and the error of their result can be compared
+before choosing one with search_strategy or ramp_trial_budget.
+
+The SUTs are either synthetic, or derived from the trials recorded in the
+trials.jsonl file of a previous report directory:
+
+- throughput: a trial succeeds when the tested value is at most the capacity
+  of the SUT. Recorded capacities lie halfway between the highest successful
+  and the lowest failing value of each test and packet size.
+- ramp: the throughput and average latency curves of the SUT. Recorded curves
+  interpolate the ramp steps of each test and packet size.
+"""
+
+import sys
+import json
+import random
+import argparse
+from collections import defaultdict
+
+import dats.search as search
+import dats.utils as utils
+
+
+def synthetic_capacities(args):
+    return [('capacity {:g}'.format(capacity), capacity, args.duration)
+            for capacity in args.capacities]
+
+
+def recorded_trials(filename):
+    """Group the trials of a trials.jsonl file by test and packet size."""
+    groups = defaultdict(list)
+    with open(filename, 'r') as trials_file:
+        for line in trials_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            # Skip the timings of the test phases, only trials have a key
+            if 'key' not in entry:
+                continue
+            groups['{} {}B'.format(entry['test_class'], entry['pkt_size'])].append(entry)
+
+    return sorted(groups.items())
+
+
+def recorded_capacities(args):
+    capacities = []
+    for name, entries in recorded_trials(args.trials):
+        failures = [entry['value'] for entry in entries if not entry['trial'][0]]
+        upper = min(failures) if failures else 100.0
+        successes = [entry['value'] for entry in entries if entry['trial'][0] and entry['value'] < upper]
+        lower = max(successes) if successes else 0.0
+        duration = sum(entry['elapsed'] for entry in entries) / len(entries)
+        capacities.append((name, (lower + upper) / 2, duration))
+
+    return capacities
+
+
+def bench_throughput(args):
+    if args.trials is not None:
+        suts = recorded_capacities(args)
+    else:
+        suts = synthetic_capacities(args)
+
+    names = args.strategies or sorted(search.strategies)
+    table = [['Strategy', 'Mean trials', 'Max trials', 'Mean error (%)',
+              'Max error (%)', 'Mean time (s)']]
+    if not suts:
+        return table
+
+    for name in names:
+        n_trials = []
+        errors = []
+        times = []
+        for _, capacity, duration in suts:
+            for _ in range(args.runs):
+                strategy = search.get_strategy(name, 0.0, 100.0, args.precision)
+                trials = 0
+                while not strategy.done():
+                    value = strategy.propose()
+                    strategy.observe(value, value <= capacity + random.gauss(0, args.noise))
+                    trials += 1
+
+                n_trials.append(trials)
+                errors.append(abs(capacity - strategy.value()))
+                times.append(trials * duration)
+
+        table.append([
+            name,
+            "{:.1f}".format(float(sum(n_trials)) / len(n_trials)),
+            max(n_trials),
+            "{:.2f}".format(sum(errors) / len(errors)),
+            "{:.2f}".format(max(errors)),
+            "{:.1f}".format(sum(times) / len(times))])
+
+    return table
+
+
+def interpolate(points, x):
+    """Linearly interpolate the (x, (y, ...)) points, sorted by x, at x."""
+    for i in range(len(points) - 1):
+        (x0, ys0), (x1, ys1) = points[i], points[i + 1]
+        if x0 <= x <= x1:
+            t = (x - x0) / (x1 - x0) if x1 > x0 else 0.0
+            return tuple(y0 + (y1 - y0) * t for y0, y1 in zip(ys0, ys1))
+
+    return points[0][1] if x < points[0][0] else points[-1][1]
+
+
+def synthetic_curves(args):
+    curves = []
+    for knee in args.capacities:
+        # Throughput saturates at the knee, where latency starts to climb.
+        points = [(x, (min(x, knee), 1000 + max(0.0, x - knee + 5) ** 2 * 100))
+                  for x in [i / 4.0 for i in range(401)]]
+        curves.append(('knee {:g}'.format(knee), points, args.duration))
+
+    return curves
+
+
+def recorded_curves(args):
+    curves = []
+    for name, entries in recorded_trials(args.trials):
+        points = {}
+        for entry in entries:
+            trial = entry['trial']
+            if len(trial) < 4:
+                continue
+            lat_avg = [lat for lat in trial[3]['latency_avg'] if lat > 0] or [0.0]
+            points[entry['value']] = (trial[1], sum(lat_avg) / len(lat_avg))
+        if len(points) < 2:
+            continue
+        duration = sum(entry['elapsed'] for entry in entries) / len(entries)
+        curves.append((name, sorted(points.items()), duration))
+
+    return curves
+
+
+def bench_ramp(args):
+    if args.trials is not None:
+        curves = recorded_curves(args)
+    else:
+        curves = synthetic_curves(args)
+
+    table = [['Strategy', 'Curve', 'Trials', 'Mean error (%)', 'Max error (%)']]
+    for name, points, duration in curves:
+        start, end = points[0][0], points[-1][0]
+        step = (end - start) / (args.budget - 1)
+        strategies = [
+            # Half a step of margin keeps rounding errors from dropping the last step
+            ('linear', search.LinearStrategy(start, step, end + step / 2)),
+            ('adaptive', search.AdaptiveRampStrategy(start, args.budget, args.precision, end)),
+        ]
+        scales = [max(abs(ys[metric]) for _, ys in points) or 1.0 for metric in range(2)]
+        for strategy_name, strategy in strategies:
+            measured = []
+            while not strategy.done():
+                value = strategy.propose()
+                ys = interpolate(points, value)
+                strategy.observe(value, True, ys)
+                measured.append((value, ys))
+            measured.sort()
+
+            # Error of the curves reconstructed from the measured steps,
+            # relative to the maximum of each curve.
+            errors = []
+            for x, ys in points:
+                estimate = interpolate(measured, x)
+                errors += [abs(e - y) / scale * 100 for e, y, scale in zip(estimate, ys, scales)]
+
+            table.append([
+                strategy_name, name, len(measured),
+                "{:.2f}".format(sum(errors) / len(errors)),
+                "{:.2f}".format(max(errors))])
+
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dataplane Automated Testing System Search Strategy Benchmark")
+
+    parser.add_argument('mode', choices=['throughput', 'ramp'],
+                        help='Benchmark the strategies searching the maximum throughput, or the ramp strategies.')
+    parser.add_argument('-t', '--trials', metavar='FILE',
+                        help='Derive the SUTs from the trials.jsonl file of a report instead of synthetic SUTs.')
+    parser.add_argument('-s', '--strategy', action='append', dest='strategies', choices=sorted(search.strategies),
+                        help='Throughput strategy to benchmark. Can be repeated. All strategies by default.')
+    parser.add_argument('-c', '--capacities', type=float, nargs='+', default=[10, 30, 50, 70, 90, 99.5],
+                        help='Capacities (throughput) or knees (ramp) of the synthetic SUTs, in percent of line rate.')
+    parser.add_argument('-p', '--precision', type=float, default=1.0,
+                        help='test_precision to benchmark with.')
+    parser.add_argument('-n', '--noise', type=float, default=0.0,
+                        help='Standard deviation of the capacity between trials, in percent of line rate.')
+    parser.add_argument('-r', '--runs', type=int, default=1,
+                        help='Number of searches per SUT, useful with noise.')
+    parser.add_argument('-d', '--duration', type=float, default=5.0,
+                        help='Duration of a synthetic trial, in seconds.')
+    parser.add_argument('-b', '--budget', type=int, default=12,
+                        help='ramp_trial_budget to benchmark the ramp strategies with.')
+
+    args = parser.parse_args()
+
+    if args.mode == 'throughput':
+        table = bench_throughput(args)
+    else:
+        table = bench_ramp(args)
+
+    if len(table) == 1:
+        print("No SUTs to benchmark against in '" + args.trials + "'")
+        return 1
+
+    print(utils.text_table(table))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -48,9 +48,20 @@ import json
 import dats.config as config
 from dats.doc import res_table
 import dats.remote_control as rc
+import dats.trialcache as trialcache
+import dats.db as db
+import dats.regression as regression
+import dats.htmlreport as htmlreport
+import dats.resultsfile as resultsfile
+import dats.timing as timing
+import dats.trace as trace
+import dats.replay as replay
+import dats.scheduler as scheduler
+import dats.planner as planner
 import dats.test
 from dats.test.base import TestBase
 import dats.rstgen as rst
+import dats.report as report
 
 
 
@@ -81,6 +92,16 @@ def parse_cmdline():
         default=datetime.now().strftime('dats-report-%Y%m%d_%H%M%S/'),
         metavar='DIRECTORY', dest='report_dir',
         help='Where to save the report. A new directory with timestamp in its name is created by default.')
+    parser.add_argument('--resume', action='store_true',
+        help='Resume an interrupted run in the report directory given with -r. Trials that completed already are not measured again.')
+    parser.add_argument('--estimate', action='store_true',
+        help='Estimate how long the test run takes, based on previous runs, and exit')
+    parser.add_argument('--time-budget', metavar='DURATION', dest='time_budget',
+        help='Adjust the precision, test duration and packet sizes so the test run fits in DURATION, e.g. 8h or 90m')
+    parser.add_argument('--replay', nargs='+', metavar='TRACE',
+        help='Run the tests offline against PROX traces recorded with prox_trace in a previous run, instead of the testbed')
+    parser.add_argument('--replay-lenient', action='store_true', dest='replay_lenient',
+        help='Keep replaying when the tests send other commands than the recording, serving the recorded replies in order')
     parser.add_argument('-v', '--verbose', action='store_true',
         help='Verbose output - set log level of screen to VERBOSE instead of INFO')
     parser.add_argument(
@@ -170,6 +191,28 @@ def execute_inf_commands(sut_inf_commands, sut_information):
                     current_line = line
             sut_information.append([label, str(nlines) + "x " + re.escape(line).replace('\ ', ' ')])
 
+def load_test_classes(test, test_file):
+    """Load a test script and return the test classes it defines.
+
+    Args:
+        test (str): The name of the test.
+        test_file (str): The path of the test script.
+
+    Returns:
+        [class]. The classes defined in the test script that are derived
+        from TestBase.
+    """
+    # Load test script directly from disk
+    test_module = imp.load_source(test, test_file)
+
+    # Get all classes defined in test_module. Filter out imported classes and
+    # classes that are not derived from DATSTest.
+    test_classes = [c[1] for c in inspect.getmembers(test_module, inspect.isclass)]
+    test_classes = [c for c in test_classes if c.__module__ == test_module.__name__]
+    test_classes = [c for c in test_classes if issubclass(c, TestBase)]
+
+    return test_classes
+
 def main():
     print "Dataplane Automated Testing System, version " + __version__
     print "Copyright (c) 2015-2016, Intel Corporation. All rights reserved."
@@ -190,6 +233,61 @@ def main():
         print "Tests in directory " + args.tests_dir + ": " + ' '.join(sorted(all_tests.keys()))
         sys.exit(0)
 
+    if args.replay:
+        replay.install(args.replay, args.replay_lenient)
+
+
+    # Determine which tests to run. These locations are checked in order, the
+    # first non-empty result is used:
+    # - command line: test names specified as parameters
+    # - config file: test names specified in the [general] section, key 'tests'
+    # - all tests in the directory specified on the command line with -d
+    # - all tests in directory tests/
+    tests_to_run = args.test
+
+    if tests_to_run is not None and len(tests_to_run) == 0:
+        logging.debug("No test specified on the command line. Checking config file")
+        tests_to_run = config.getOption('tests')
+        if tests_to_run is not None:
+            tests_to_run = tests_to_run.split(',')
+
+    if tests_to_run is None:
+        logging.debug("No test specified in the config file. Running all tests from " + args.tests_dir)
+        tests_to_run = sorted(all_tests.keys())
+
+    logging.debug("Tests to run: '%s'", "', '".join(tests_to_run))
+
+    if args.estimate or args.time_budget is not None:
+        tests = [test_class() for test in tests_to_run if test in all_tests.keys()
+                for test_class in load_test_classes(test, all_tests[test])]
+        history = planner.load_history(args.report_dir)
+        n_testbeds = max(len(config.getTestbeds()), 1)
+
+        if args.time_budget is not None:
+            planner.fit_budget(tests, history, planner.parse_duration(args.time_budget), n_testbeds)
+
+        total, per_class = planner.estimate(tests, history, n_testbeds)
+        for test, seconds in zip(tests, per_class):
+            logging.info("Estimated duration of %s: %s", test.short_descr(), planner.format_duration(seconds))
+        logging.info("Estimated duration of the test run: %s", planner.format_duration(total))
+
+        if args.estimate:
+            sys.exit(0)
+
+    testbeds = config.getTestbeds()
+    if testbeds:
+        # The testbeds in the pool are identical, describe the SUT of the
+        # first one.
+        default_configuration = dict(config.configuration)
+        config.useTestbed(testbeds[0])
+
+    if not os.path.exists(args.report_dir):
+        os.makedirs(args.report_dir)
+
+    # The trace starts before the SUT information is retrieved, so a replay
+    # gets the output of these commands from the recording as well
+    if int(config.getOption('proxTrace')) and not args.replay:
+        trace.open_trace(args.report_dir + '/' + 'prox_trace.jsonl')
 
     # SUT information
     sut_information_hw = [["Hardware"]]
@@ -240,38 +338,30 @@ def main():
     logging.info("Retrieving SUT software description")
     execute_inf_commands(sut_inf_commands_sw, sut_information_sw)
 
+    if testbeds:
+        config.configuration.update(default_configuration)
 
-    ### Main program
-    if not os.path.exists(args.report_dir):
-        os.makedirs(args.report_dir)
-
-    # update the parameters.lua file to use the correct CPU socket
-    os.system("sed -i 's/tester_socket_id=.*/tester_socket_id=\"" + str(config.getOption('testerSocketId')) + "\"/' " \
-            + args.tests_dir + "/prox-configs/parameters.lua")
-    os.system("sed -i 's/sut_socket_id=.*/sut_socket_id=\"" + str(config.getOption('sutSocketId')) + "\"/' " \
-            + args.tests_dir + "/prox-configs/parameters.lua")
 
-    # Determine which tests to run. These locations are checked in order, the
-    # first non-empty result is used:
-    # - command line: test names specified as parameters
-    # - config file: test names specified in the [general] section, key 'tests'
-    # - all tests in the directory specified on the command line with -d
-    # - all tests in directory tests/
-    tests_to_run = args.test
-
-    if tests_to_run is not None and len(tests_to_run) == 0:
-        logging.debug("No test specified on the command line. Checking config file")
-        tests_to_run = config.getOption('tests')
-        if tests_to_run is not None:
-            tests_to_run = tests_to_run.split(',')
-
-    if tests_to_run is None:
-        logging.debug("No test specified in the config file. Running all tests from " + args.tests_dir)
-        tests_to_run = sorted(all_tests.keys())
-
-    logging.debug("Tests to run: '%s'", "', '".join(tests_to_run))
+    ### Main program
+    # Every trial is recorded in the report directory as soon as it completes,
+    # so an interrupted run can be resumed.
+    trialcache.open_cache(args.report_dir + '/' + 'trials.jsonl', args.resume)
+
+    # Results are only compared with earlier runs on the same SUT
+    sut_fingerprint = regression.fingerprint(sut_information_hw)
+    # Replayed results are not real measurements, keep them out of the
+    # history that runs are compared with
+    if config.getOption('resultsDb') is not None and not args.replay:
+        db.open_db(config.getOption('resultsDb'))
+        db.start_run(args.report_dir, __version__, config.configuration)
+        db.set_fingerprint(sut_fingerprint, sut_information_sw)
+
+    # The report of each test is generated while the next test runs
+    report.start(args.report_dir)
 
     test_summaries = []
+    # Test classes to run in parallel on the pool of testbeds
+    parallel_classes = []
     for test in tests_to_run:
         if test not in all_tests.keys():
             logging.error("Test '%s' not found. Use the '-l' command line parameter, possibly with '-d' to see the list of available tests.", test)
@@ -279,30 +369,33 @@ def main():
 
         logging.info("Loading test suite %s", test)
 
-        # Load test script directly from disk
-        test_module = imp.load_source(test, all_tests[test])
+        test_classes = load_test_classes(test, all_tests[test])
 
-        # Get all classes defined in test_module. Filter out imported classes and
-        # classes that are not derived from DATSTest.
-        test_classes = [c[1] for c in inspect.getmembers(test_module, inspect.isclass)]
-        test_classes = [c for c in test_classes if c.__module__ == test_module.__name__]
-        test_classes = [c for c in test_classes if issubclass(c, TestBase)]
+        if testbeds:
+            parallel_classes += [(test, all_tests[test], c) for c in test_classes]
+            continue
 
         for test_class in test_classes:
             test = test_class()
             logging.info("Running test %s - %s",
                     test.__class__.__name__, test.short_descr())
 
+            test_id = db.add_test(test)
+            db.set_test(test_id)
+            timing.set_test(test)
+
             test_results = None
             try:
-                test.setup_class()
-                test_results = test.run_all_tests()
-                test.teardown_class()
+                test_results = test.run()
                 logging.trace('Test results: %s', test_results)
                 test_summaries.append(dict(test=test, results=test_results))
+                report.submit(test, test_results)
             except KeyboardInterrupt:
                 logging.error("Test run interrupted by keyboard. Generating partial report.")
-                test_summaries.append(dict(test=test, results=Exception('Test run interrupted by user')))
+                test_results = Exception('Test run interrupted by user')
+                test_summaries.append(dict(test=test, results=test_results))
+                report.submit(test, test_results)
+                db.finish_test(test_id, test, test_results)
                 break
             except IOError, ex:
                 logging.error("I/O error ({0}): {1}: {2}".format(ex.errno, ex.filename, ex.strerror))
@@ -310,6 +403,19 @@ def main():
             except Exception, ex:
                 logging.error(ex)
                 logging.debug("Exception: %s", traceback.format_exc())
+                test_results = ex
+
+            db.finish_test(test_id, test, test_results)
+        timing.set_test(None)
+
+    if parallel_classes:
+        test_summaries = scheduler.run_parallel(parallel_classes, testbeds)
+        for summary in test_summaries:
+            if 'test' in summary:
+                report.submit(summary['test'], summary['results'], summary.get('testbeds'))
+
+    with timing.phase('wait_for_reports'):
+        fragments = report.finish()
 
     logging.info("--------------------------------------------------------------------------------")
     logging.info("Test summary")
@@ -320,13 +426,33 @@ def main():
             logging.info("%s: %s", test.short_descr(), test.kpi())
         else:
             logging.info("%s: %s", str(test['name']), str(test['kpi']))
+    timing.log_summary()
     logging.info("--------------------------------------------------------------------------------")
 
+    regressions = None
+    if db.is_open():
+        logging.info("Comparing results with earlier runs")
+        regressions = regression.detect(sut_fingerprint)
+        for comparison in regressions['comparisons']:
+            if comparison['status'] == 'regression':
+                logging.warning("Regression in %s: %.2f instead of %.2f (%+.2f%%)", comparison['test'],
+                        comparison['current'], comparison['baseline'], comparison['change'])
+    else:
+        logging.info("No results database configured, skipping regression detection")
+
     # Generate reStructuredText summary
     summary_fh = open(args.report_dir + '/' + 'summary.rst', 'w')
-    summary_fh.write('.. role:: problematic\n\n')
-    summary_fh.write(rst.section('Dataplane Characterization Report', '#', True))
-    summary_fh.write("This report was generated by DATS v" + __version__ + " (Dataplane Automated Testing System).\n\n")
+    summary_rst = rst.Writer(summary_fh)
+    summary_rst.write('.. role:: problematic\n\n')
+    summary_rst.section('Dataplane Characterization Report', '#', True)
+    summary_rst.write("This report was generated by DATS v" + __version__ + " (Dataplane Automated Testing System).\n\n")
+
+    if regressions is not None:
+        summary_rst.write(regression.generate_report(regressions))
+
+    if replay.recording is not None and replay.recording.divergences:
+        summary_rst.write(":problematic:`This run replayed a recording and diverged from it {} times.` "
+                "The results are not measurements of the commands that were sent.\n\n".format(replay.recording.divergences))
 
     summ_table = [['Test Name', 'KPI']]
     for summary in test_summaries:
@@ -343,66 +469,68 @@ def main():
             kpi = test.kpi()
         summ_table.append(['`' + test.short_descr() + '\\ `_', kpi])
 
-    summary_fh.write(rst.section('Executed tests', '*', True))
-    summary_fh.write(rst.simple_table(summ_table))
-    summary_fh.write("The tolerated packet loss for these tests was {:g}%.\n\n".format(float(config.getOption('toleratedLoss'))))
-
-    summary_fh.write(rst.section('System Under Test information', '*', True))
-    summary_fh.write(rst.simple_table(sut_information_hw))
-    summary_fh.write(rst.simple_table(sut_information_sw))
+    summary_rst.section('Executed tests', '*', True)
+    summary_rst.simple_table(summ_table)
+    summary_rst.write("The tolerated packet loss for these tests was {:g}%.\n\n".format(float(config.getOption('toleratedLoss'))))
+    if args.time_budget is not None:
+        summary_rst.write("To fit the time budget of {}, the tests used a precision of {:g}%, a test duration of {:g} s and packet sizes {}.\n\n".format(
+                args.time_budget, float(config.getOption('testPrecision')),
+                float(config.getOption('testDuration')), config.getOption('pktSizes')))
 
-    summary_fh.write(rst.section('Test Details', '*', True))
-    test_id = 0
-    logging.debug("All test results: %s", test_summaries)
-    for summary in test_summaries:
-        if 'test' in summary:
-            test = summary['test']
+    summary_rst.section('System Under Test information', '*', True)
+    summary_rst.simple_table(sut_information_hw)
+    summary_rst.simple_table(sut_information_sw)
 
-            summary_fh.write(rst.section(test.short_descr(), '='))
+    summary_rst.section('Test Details', '*', True)
+    for fragment in fragments:
+        summary_rst.write(fragment['rst'])
 
-            # Double newlines in description for proper paragraph formatting
-            summary_fh.write(rst.section('Description', '-'))
-            summary_fh.write(test.long_descr().replace('\n', '\n\n'))
-            summary_fh.write('\n\n')
-
-            report_prefix = 't' + str(test_id) + '_' + re.sub('[^a-zA-Z0-9]', '_', test.__module__) + '_'
-            summary_fh.write(rst.section('Result', '-'))
-            if isinstance(summary['results'], Exception):
-                summary_fh.write('**Error while running test:** {}\n\n'.format(str(summary['results'])))
-            else:
-                summary_fh.write(test.generate_report(summary['results'], report_prefix, args.report_dir + '/'))
+    summary_rst.write(timing.generate_report())
     summary_fh.close()
 
 
-    csv_file = open(args.report_dir + '/' + 'data.csv', 'w')
-    for summary in test_summaries:
-        if 'test' in summary:
-            test = summary['test']
-            csv_file.write(test.short_descr() + "\n")
-            if not isinstance(summary['results'], Exception):
-                csv_file.write(test.generate_csv(summary['results']))
-    csv_file.close()
+    report.write_file(args.report_dir + '/' + 'data.csv',
+            ''.join(fragment['csv'] for fragment in fragments))
 
-    json_file = open(args.report_dir + '/' + 'summary.json', 'w')
     results_dict = dict()
-    for summary in test_summaries:
-        if 'test' in summary:
-            test = summary['test']
-            if not isinstance(summary['results'], Exception):
-                results_dict[test.short_descr()] = test.generate_json(summary['results'])
-    json_file.write(json.dumps(results_dict))
-    json_file.close()
+    for fragment in fragments:
+        if fragment['json'] is not None:
+            results_dict[fragment['test'].short_descr()] = fragment['json']
+    if regressions is not None:
+        results_dict['Regressions'] = regression.generate_json(regressions)
+    results_dict['TimeBreakdown'] = timing.generate_json()
+    report.write_file(args.report_dir + '/' + 'summary.json', json.dumps(results_dict))
+    resultsfile.save(args.report_dir + '/' + 'results.npz', fragments,
+            args.report_dir + '/' + 'trials.jsonl')
 
     # TODO More output formats
-    os.system('rst2html ' + args.report_dir + '/' + 'summary.rst ' + args.report_dir + '/' + 'summary.html')
-    os.system('rst2pdf -q ' + args.report_dir + '/' + 'summary.rst ' + args.report_dir + '/' + 'summary.pdf')
-
+    with timing.phase('convert_report'):
+        report.convert(args.report_dir + '/' + 'summary.rst')
+    if db.is_open():
+        htmlreport.generate(db.current_run(), args.report_dir + '/' + 'interactive.html',
+                int(config.getOption('htmlReportPoints')))
+    elif args.replay:
+        logging.info("Replayed runs are not stored in the results database, not writing interactive.html")
+    else:
+        logging.info("No results database configured, not writing interactive.html")
+
+
+    trialcache.close_cache()
+    trace.close_trace()
+    diverged = replay.recording is not None and replay.recording.divergences > 0
+    if diverged:
+        logging.error("The replay diverged %d times from the recording", replay.recording.divergences)
+    db.finish_run()
+    db.close_db()
 
     logging.info("Report generated in %s", args.report_dir)
 
     ### Flush buffer to logfile
     logging.shutdown()
 
+    if diverged:
+        sys.exit(1)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,264 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module compares the results of any number of runs, like the same tests
+# on two kernels or two DPDK versions. A run is a report directory or a run in
+# the results database.
+#
+# The measurements of all runs are loaded in a single columnar res_table and
+# aligned on test, packet size and, for tests with several results per packet
+# size like the ramp tests, the value tested with. Every run is compared with
+# the first one. When both measurements were repeated, Welch's t-test tells
+# whether the difference is significant.
+
+import os
+import json
+import logging
+from collections import OrderedDict
+
+import dats.stats as stats
+import dats.plot as plot
+import dats.rstgen as rst
+import dats.resultsfile as resultsfile
+from dats.res_table import res_table
+
+
+COLUMNS = ['run', 'test', 'pkt_size', 'value', 'measurement', 'stddev', 'repetitions']
+
+
+def _number(value):
+    """Return value as a float, None when it is missing or NaN."""
+    if value is None or value == '':
+        return None
+    value = float(value)
+    return None if value != value else value
+
+
+def _add_rows(table, run, rows):
+    """Add the measurements of a run to the table.
+
+    The value is only kept for tests with several results per packet size,
+    see dats.db.measurements().
+
+    Args:
+        rows ([(test, pkt_size, value, measurement, stddev, repetitions)]).
+    """
+    counts = {}
+    for row in rows:
+        counts[row[:2]] = counts.get(row[:2], 0) + 1
+    for test, pkt_size, value, measurement, stddev, repetitions in rows:
+        if counts[(test, pkt_size)] == 1:
+            value = None
+        table.add_row([run, test, pkt_size, value, measurement, stddev, repetitions])
+
+
+def _report_rows(report_dir):
+    """Return the measurements in a report directory.
+
+    Uses results.npz when it is there and NumPy is installed, summary.json
+    otherwise.
+    """
+    rows = []
+    npz = os.path.join(report_dir, 'results.npz')
+    if os.path.isfile(npz) and resultsfile.available():
+        tables, meta = resultsfile.load(npz)
+        for name, columns in tables.items():
+            if name == resultsfile.TRIALS or 'measurement' not in columns:
+                continue
+            descr = meta['tables'][name]['descr']
+            values = columns.get('test_value', columns.get('value'))
+            for i in range(len(columns['measurement'])):
+                rows.append((descr, int(columns['pkt_size'][i]),
+                        _number(values[i]) if values is not None else None,
+                        _number(columns['measurement'][i]),
+                        _number(columns['stddev'][i]) if 'stddev' in columns else None,
+                        int(columns['repetitions'][i]) if 'repetitions' in columns else None))
+        return rows
+
+    with open(os.path.join(report_dir, 'summary.json')) as fh:
+        summary = json.load(fh)
+    for descr, results in summary.items():
+        if not isinstance(results, dict):
+            continue
+        for result in results.values():
+            if not isinstance(result, dict) or 'Throughput(Mpps)' not in result:
+                continue
+            rows.append((descr, int(result['PacketSize(B)']),
+                    _number(result.get('TestValue(%)')),
+                    _number(result['Throughput(Mpps)']),
+                    _number(result.get('Stddev(Mpps)')),
+                    int(result['Repetitions']) if 'Repetitions' in result else None))
+    return rows
+
+
+def _db_rows(connection, run):
+    """Return the measurements of a run in the results database."""
+    rows = []
+    for descr, pkt_size, value, measurement, data in connection.execute(
+            'SELECT tests.descr, results.pkt_size, results.value, results.measurement, results.data '
+            'FROM tests JOIN results ON results.test_id = tests.id WHERE tests.run_id = ?', (run,)):
+        result = json.loads(data) if data else {}
+        rows.append((descr, pkt_size, value, measurement,
+                _number(result.get('stddev')), result.get('repetitions')))
+    return rows
+
+
+def load(sources, connection=None):
+    """Load the measurements of the runs to compare.
+
+    Args:
+        sources ([str or int]): Report directories, or ids of runs in the
+            results database.
+        connection (sqlite3.Connection): The results database, needed for
+            run ids.
+
+    Returns:
+        res_table. The measurements with the columns in COLUMNS, run being
+        the index of the source.
+    """
+    table = res_table(COLUMNS)
+    for run, source in enumerate(sources):
+        if isinstance(source, (int, long)):
+            if connection is None:
+                raise ValueError("Comparing run {} needs the results database".format(source))
+            rows = _db_rows(connection, source)
+        else:
+            rows = _report_rows(source)
+        if not rows:
+            logging.warning("No measurements found in %s", source)
+        _add_rows(table, run, rows)
+    return table
+
+
+def compare(table, n_runs):
+    """Align the measurements of the runs and compare them with the first run.
+
+    Args:
+        table (res_table): The measurements, as returned by load().
+        n_runs (int): The number of runs.
+
+    Returns:
+        OrderedDict. {test: [{pkt_size, value, measurements, changes,
+        significant}]}, the tests and their rows sorted. measurements holds
+        the measurement of every run, None when it is missing. changes and
+        significant hold, for every run, the change from the first run in
+        percent and whether it is significant, None when unknown.
+    """
+    aligned = {}
+    for run, test, pkt_size, value, measurement, stddev, repetitions in zip(*table.get_cols()):
+        row = aligned.setdefault((test, pkt_size, value), [None] * n_runs)
+        row[run] = (measurement, stddev, repetitions)
+
+    comparison = OrderedDict()
+    for (test, pkt_size, value), runs in sorted(aligned.items()):
+        base = runs[0]
+        changes = []
+        significant = []
+        for other in runs:
+            if base is None or other is None or not base[0] or other[0] is None:
+                changes.append(None)
+                significant.append(None)
+                continue
+            changes.append(100.0 * (other[0] - base[0]) / base[0])
+            significant.append(stats.significant_difference(base, other))
+        comparison.setdefault(test, []).append(dict(pkt_size=pkt_size, value=value,
+                measurements=[run[0] if run is not None else None for run in runs],
+                changes=changes, significant=significant))
+    return comparison
+
+
+def cells(row):
+    """Format the measurements of a row of compare().
+
+    Returns:
+        [str]. The measurement of every run, followed by the change from the
+        first run and a * when the change is significant.
+    """
+    formatted = []
+    for run, measurement in enumerate(row['measurements']):
+        if measurement is None:
+            formatted.append('-')
+            continue
+        cell = '{:.2f}'.format(measurement)
+        if run > 0 and row['changes'][run] is not None:
+            cell += ' ({:+.2f}%{})'.format(row['changes'][run], '*' if row['significant'][run] else '')
+        formatted.append(cell)
+    return formatted
+
+
+def generate_report(comparison, labels, sources, report_dir):
+    """Write the comparison report: comparison.rst, its figures and comparison.json.
+
+    Args:
+        comparison (OrderedDict): As returned by compare().
+        labels ([str]): The name of every run.
+        sources ([str]): Where every run was loaded from.
+        report_dir (str): The directory to write the report in.
+
+    Returns:
+        str. The path of comparison.rst.
+    """
+    if not os.path.exists(report_dir):
+        os.makedirs(report_dir)
+
+    filename = os.path.join(report_dir, 'comparison.rst')
+    with open(filename, 'w') as fh:
+        report = rst.Writer(fh)
+        report.section('Comparison Report', '#', True)
+        report.simple_table([['Run', 'Source']] + [[label, str(source)] for label, source in zip(labels, sources)])
+        report.write("Every run is compared with {}. Changes marked with * are significant at a "
+                     "95% confidence level, according to Welch's t-test on the repeated "
+                     "measurements.\n\n".format(labels[0]))
+
+        for index, (test, rows) in enumerate(comparison.items()):
+            report.section(test, '=')
+            ramp = any(row['value'] is not None for row in rows)
+            table = [['Packet size (B)'] + (['Value'] if ramp else []) + labels]
+            figure = [['Packet size (B)'] + labels]
+            for row in rows:
+                name = [row['pkt_size']] + (['{:g}'.format(row['value'])] if ramp else [])
+                table.append(name + cells(row))
+                figure.append([' / '.join(str(n) for n in name)] + [m or 0 for m in row['measurements']])
+            report.simple_table(table)
+
+            image = 'comparison_{}.png'.format(index)
+            plot.bar_plot(figure, os.path.join(report_dir, image), 'Throughput (Mpps)')
+            report.image(image)
+
+    plot.render()
+
+    with open(os.path.join(report_dir, 'comparison.json'), 'w') as fh:
+        json.dump(dict(runs=[dict(label=label, source=str(source)) for label, source in zip(labels, sources)],
+                       tests=comparison), fh)
+
+    return filename
@@ -45,14 +45,37 @@ configurationOptions = (
     ( 'pktSizes',       'general',  'pkt_sizes', '64,128,256,512,1024,1280,1518' ),
     ( 'testDuration',   'general',  'test_duration', 5.0 ),
     ( 'testPrecision',  'general',  'test_precision', 1.0 ),
+    ( 'searchStrategy', 'general',  'search_strategy', 'binary' ),
+    ( 'probeDuration',  'general',  'probe_duration', None ),
+    ( 'soakDuration',   'general',  'soak_duration', None ),
+    ( 'repetitions',    'general',  'repetitions', 1 ),
+    ( 'minRepetitions', 'general',  'min_repetitions', 3 ),
+    ( 'confidenceWidth', 'general', 'confidence_width', None ),
+    ( 'repeatMode',     'general',  'repeat_mode', 'search' ),
+    ( 'latencyMaxAvg',  'general',  'latency_max_avg', None ),
+    ( 'latencyMax',     'general',  'latency_max', None ),
+    ( 'rampTrialBudget', 'general', 'ramp_trial_budget', None ),
     ( 'tests',          'general',  'tests',     None ),
     ( 'toleratedLoss',  'general',  'tolerated_loss', 0.0),
+    ( 'warmTrials',     'general',  'warm_trials', 0 ),
+    ( 'schedule',       'general',  'schedule',  'class' ),
+    ( 'resultsDb',      'general',  'results_db', None ),
+    ( 'counterSamples', 'general',  'counter_samples', 0 ),
+    ( 'plotBackend',    'general',  'plot_backend', 'auto' ),
+    ( 'baselineRuns',   'general',  'baseline_runs', 5 ),
+    ( 'minBaselineRuns', 'general', 'min_baseline_runs', 3 ),
+    ( 'regressionThreshold', 'general', 'regression_threshold', 2.0 ),
+    ( 'htmlReportPoints', 'general', 'html_report_points', 1000 ),
+    ( 'earlyAbort',     'general',  'early_abort', 0 ),
+    ( 'earlyAbortInterval', 'general', 'early_abort_interval', 0.5 ),
+    ( 'earlyAbortSlack', 'general', 'early_abort_slack', 0.01 ),
 
     ( 'logFile',        'logging',  'file',      'dats.log' ),
     ( 'logFormat',      'logging',  'format',    "%(asctime)-15s %(levelname)-8s %(filename)20s:%(lineno)-3d %(message)s" ),
     ( 'logDateFormat',  'logging',  'datefmt',   None ),
     ( 'logLevel',       'logging',  'level',     'INFO' ),
     ( 'logOverwrite',   'logging',  'overwrite', 1 ),
+    ( 'proxTrace',      'logging',  'prox_trace', 0 ),
 
     ( 'testerIp',       'tester',   'ip',        None ),
     ( 'testerUser',     'tester',   'user',      'root' ),
@@ -73,7 +96,16 @@ configurationOptions = (
 )
 
 
+# Options that can be set per testbed in [testbed:NAME] sections, with the
+# section of the option prepended to the key, e.g. tester_ip or sut_prox_dir
+testbedOptions = (
+    'testerIp', 'testerUser', 'testerDpdkDir', 'testerDpdkTgt', 'testerProxDir', 'testerSocketId',
+    'sutIp', 'sutUser', 'sutDpdkDir', 'sutDpdkTgt', 'sutProxDir', 'sutSocketId',
+)
+
+
 configuration = {}
+testbeds = []
 cmdline_args = None
 
 
@@ -92,10 +124,38 @@ def parseFile(filename):
         else:
             configuration[ option[0] ] = option[3]
 
+    del testbeds[:]
+    for section in config_parser.sections():
+        if not section.startswith('testbed:'):
+            continue
+
+        testbed = dict(name=section[len('testbed:'):])
+        for option in configurationOptions:
+            key = option[1] + '_' + option[2]
+            if option[0] in testbedOptions and config_parser.has_option(section, key):
+                testbed[ option[0] ] = config_parser.get(section, key)
+        testbeds.append(testbed)
+
 
 def getOption(option):
     return configuration[option]
 
+def getTestbeds():
+    """Return the testbeds defined in [testbed:NAME] sections.
+
+    Returns:
+        [{name, option: value, ...}]. A dict per testbed with its name and
+        the options it overrides. Empty if no testbeds are defined, in which
+        case the [tester] and [sut] sections define the only testbed.
+    """
+    return testbeds
+
+def useTestbed(testbed):
+    """Override the tester and SUT options with those of testbed."""
+    for option, value in testbed.items():
+        if option != 'name':
+            configuration[option] = value
+
 def getArg(arg):
     global cmdline_args
     return cmdline_args[arg]
@@ -0,0 +1,395 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module stores the results of test runs in an SQLite database, so that
+# results can be queried and compared across runs, see dats_db.py.
+#
+# Runs, tests, the results per packet size, trials, the latency per core of
+# trials and snapshots of the packet counters during the measurement window of
+# trials are written while the tests run. Rows are buffered in memory and
+# inserted in batches, committed at the latest when a test completes. The
+# database uses write-ahead logging, so it can be queried while tests write
+# to it.
+
+import json
+import time
+import socket
+import sqlite3
+import logging
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL,
+    finished REAL,
+    hostname TEXT,
+    report_dir TEXT,
+    version TEXT,
+    config TEXT,
+    fingerprint TEXT,
+    inventory TEXT
+);
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER REFERENCES runs(id),
+    module TEXT,
+    class TEXT,
+    descr TEXT,
+    started REAL,
+    finished REAL,
+    kpi TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    test_id INTEGER REFERENCES tests(id),
+    pkt_size INTEGER,
+    value REAL,
+    measurement REAL,
+    pkt_loss REAL,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY,
+    test_id INTEGER REFERENCES tests(id),
+    timestamp REAL,
+    pkt_size INTEGER,
+    value REAL,
+    duration REAL,
+    success INTEGER,
+    mpps REAL,
+    pkt_loss REAL,
+    elapsed REAL,
+    cached INTEGER
+);
+CREATE TABLE IF NOT EXISTS latency (
+    trial_id INTEGER REFERENCES trials(id),
+    core INTEGER,
+    min REAL,
+    max REAL,
+    avg REAL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    trial_id INTEGER REFERENCES trials(id),
+    timestamp REAL,
+    rx INTEGER,
+    tx INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_fingerprint ON runs(fingerprint);
+CREATE INDEX IF NOT EXISTS tests_run ON tests(run_id);
+CREATE INDEX IF NOT EXISTS tests_class ON tests(module, class);
+CREATE INDEX IF NOT EXISTS results_test ON results(test_id, pkt_size);
+CREATE INDEX IF NOT EXISTS trials_test ON trials(test_id, pkt_size);
+CREATE INDEX IF NOT EXISTS latency_trial ON latency(trial_id);
+CREATE INDEX IF NOT EXISTS counters_trial ON counters(trial_id);
+"""
+
+# Number of buffered rows that triggers a batch insert
+BATCH_SIZE = 500
+
+_filename = None
+_connection = None
+_run_id = None
+_test_id = None
+_pending = {}
+
+
+def connect(filename):
+    """Open a connection to the database, creating its tables if needed.
+
+    Returns:
+        sqlite3.Connection. The connection.
+    """
+    connection = sqlite3.connect(filename, timeout=60)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+
+    # Databases created by earlier versions lack the newer columns of runs
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(runs)')]
+    if columns:
+        for column in ('fingerprint', 'inventory'):
+            if column not in columns:
+                connection.execute('ALTER TABLE runs ADD COLUMN {} TEXT'.format(column))
+
+    connection.executescript(_SCHEMA)
+    connection.commit()
+
+    return connection
+
+
+def open_db(filename):
+    """Open the results database for the current run.
+
+    Args:
+        filename (str): The SQLite database file. It is created if it
+            doesn't exist.
+    """
+    global _filename, _connection
+
+    _filename = filename
+    _connection = connect(filename)
+    _pending.clear()
+    logging.info("Storing results in database %s", filename)
+
+
+def reopen_db():
+    """Open a new connection after forking a worker process.
+
+    A connection must not be shared with the parent process.
+    """
+    global _connection
+
+    if _filename is not None:
+        _pending.clear()
+        _connection = connect(_filename)
+
+
+def is_open():
+    return _connection is not None
+
+
+def close_db():
+    """Write all buffered rows and close the database."""
+    global _connection
+
+    if _connection is not None:
+        flush()
+        _connection.close()
+        _connection = None
+
+
+def start_run(report_dir, version, configuration):
+    """Add a run to the database.
+
+    Args:
+        report_dir (str): The report directory of the run.
+        version (str): The DATS version.
+        configuration (dict): The configuration options of the run.
+    """
+    global _run_id
+
+    if _connection is None:
+        return
+
+    cursor = _connection.execute(
+            'INSERT INTO runs (started, hostname, report_dir, version, config) VALUES (?, ?, ?, ?, ?)',
+            (time.time(), socket.gethostname(), report_dir, version, json.dumps(configuration, default=str)))
+    _run_id = cursor.lastrowid
+    _connection.commit()
+
+
+def set_fingerprint(fingerprint, inventory):
+    """Store the fingerprint and the inventory of the SUT of the current run.
+
+    Args:
+        fingerprint (str): Identifies SUTs whose results can be compared.
+        inventory: The description of the SUT, stored as JSON.
+    """
+    if _connection is None:
+        return
+
+    _connection.execute('UPDATE runs SET fingerprint = ?, inventory = ? WHERE id = ?',
+            (fingerprint, json.dumps(inventory), _run_id))
+    _connection.commit()
+
+
+def current_run():
+    """Return the id of the current run."""
+    return _run_id
+
+
+def query(sql, params=()):
+    """Run a query on the database, after writing all buffered rows.
+
+    Returns:
+        [tuple]. The rows returned by the query.
+    """
+    flush()
+    return _connection.execute(sql, params).fetchall()
+
+
+def measurements(run, connection=None):
+    """Return the measurements of a run by (module, class, packet size, value).
+
+    The value is only part of the key for tests with several results per
+    packet size, like the ramp tests. It is None otherwise, so the results of
+    searches that ended on different values can be compared.
+
+    Args:
+        run (int): The id of the run.
+        connection (sqlite3.Connection): The database to query, the database
+            of the current run by default.
+
+    Returns:
+        {(module, class, pkt_size, value): (descr, measurement)}.
+    """
+    if connection is None:
+        flush()
+        connection = _connection
+
+    rows = connection.execute(
+            'SELECT tests.module, tests.class, tests.descr, results.pkt_size, results.value, '
+            'results.measurement FROM tests JOIN results ON results.test_id = tests.id '
+            'WHERE tests.run_id = ?', (run,)).fetchall()
+
+    counts = {}
+    for row in rows:
+        counts[row[:2] + (row[3],)] = counts.get(row[:2] + (row[3],), 0) + 1
+
+    result = {}
+    for row in rows:
+        value = row[4] if counts[row[:2] + (row[3],)] > 1 else None
+        result[(row[0], row[1], row[3], value)] = (row[2], row[5])
+
+    return result
+
+
+def finish_run():
+    if _connection is None:
+        return
+
+    flush()
+    _connection.execute('UPDATE runs SET finished = ? WHERE id = ?', (time.time(), _run_id))
+    _connection.commit()
+
+
+def add_test(test):
+    """Add a test class of the current run to the database.
+
+    Returns:
+        int. The id of the test, or None if the database is not open.
+    """
+    if _connection is None:
+        return None
+
+    cursor = _connection.execute(
+            'INSERT INTO tests (run_id, module, class, descr, started) VALUES (?, ?, ?, ?, ?)',
+            (_run_id, test.__module__, test.__class__.__name__, test.short_descr(), time.time()))
+    _connection.commit()
+
+    return cursor.lastrowid
+
+
+def set_test(test_id):
+    """Set the test that trials are recorded for."""
+    global _test_id
+
+    _test_id = test_id
+
+
+def finish_test(test_id, test, results):
+    """Store the outcome of a test.
+
+    Args:
+        test_id (int): The id returned by add_test().
+        test (TestBase): The test object.
+        results: The results of run_all_tests(), or an Exception if the test
+            failed.
+    """
+    if _connection is None or test_id is None:
+        return
+
+    error = None
+    if isinstance(results, Exception):
+        error = str(results)
+    else:
+        for result in results:
+            _buffer('results', (test_id, result.get('pkt_size'),
+                    result.get('value', result.get('test_value')),
+                    result.get('measurement'), result.get('pkt_loss'),
+                    json.dumps(result, default=str)))
+
+    flush()
+    _connection.execute('UPDATE tests SET finished = ?, kpi = ?, error = ? WHERE id = ?',
+            (time.time(), test.kpi(), error, test_id))
+    _connection.commit()
+
+
+def record_trial(pkt_size, value, duration, trial, elapsed, cached=False, counters=()):
+    """Buffer a trial of the current test.
+
+    Args:
+        pkt_size (int): The packet size of the trial.
+        value (float): The value tested with.
+        duration (float): The duration of the trial.
+        trial (tuple): The results of run_test() for the trial.
+        elapsed (float): The wall clock time the trial took, in seconds.
+        cached (bool): True if the results were replayed from the trial
+            cache.
+        counters ([(timestamp, rx, tx)]): Snapshots of the packet counters
+            during the measurement window.
+    """
+    if _connection is None:
+        return
+
+    latency = []
+    if len(trial) > 3:
+        lat = trial[3]
+        for core in range(len(lat['latency_avg'])):
+            row = (lat['latency_min'][core], lat['latency_max'][core], lat['latency_avg'][core])
+            if any(row):
+                latency.append((core,) + row)
+
+    _buffer('trials', ((_test_id, time.time(), pkt_size, value, duration,
+            int(bool(trial[0])), trial[1], trial[2], elapsed, int(cached)),
+            latency, [tuple(sample) for sample in counters]))
+
+
+def _buffer(table, row):
+    _pending.setdefault(table, []).append(row)
+    if sum(len(rows) for rows in _pending.values()) >= BATCH_SIZE:
+        flush()
+
+
+def flush():
+    """Insert all buffered rows in a single transaction."""
+    if _connection is None or not _pending:
+        return
+
+    with _connection:
+        _connection.executemany(
+                'INSERT INTO results (test_id, pkt_size, value, measurement, pkt_loss, data) VALUES (?, ?, ?, ?, ?, ?)',
+                _pending.get('results', []))
+
+        # The latency and counter rows refer to the id of their trial, which
+        # is only known once the trial is inserted.
+        for trial, latency, counters in _pending.get('trials', []):
+            trial_id = _connection.execute(
+                    'INSERT INTO trials (test_id, timestamp, pkt_size, value, duration, success, mpps, pkt_loss, elapsed, cached) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', trial).lastrowid
+            _connection.executemany('INSERT INTO latency (trial_id, core, min, max, avg) VALUES (?, ?, ?, ?, ?)',
+                    [(trial_id,) + row for row in latency])
+            _connection.executemany('INSERT INTO counters (trial_id, timestamp, rx, tx) VALUES (?, ?, ?, ?)',
+                    [(trial_id,) + row for row in counters])
+    _pending.clear()
@@ -58,94 +58,78 @@ class doc:
         system("rm -rf ./pdf")
         system("mkdir -p pdf")
 
-        res = ""
-        res += "\\documentclass[a4paper,10pt,notitlepage]{article}\n"
-        res += "\\title{" + self._title + "}\n"
-        res += "\\date{}\n"
-        res += "\\usepackage[pdftex]{graphicx}\n"
-        res += "\\begin{document}\n"
-        res += "\\maketitle\n"
+        res = []
+        res.append("\\documentclass[a4paper,10pt,notitlepage]{article}\n")
+        res.append("\\title{" + self._title + "}\n")
+        res.append("\\date{}\n")
+        res.append("\\usepackage[pdftex]{graphicx}\n")
+        res.append("\\begin{document}\n")
+        res.append("\\maketitle\n")
         for a in self._elements:
             if (a[0] == 0):
                 system("cp " + a[1] + " "+out_path+" ")
-                res += "\\includegraphics[width=\\linewidth]{" + a[1] + "}\n"
+                res.append("\\includegraphics[width=\\linewidth]{" + a[1] + "}\n")
             elif (a[0] == 1):
-                res += "\\section{"+ a[1] + "}\n"
+                res.append("\\section{"+ a[1] + "}\n")
             elif (a[0] == 2):
                 titles = a[1].get_titles()
-                res += "\\begin{center}"
-                res += "\\begin{tabular}{ |" + (" l |"*len(titles)) + "}\n"
-                res += "\\hline\n"
-
-                first = True
-                for title in titles:
-                    if (first):
-                        first = False
-                    else:
-                        res += " & "
-                    res += "\\textbf{" + str(title) + "}"
-                res += "\\\\\n"
-                res += "\\hline\n"
-
-                first = True
-                res += str()
+                res.append("\\begin{center}")
+                res.append("\\begin{tabular}{ |" + (" l |"*len(titles)) + "}\n")
+                res.append("\\hline\n")
+                res.append(" & ".join("\\textbf{" + str(title) + "}" for title in titles))
+                res.append("\\\\\n")
+                res.append("\\hline\n")
 
                 for row in a[1].get_rows():
-                    first = True
-                    for el in row:
-                        if (first):
-                            first = False
-                        else:
-                            res += " & "
-                        res += str(el)
-                    res += "\\\\\n"
-                res += "\\hline\n"
-                res += "\\end{tabular}\n"
-                res += "\\end{center}"
+                    res.append(" & ".join(str(el) for el in row))
+                    res.append("\\\\\n")
+                res.append("\\hline\n")
+                res.append("\\end{tabular}\n")
+                res.append("\\end{center}")
             else:
-                res += a[1] + "\n\n"
+                res.append(a[1] + "\n\n")
 
-        res += "\\end{document}\n"
+        res.append("\\end{document}\n")
 
         if (out_name[-4:] == ".pdf"):
             out_name = out_name[:-4]
 
         f = open(out_path + "/" + out_name + ".tex", 'w')
-        f.write(res)
+        f.write(''.join(res))
         f.close()
         system("cd "+out_path+"/; latexmk -pdf "+out_name+".tex;")
     def gen_html(self, out_path, out_name):
 
-        res = ""
-        res += "<html>"
-        res += " <h1>" + self._title + "</h1>"
+        res = []
+        res.append("<html>")
+        res.append(" <h1>" + self._title + "</h1>")
         for a in self._elements:
             if (a[0] == 0):
                 system("cp " + a[1] + " "+out_path+"/")
-                res += "<par><center><img src='" + a[1] + "'/></center></par>"
+                res.append("<par><center><img src='" + a[1] + "'/></center></par>")
             elif (a[0] == 1):
-                res += "<h2>"+ a[1] + "</h2>"
+                res.append("<h2>"+ a[1] + "</h2>")
             elif (a[0] == 2):
-                res += "<table border=\"1\" width=\"100%\">"
+                res.append("<table border=\"1\" width=\"100%\">")
 
                 titles = a[1].get_titles()
-                res += "<tr>"
+                res.append("<tr>")
                 for title in titles:
-                    res += "<td><b>" + str(title) + "</b></td>"
-                res += "</tr>"
+                    res.append("<td><b>" + str(title) + "</b></td>")
+                res.append("</tr>")
 
 
                 for row in a[1].get_rows():
-                    res += "<tr>"
+                    res.append("<tr>")
                     for el in row:
-                        res += "<td>" + str(el) + "</td>"
-                    res += "</tr>"
+                        res.append("<td>" + str(el) + "</td>")
+                    res.append("</tr>")
 
-                res += "</table>"
+                res.append("</table>")
             else:
-                res += "<par>" + a[1] + "</par></br>"
+                res.append("<par>" + a[1] + "</par></br>")
 
-        res += "</html>"
+        res.append("</html>")
         f = open(out_path + "/" + out_name, 'w')
-        f.write(res)
+        f.write(''.join(res))
         f.close()
@@ -0,0 +1,400 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module writes a self-contained, interactive HTML report of a run from
+# the results database. Unlike summary.html, which rst2html makes from the
+# reStructuredText report and its PNG figures, it is drawn from the data of
+# every trial:
+#
+#   - the results of every test across packet sizes,
+#   - the trajectory of the search for every packet size, the value tried by
+#     every trial and whether it passed,
+#   - the throughput and packet loss during the measurement windows, from the
+#     packet counters polled during every trial, and the latency per trial.
+#     The counters are only polled with counter_samples or early_abort, see
+#     dats.cfg. Otherwise the report says that no samples were recorded.
+#
+# The charts are inline SVG, hovering over a point shows its values. Long
+# time series are downsampled with the Largest-Triangle-Three-Buckets
+# algorithm, which keeps the shape of the series, so that the report of a run
+# of many hours still loads quickly.
+
+import cgi
+import math
+
+import dats.db as db
+
+
+# Colors of the series of a chart
+_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b',
+           '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+_PASS_COLOR = '#2ca02c'
+_FAIL_COLOR = '#d62728'
+
+_WIDTH = 720
+_HEIGHT = 260
+# Space for the axes and their labels around the plot area
+_MARGIN_LEFT = 70
+_MARGIN_RIGHT = 20
+_MARGIN_TOP = 20
+_MARGIN_BOTTOM = 45
+
+_STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+h1 { font-size: 1.6em; }
+h2 { font-size: 1.3em; margin-top: 1.5em; }
+summary { cursor: pointer; font-weight: bold; margin: 0.5em 0; }
+table { border-collapse: collapse; margin: 0.5em 0; }
+td, th { border: 1px solid #ccc; padding: 2px 8px; text-align: left; }
+svg { display: block; margin: 0.5em 0; }
+svg text { font-size: 11px; }
+svg .marker:hover { stroke: #000; stroke-width: 2; }
+.legend span { margin-right: 1.5em; }
+.error { color: #d62728; }
+"""
+
+
+def lttb(points, threshold):
+    """Downsample a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are kept. The other points are split in
+    threshold - 2 buckets, of which the point is kept that forms the largest
+    triangle with the point kept in the previous bucket and the average of
+    the next bucket.
+
+    Args:
+        points ([tuple]): The series, sorted on x. The first two elements of
+            every point are x and y, any other elements are kept as they are.
+        threshold (int): The maximum number of points to return.
+
+    Returns:
+        [tuple]. The points that were kept, in order.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / float(threshold - 2)
+    previous = points[0]
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, len(points))
+        next_bucket = points[end:next_end]
+        avg_x = sum(p[0] for p in next_bucket) / float(len(next_bucket))
+        avg_y = sum(p[1] for p in next_bucket) / float(len(next_bucket))
+
+        best = None
+        best_area = -1.0
+        for point in points[start:end]:
+            area = abs((previous[0] - avg_x) * (point[1] - previous[1])
+                       - (previous[0] - point[0]) * (avg_y - previous[1]))
+            if area > best_area:
+                best_area = area
+                best = point
+        sampled.append(best)
+        previous = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def _ticks(low, high, count=5):
+    """Return about count round values from low to high."""
+    if high <= low:
+        return [low]
+    raw_step = (high - low) / float(count)
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    for factor in (1, 2, 5, 10):
+        step = magnitude * factor
+        if step >= raw_step:
+            break
+    first = int(math.ceil(low / step - 1e-9))
+    last = int(math.floor(high / step + 1e-9))
+    return [i * step for i in range(first, last + 1)]
+
+
+def _fmt(value):
+    return '{:g}'.format(round(value, 6))
+
+
+def _chart(series, x_label, y_label):
+    """Draw a chart in SVG.
+
+    Args:
+        series ([{name, color, points, lines, markers}]). The series to draw.
+            points is a list of (x, y, tooltip, segment). lines draws a line
+            through the points of the same segment, markers draws a circle
+            on every point, with its tooltip.
+        x_label (str): The label of the horizontal axis.
+        y_label (str): The label of the vertical axis.
+
+    Returns:
+        str. The chart followed by its legend, in HTML.
+    """
+    all_points = [p for s in series for p in s['points']]
+    if not all_points:
+        return '<p>No data.</p>\n'
+
+    x_low = min(p[0] for p in all_points)
+    x_high = max(p[0] for p in all_points)
+    y_low = min(0.0, min(p[1] for p in all_points))
+    y_high = max(p[1] for p in all_points)
+    if x_high == x_low:
+        x_high = x_low + 1.0
+    if y_high == y_low:
+        y_high = y_low + 1.0
+
+    plot_width = _WIDTH - _MARGIN_LEFT - _MARGIN_RIGHT
+    plot_height = _HEIGHT - _MARGIN_TOP - _MARGIN_BOTTOM
+
+    def sx(x):
+        return _MARGIN_LEFT + (x - x_low) * plot_width / (x_high - x_low)
+
+    def sy(y):
+        return _MARGIN_TOP + plot_height - (y - y_low) * plot_height / (y_high - y_low)
+
+    svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">'.format(_WIDTH, _HEIGHT)]
+    svg.append('<rect x="{}" y="{}" width="{}" height="{}" fill="none" stroke="#999"/>'.format(
+            _MARGIN_LEFT, _MARGIN_TOP, plot_width, plot_height))
+
+    for x in _ticks(x_low, x_high):
+        svg.append('<line x1="{0:.1f}" x2="{0:.1f}" y1="{1}" y2="{2}" stroke="#eee"/>'
+                   '<text x="{0:.1f}" y="{3}" text-anchor="middle">{4}</text>'.format(
+                sx(x), _MARGIN_TOP, _MARGIN_TOP + plot_height, _MARGIN_TOP + plot_height + 15, _fmt(x)))
+    for y in _ticks(y_low, y_high):
+        svg.append('<line x1="{0}" x2="{1}" y1="{2:.1f}" y2="{2:.1f}" stroke="#eee"/>'
+                   '<text x="{3}" y="{4:.1f}" text-anchor="end">{5}</text>'.format(
+                _MARGIN_LEFT, _MARGIN_LEFT + plot_width, sy(y), _MARGIN_LEFT - 5, sy(y) + 4, _fmt(y)))
+
+    svg.append('<text x="{}" y="{}" text-anchor="middle">{}</text>'.format(
+            _MARGIN_LEFT + plot_width / 2, _HEIGHT - 8, cgi.escape(x_label)))
+    svg.append('<text transform="translate(14,{}) rotate(-90)" text-anchor="middle">{}</text>'.format(
+            _MARGIN_TOP + plot_height / 2, cgi.escape(y_label)))
+
+    for s in series:
+        if s.get('lines', True):
+            path = []
+            segment = None
+            for x, y, tooltip, seg in s['points']:
+                path.append('{}{:.1f},{:.1f}'.format('M' if seg != segment else 'L', sx(x), sy(y)))
+                segment = seg
+            svg.append('<path d="{}" fill="none" stroke="{}" stroke-width="1.5"/>'.format(' '.join(path), s['color']))
+        if s.get('markers', False):
+            for x, y, tooltip, seg in s['points']:
+                svg.append('<circle class="marker" cx="{:.1f}" cy="{:.1f}" r="4" fill="{}"><title>{}</title></circle>'.format(
+                        sx(x), sy(y), s.get('marker_colors', {}).get(seg, s['color']), cgi.escape(tooltip)))
+    svg.append('</svg>')
+
+    legend = ''.join('<span style="color:{}">&#9632; {}</span>'.format(s['color'], cgi.escape(s['name']))
+                     for s in series if s.get('name'))
+    return '\n'.join(svg) + '\n<div class="legend">' + legend + '</div>\n'
+
+
+def _rows(connection, sql, params):
+    if connection is None:
+        return db.query(sql, params)
+    return connection.execute(sql, params).fetchall()
+
+
+def _summary_chart(results):
+    """Chart the results of a test across packet sizes.
+
+    Tests with one result per packet size get a single series over the
+    packet sizes, tests with more results per packet size, like the ramp
+    tests, a series per packet size over the values tested with.
+    """
+    by_pkt_size = {}
+    for pkt_size, value, measurement, pkt_loss in results:
+        by_pkt_size.setdefault(pkt_size, []).append((value, measurement, pkt_loss))
+
+    if all(len(rows) == 1 for rows in by_pkt_size.values()):
+        points = [(pkt_size, rows[0][1], '{} B: {:.2f} Mpps, {:.5f}% loss'.format(pkt_size, rows[0][1], rows[0][2] or 0), 0)
+                  for pkt_size, rows in sorted(by_pkt_size.items())]
+        return _chart([dict(color=_COLORS[0], points=points, markers=True)],
+                'Packet size (B)', 'Throughput (Mpps)')
+
+    series = []
+    for i, (pkt_size, rows) in enumerate(sorted(by_pkt_size.items())):
+        points = [(value, measurement, '{} B, value {:g}: {:.2f} Mpps, {:.5f}% loss'.format(pkt_size, value, measurement, pkt_loss or 0), 0)
+                  for value, measurement, pkt_loss in sorted(rows)]
+        series.append(dict(name='{} B'.format(pkt_size), color=_COLORS[i % len(_COLORS)],
+                           points=points, markers=True))
+    return _chart(series, 'Value', 'Throughput (Mpps)')
+
+
+def _trajectory_chart(trials):
+    """Chart the value tried by every trial of a packet size, green when it passed."""
+    points = []
+    marker_colors = {}
+    for n, (trial_id, timestamp, value, success, mpps, pkt_loss) in enumerate(trials):
+        points.append((n + 1, value, 'Trial {}: value {:g}, {:.2f} Mpps, {:.5f}% loss, {}'.format(
+                n + 1, value, mpps or 0, pkt_loss or 0, 'passed' if success else 'failed'), trial_id))
+        marker_colors[trial_id] = _PASS_COLOR if success else _FAIL_COLOR
+    # A single segment for the line, the markers are colored per trial
+    line = [(x, y, tooltip, 0) for x, y, tooltip, seg in points]
+    return _chart([dict(color='#aaa', points=line),
+                   dict(color=_COLORS[0], points=points, lines=False, markers=True, marker_colors=marker_colors)],
+            'Trial', 'Value')
+
+
+def _time_series(connection, test_id, start, max_points):
+    """Return the throughput and loss over time during the trials of a test.
+
+    Returns:
+        ([(x, y, tooltip, segment)], [(x, y, tooltip, segment)]). The
+        throughput in Mpps and the packet loss in percent, against the time
+        since the start of the test in seconds. Every trial is a segment.
+    """
+    throughput = []
+    loss = []
+    previous = None
+    for trial_id, timestamp, rx, tx in _rows(connection,
+            'SELECT trial_id, counters.timestamp, rx, tx FROM counters '
+            'JOIN trials ON trials.id = counters.trial_id WHERE trials.test_id = ? '
+            'ORDER BY counters.trial_id, counters.timestamp', (test_id,)):
+        if previous is not None and previous[0] == trial_id and timestamp > previous[1]:
+            elapsed = timestamp - previous[1]
+            received = rx - previous[2]
+            sent = tx - previous[3]
+            x = timestamp - start
+            mpps = received / elapsed / 1000000.0
+            throughput.append((x, mpps, '{:.1f} s: {:.2f} Mpps'.format(x, mpps), trial_id))
+            if sent > 0:
+                pct = max(0.0, 100.0 * (sent - received) / sent)
+                loss.append((x, pct, '{:.1f} s: {:.5f}% loss'.format(x, pct), trial_id))
+        previous = (trial_id, timestamp, rx, tx)
+
+    return lttb(throughput, max_points), lttb(loss, max_points)
+
+
+def _latency_series(connection, test_id, start):
+    points = []
+    for trial_id, timestamp, pkt_size, value, avg in _rows(connection,
+            'SELECT trials.id, trials.timestamp, pkt_size, value, AVG(latency.avg) FROM trials '
+            'JOIN latency ON latency.trial_id = trials.id WHERE trials.test_id = ? '
+            'GROUP BY trials.id ORDER BY trials.id', (test_id,)):
+        x = timestamp - start
+        points.append((x, avg, '{} B, value {:g}: {:.0f} ns'.format(pkt_size, value, avg), 0))
+    return points
+
+
+def _test_report(connection, test, max_points):
+    test_id, descr, started, kpi, error = test
+    html = ['<h2>{}</h2>\n'.format(cgi.escape(descr))]
+    if error is not None:
+        html.append('<p class="error">Error while running test: {}</p>\n'.format(cgi.escape(error)))
+    elif kpi is not None:
+        html.append('<p>KPI: {}</p>\n'.format(cgi.escape(kpi)))
+
+    results = _rows(connection,
+            'SELECT pkt_size, value, measurement, pkt_loss FROM results WHERE test_id = ? '
+            'ORDER BY pkt_size, value', (test_id,))
+    if results:
+        html.append('<details open><summary>Results per packet size</summary>\n')
+        html.append(_summary_chart(results))
+        html.append('</details>\n')
+
+    trials = {}
+    for row in _rows(connection,
+            'SELECT id, timestamp, pkt_size, value, success, mpps, pkt_loss FROM trials '
+            'WHERE test_id = ? ORDER BY id', (test_id,)):
+        trials.setdefault(row[2], []).append(row[:2] + row[3:])
+    if trials:
+        html.append('<details><summary>Search trajectories</summary>\n')
+        for pkt_size in sorted(trials):
+            html.append('<p>Packet size {} B, {} trials</p>\n'.format(pkt_size, len(trials[pkt_size])))
+            html.append(_trajectory_chart(trials[pkt_size]))
+        html.append('</details>\n')
+
+    throughput, loss = _time_series(connection, test_id, started, max_points)
+    latency = _latency_series(connection, test_id, started)
+    if trials or latency:
+        html.append('<details><summary>Time series</summary>\n')
+        if throughput:
+            html.append(_chart([dict(color=_COLORS[0], points=throughput)], 'Time (s)', 'Throughput (Mpps)'))
+        else:
+            html.append('<p>No packet counter samples were recorded, enable counter_samples or '
+                        'early_abort in the config file to draw the throughput and packet loss '
+                        'over time.</p>\n')
+        if loss:
+            html.append(_chart([dict(color=_COLORS[3], points=loss)], 'Time (s)', 'Packet loss (%)'))
+        if latency:
+            html.append(_chart([dict(color=_COLORS[1], points=latency, markers=True)], 'Time (s)', 'Average latency (ns)'))
+        html.append('</details>\n')
+
+    return ''.join(html)
+
+
+def generate(run, filename, max_points=1000, connection=None):
+    """Write the interactive HTML report of a run.
+
+    Args:
+        run (int): The id of the run in the results database.
+        filename (str): The HTML file to write.
+        max_points (int): The maximum number of points of a time series.
+        connection (sqlite3.Connection): The database to read, the database
+            of the current run by default.
+
+    Raises:
+        ValueError: The run is not in the database.
+    """
+    rows = _rows(connection, 'SELECT started, hostname, report_dir, version FROM runs WHERE id = ?', (run,))
+    if not rows:
+        raise ValueError("Run {} is not in the database".format(run))
+    started, hostname, report_dir, version = rows[0]
+
+    html = ['<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n',
+            '<title>Dataplane Characterization Report</title>\n',
+            '<style>', _STYLE, '</style>\n</head>\n<body>\n',
+            '<h1>Dataplane Characterization Report</h1>\n',
+            '<p>Run {} on {}, DATS v{}, report directory {}.</p>\n'.format(
+                run, cgi.escape(hostname or '-'), cgi.escape(version or '-'), cgi.escape(report_dir or '-'))]
+
+    tests = _rows(connection,
+            'SELECT id, descr, started, kpi, error FROM tests WHERE run_id = ? ORDER BY id', (run,))
+    html.append('<table>\n<tr><th>Test</th><th>KPI</th></tr>\n')
+    for test_id, descr, test_started, kpi, error in tests:
+        html.append('<tr><td>{}</td><td>{}</td></tr>\n'.format(cgi.escape(descr),
+                cgi.escape(kpi or '') if error is None else '<span class="error">Error</span>'))
+    html.append('</table>\n')
+
+    for test in tests:
+        html.append(_test_report(connection, test, max_points))
+
+    html.append('</body>\n</html>\n')
+    data = ''.join(html)
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    with open(filename, 'w') as fh:
+        fh.write(data)
@@ -0,0 +1,347 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Estimate the duration of a test run and plan it to fit a time budget.
+
+The estimate combines a model of every test class with timings recorded in
+the trials.jsonl files of previous runs, see dats.trialcache:
+
+- The number of trials per packet size follows from the configured search
+  strategy and precision, or ramp steps, and from the probe, soak and
+  repetition settings.
+- Every trial takes its duration plus an overhead for setting up the test,
+  e.g. ramping up the speed and flushing buffers, as measured in previous
+  runs of the same test class.
+- Setting up and tearing down the test class take the time measured in
+  previous runs. Tests that don't run trials, like pass/fail tests, take the
+  time run_all_tests() took in previous runs.
+
+Without history for a test class, the averages over all test classes are
+used, and defaults without any history at all.
+
+When tests run on a pool of testbeds, the test classes are assigned to the
+testbed that is free first, longest first.
+"""
+
+import os
+import re
+import glob
+import json
+import math
+import logging
+
+import dats.config as config
+import dats.search as search
+import dats.test.binsearch
+import dats.test.binsearchwlatency
+import dats.test.rampbase
+
+
+# Defaults in seconds when no history is available at all
+DEFAULT_TRIAL_OVERHEAD = 10.0
+DEFAULT_CLASS_SETUP = 30.0
+DEFAULT_CLASS_RUN = 60.0
+
+# Positions of the maximum value in the search interval that the number of
+# search trials is averaged over.
+_CAPACITIES = (0.2, 0.4, 0.6, 0.8)
+
+
+def parse_duration(text):
+    """Parse a duration like '90', '90s', '45m' or '8h' into seconds."""
+    match = re.match(r'^\s*([0-9.]+)\s*([smh]?)\s*$', text)
+    if match is None:
+        raise ValueError("Invalid duration '{}', expected e.g. 3600, 90m or 8h".format(text))
+
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600}[match.group(2)]
+
+
+def format_duration(seconds):
+    """Format seconds as h:mm:ss."""
+    seconds = int(round(seconds))
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class History(object):
+    """Timings of previous runs, per test class."""
+
+    def __init__(self):
+        self._overheads = {}
+        self._phases = {}
+
+    def load(self, filename):
+        """Add the trials and timings recorded in a trials.jsonl file."""
+        with open(filename) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                test_class = (entry.get('test'), entry.get('test_class'))
+                if 'key' in entry:
+                    overhead = entry['elapsed'] - entry['duration']
+                    self._overheads.setdefault(test_class, []).append(max(overhead, 0.0))
+                elif 'phase' in entry:
+                    self._phases.setdefault((test_class, entry['phase']), []).append(entry['elapsed'])
+
+    def trial_overhead(self, test_class):
+        """Return the mean time a trial takes in addition to its duration."""
+        return self._mean(self._overheads, test_class, DEFAULT_TRIAL_OVERHEAD)
+
+    def phase(self, test_class, phase, default):
+        """Return the mean time a phase of a test class takes."""
+        values = self._phases.get((test_class, phase))
+        if values:
+            return sum(values) / len(values)
+
+        values = [value for key, values in self._phases.items() if key[1] == phase for value in values]
+        return sum(values) / len(values) if values else default
+
+    def _mean(self, samples, test_class, default):
+        values = samples.get(test_class)
+        if not values:
+            values = [value for values in samples.values() for value in values]
+        return sum(values) / len(values) if values else default
+
+
+def load_history(report_dir):
+    """Load the history of the runs next to report_dir and of report_dir itself.
+
+    Args:
+        report_dir (str): The report directory of the current run. Previous
+            runs are the dats-report-* directories in the same directory.
+
+    Returns:
+        History. The timings of the previous runs.
+    """
+    report_dir = os.path.normpath(report_dir)
+    filenames = set(glob.glob(os.path.join(os.path.dirname(report_dir), 'dats-report-*', 'trials.jsonl')))
+    filenames.add(os.path.join(report_dir, 'trials.jsonl'))
+
+    history = History()
+    for filename in sorted(filenames):
+        if os.path.isfile(filename):
+            logging.debug("Loading timing history from %s", filename)
+            history.load(filename)
+
+    return history
+
+
+def _repetitions():
+    """Return the expected number of measurements per packet size."""
+    repetitions = int(config.getOption('repetitions'))
+    if repetitions > 1 and config.getOption('confidenceWidth') is not None:
+        repetitions = min(repetitions, int(config.getOption('minRepetitions')))
+
+    return repetitions
+
+
+def _search_trials(lower, upper, precision):
+    """Return the mean number of trials the search strategy takes."""
+    counts = []
+    for position in _CAPACITIES:
+        capacity = lower + (upper - lower) * position
+        strategy = search.get_strategy(config.getOption('searchStrategy'), lower, upper, precision)
+        trials = 0
+        while not strategy.done():
+            value = strategy.propose()
+            strategy.observe(value, value <= capacity)
+            trials += 1
+        counts.append(trials)
+
+    return float(sum(counts)) / len(counts)
+
+
+def _pkt_size_time(test, pkt_size, overhead):
+    """Return the estimated time to test a packet size."""
+    duration = float(config.getOption('testDuration'))
+    trial = lambda duration: duration + overhead
+
+    if isinstance(test, dats.test.rampbase.RampBase):
+        if config.getOption('rampTrialBudget') is not None:
+            steps = int(config.getOption('rampTrialBudget'))
+        else:
+            strategy = search.LinearStrategy(test.start_interval(), test.step_interval())
+            steps = 0
+            while not strategy.done():
+                strategy.observe(strategy.propose(), True)
+                steps += 1
+        return steps * trial(duration) * _repetitions()
+
+    precision = float(config.getOption('testPrecision'))
+    trials = _search_trials(test.lower_bound(pkt_size), test.upper_bound(pkt_size), precision)
+
+    probe_duration = config.getOption('probeDuration')
+    if probe_duration is None:
+        search_time = trials * trial(duration)
+    else:
+        search_time = trials * trial(float(probe_duration)) + trial(duration)
+    if config.getOption('soakDuration') is not None:
+        search_time += trial(float(config.getOption('soakDuration')))
+
+    repetitions = _repetitions()
+    if repetitions > 1 and config.getOption('repeatMode') == 'trial':
+        return search_time + (repetitions - 1) * trial(duration)
+
+    return search_time * repetitions
+
+
+def estimate_class(test, history):
+    """Return the estimated time to run a test class, in seconds.
+
+    Args:
+        test (TestBase): An instance of the test class. It is not set up.
+        history (History): The timings of previous runs.
+    """
+    test_class = (test.__module__, test.__class__.__name__)
+    total = (history.phase(test_class, 'setup_class', DEFAULT_CLASS_SETUP)
+            + history.phase(test_class, 'teardown_class', 0.0))
+
+    searching = (dats.test.binsearch.BinarySearch,
+                 dats.test.binsearchwlatency.BinarySearchWithLatency,
+                 dats.test.rampbase.RampBase)
+    if not isinstance(test, searching):
+        return total + history.phase(test_class, 'run_all_tests', DEFAULT_CLASS_RUN)
+
+    overhead = history.trial_overhead(test_class)
+    for pkt_size in map(int, config.getOption('pktSizes').split(',')):
+        if pkt_size < test.min_pkt_size():
+            pkt_size += test.min_pkt_size() - 64
+        total += _pkt_size_time(test, pkt_size, overhead)
+
+    return total
+
+
+def estimate(tests, history, n_testbeds=1):
+    """Estimate the duration of a test run with the current configuration.
+
+    Args:
+        tests ([TestBase]): Instances of the test classes to run.
+        history (History): The timings of previous runs.
+        n_testbeds (int): The number of testbeds the tests run on in parallel.
+
+    Returns:
+        (total, per_class). The estimated wall clock time of the run and a
+        list with the estimated time of every test class, in seconds.
+    """
+    per_class = [estimate_class(test, history) for test in tests]
+
+    # Longest test classes first, each on the testbed that is free first
+    testbeds = [0.0] * max(n_testbeds, 1)
+    for seconds in sorted(per_class, reverse=True):
+        testbeds[testbeds.index(min(testbeds))] += seconds
+
+    return max(testbeds), per_class
+
+
+def _pkt_size_subsets(pkt_sizes):
+    """Return the subsets of pkt_sizes to consider, largest first.
+
+    The smallest and the largest packet size are kept as long as possible,
+    the sizes in between are dropped from the middle outwards.
+    """
+    subsets = [list(pkt_sizes)]
+    inner = list(pkt_sizes[1:-1])
+    while inner:
+        inner.pop(len(inner) // 2)
+        subsets.append([pkt_sizes[0]] + inner + [pkt_sizes[-1]])
+    if len(pkt_sizes) > 1:
+        subsets.append([pkt_sizes[0]])
+
+    return subsets
+
+
+def fit_budget(tests, history, budget, n_testbeds=1):
+    """Adjust the configuration so the test run fits a time budget.
+
+    The precision may be coarsened, the trial duration shortened and packet
+    sizes dropped, but never beyond the configured values. Of the plans that
+    fit the budget, the one that degrades the configuration least is chosen,
+    where doubling the precision, halving the duration and dropping a packet
+    size each count as one step. Between equally degraded plans, the one
+    using most of the budget is chosen.
+
+    If no plan fits, the fastest plan is used.
+
+    Args:
+        tests ([TestBase]): Instances of the test classes to run.
+        history (History): The timings of previous runs.
+        budget (float): The time budget in seconds.
+        n_testbeds (int): The number of testbeds the tests run on in parallel.
+
+    Returns:
+        (fits, seconds). Whether the chosen plan fits the budget and its
+        estimated duration.
+    """
+    precision = float(config.getOption('testPrecision'))
+    duration = float(config.getOption('testDuration'))
+    pkt_sizes = config.getOption('pktSizes').split(',')
+
+    precisions = [precision * 2 ** i for i in range(5)]
+    durations = [duration] + [d for d in (30.0, 10.0, 5.0, 2.0, 1.0) if d < duration]
+
+    best = None
+    fastest = None
+    for subset in _pkt_size_subsets(pkt_sizes):
+        for d in durations:
+            for p in precisions:
+                config.configuration['testPrecision'] = p
+                config.configuration['testDuration'] = d
+                config.configuration['pktSizes'] = ','.join(subset)
+                seconds = estimate(tests, history, n_testbeds)[0]
+
+                plan = (subset, d, p, seconds)
+                if fastest is None or seconds < fastest[3]:
+                    fastest = plan
+                if seconds > budget:
+                    continue
+
+                degradation = (math.log(p / precision, 2) + math.log(duration / d, 2)
+                        + len(pkt_sizes) - len(subset))
+                if best is None or (degradation, -seconds) < best[0]:
+                    best = ((degradation, -seconds), plan)
+
+    fits = best is not None
+    subset, d, p, seconds = best[1] if fits else fastest
+    config.configuration['testPrecision'] = p
+    config.configuration['testDuration'] = d
+    config.configuration['pktSizes'] = ','.join(subset)
+
+    if not fits:
+        logging.warning("No plan fits the time budget of %s, using the fastest plan", format_duration(budget))
+    logging.info("Planned test_precision %g, test_duration %g and pkt_sizes %s, estimated duration %s",
+            p, d, ','.join(subset), format_duration(seconds))
+
+    return fits, seconds
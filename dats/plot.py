@@ -32,21 +32,205 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
+
 '''
 Helper functions to create plots
+
+The plot functions only describe a figure. The figures are rendered in batch
+by render(), in a pool of processes, or in the calling process when it runs
+other threads, like the report thread of dats.report.
+
+Figures are rendered in-process with matplotlib when it is installed. gnuplot
+is used otherwise, or when plot_backend is gnuplot in the config file. Every
+gnuplot figure gets its own temporary directory for its data and script, so
+concurrent runs don't interfere.
 '''
 
 import os
+import shutil
+import logging
+import tempfile
+import subprocess
+import multiprocessing
+
+import dats.config as config
+
+
+# Figures waiting to be rendered: [(function, table, output_path, options)]
+_figures = []
+
+_matplotlib = None
+
+
+def _load_matplotlib():
+    """Import matplotlib, on first use because the import is slow.
+
+    Returns:
+        bool. True if matplotlib is available.
+    """
+    global _matplotlib
+
+    if _matplotlib is None:
+        try:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            _matplotlib = (Figure, FigureCanvasAgg)
+        except ImportError:
+            _matplotlib = False
+
+    return _matplotlib is not False
+
+
+def backend():
+    """Return the backend that renders the figures, matplotlib or gnuplot."""
+    name = config.getOption('plotBackend')
+    if name == 'auto':
+        return 'matplotlib' if _load_matplotlib() else 'gnuplot'
+    if name not in ('matplotlib', 'gnuplot'):
+        raise Exception("Unknown plot backend '{}'".format(name))
+    if name == 'matplotlib' and not _load_matplotlib():
+        raise Exception("The matplotlib plot backend requires matplotlib")
+    return name
 
 
 # First col will be
-def bar_plot(table, output_path):
+def bar_plot(table, output_path, y_label=None):
     '''
     Creates a bar plot image for the given table on the given output path
+
+    The header of the second column labels the y axis, unless y_label is
+    given.
     '''
     if len(table[0]) < 2:
         raise Exception("Need at least 1 col of data to create bar plot")
 
+    _figures.append(('bar_plot', table, output_path, dict(y_label=y_label)))
+
+
+def plot_throughput_latency(table, output_path):
+    '''
+    Creates a bar plot image for the given table on the given output path
+    '''
+    if len(table[0]) < 2:
+        raise Exception("Need at least 1 col of data to create bar plot")
+
+    _figures.append(('throughput_latency', table, output_path, {}))
+
+
+def render(pool=True):
+    '''
+    Renders all figures created since the previous call
+
+    With pool False, the figures are rendered one by one in the calling
+    process, gnuplot still runs in a subprocess of its own. Threads must not
+    use the pool: forking a process with several threads can leave the child
+    deadlocked on a lock held by another thread, and the child inherits the
+    open PROX sockets.
+    '''
+    figures = [(backend(),) + figure for figure in _figures]
+    del _figures[:]
+    if not figures:
+        return
+
+    logging.verbose("Rendering %d figures", len(figures))
+    processes = min(len(figures), multiprocessing.cpu_count())
+    if processes < 2 or not pool:
+        map(_render, figures)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        pool.map(_render, figures)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _render(figure):
+    name, function, table, output_path, options = figure
+    try:
+        globals()['_' + name + '_' + function](table, output_path, **options)
+    except Exception, ex:
+        logging.error("Could not render %s: %s", output_path, ex)
+
+
+def _matplotlib_figure(width, height):
+    _load_matplotlib()
+    Figure, FigureCanvasAgg = _matplotlib
+    fig = Figure(figsize=(width, height), dpi=80)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _matplotlib_bar_plot(table, output_path, y_label=None):
+    headers = table[0]
+    rows = table[1:]
+    series = len(headers) - 1
+    width = 1.0 / (series + 1)
+
+    fig = _matplotlib_figure(8, 6)
+    ax = fig.add_subplot(111)
+    max_value = 0
+    for i in range(series):
+        values = [float(row[i + 1]) for row in rows]
+        max_value = max([max_value] + values)
+        ax.bar([x + i * width for x in range(len(rows))], values, width,
+                label=str(headers[i + 1]), edgecolor='black')
+
+    ax.set_xticks([x + (series - 1) * width / 2 for x in range(len(rows))])
+    ax.set_xticklabels([str(row[0]) for row in rows])
+    ax.set_ylim(0, 1.15 * max_value or 1)
+    ax.set_xlabel(str(headers[0]))
+    ax.set_ylabel(y_label or str(headers[1]))
+    ax.legend(loc='upper right')
+    fig.savefig(output_path, format='png')
+
+
+def _matplotlib_throughput_latency(table, output_path):
+    rows = [row for row in table if str(row[1]).strip() and str(row[2]).strip()]
+    width = 0.4
+
+    fig = _matplotlib_figure(10, 7.5)
+    ax1 = fig.add_subplot(111)
+    ax2 = ax1.twinx()
+    positions = range(len(rows))
+    bars1 = ax1.bar([x - width / 2 for x in positions], [float(row[1]) for row in rows], width,
+            color='#1f77b4', edgecolor='black', label='Throughput')
+    bars2 = ax2.bar([x + width / 2 for x in positions], [float(row[2]) for row in rows], width,
+            color='#ff7f0e', edgecolor='black', label='Latency')
+
+    ax1.set_xticks(positions)
+    ax1.set_xticklabels([str(row[0]) + '%' for row in rows], fontsize=10)
+    ax1.set_ylim(bottom=0)
+    ax2.set_ylim(bottom=0)
+    ax1.set_ylabel("Throughput (Mpps)")
+    ax2.set_ylabel("Latency (ns)")
+    ax1.legend([bars1, bars2], ['Throughput', 'Latency'], loc='upper left')
+    fig.savefig(output_path, format='png')
+
+
+def _gnuplot(data, gnuplot_script, output_path):
+    '''
+    Runs gnuplot with the script, in a temporary directory with the data
+    '''
+    directory = tempfile.mkdtemp(prefix='dats-plot-')
+    try:
+        with open(os.path.join(directory, 'plot.dat'), 'w') as fh:
+            fh.write(data)
+        with open(os.path.join(directory, 'gnuplot.script'), 'w') as fh:
+            fh.write(gnuplot_script)
+
+        # gnuplot runs in the temporary directory, the scripts refer to the
+        # data file by its relative path and to the output by its absolute path.
+        try:
+            subprocess.call(['gnuplot', 'gnuplot.script'], cwd=directory)
+        except OSError, ex:
+            logging.error("Could not run gnuplot to render %s: %s", output_path, ex)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _gnuplot_bar_plot(table, output_path, y_label=None):
     # Export table to data file
     data = None
     max_value = 0
@@ -65,11 +249,6 @@ def bar_plot(table, output_path):
             data += '\n'
             max_value = max(row[1:]) if max(row[1:]) > max_value else max_value
 
-    # Write data to temp. file, so gnuplot can pick it up for rendering
-    temp_file = open('/tmp/plot.dat', 'w')
-    temp_file.write(data)
-    temp_file.close()
-
     gnuplot_script = '''
 set style data histograms
 set style histogram cluster gap 1
@@ -80,26 +259,16 @@ set xlabel "{}"
 set ylabel "{}"
 set term png
 set output "{}"
-plot "/tmp/plot.dat" using 2:xtic(1) ti col'''.format(1.15*max_value, table[0][0], table[0][1], output_path)
+plot "plot.dat" using 2:xtic(1) ti col'''.format(1.15*max_value, table[0][0], y_label or table[0][1], os.path.abspath(output_path))
 
     for i in range(2, len(table[0])):
         gnuplot_script += ", '' using " + str(i + 1) + " ti col"
     gnuplot_script += "\n"
 
-    gnuplot_file = open("/tmp/gnuplot.script", 'w')
-    gnuplot_file.write(gnuplot_script)
-    gnuplot_file.close()
-
-    os.system("gnuplot /tmp/gnuplot.script")
+    _gnuplot(data, gnuplot_script, output_path)
 
 
-def plot_throughput_latency(table, output_path):
-    '''
-    Creates a bar plot image for the given table on the given output path
-    '''
-    if len(table[0]) < 2:
-        raise Exception("Need at least 1 col of data to create bar plot")
-
+def _gnuplot_throughput_latency(table, output_path):
     # Export table to data file
     data = "Metric Throuput Latency"
     data += '\n'
@@ -110,11 +279,6 @@ def plot_throughput_latency(table, output_path):
             data += data_line
             data += '\n'
 
-    # Write data to temp. file, so gnuplot can pick it up for rendering
-    temp_file = open('/tmp/histplot.dat', 'w')
-    temp_file.write(data)
-    temp_file.close()
-
     gnuplot_script = '''
 reset
 set ytics nomirror
@@ -136,12 +300,8 @@ set output "{}"
 set term png
 set term png size 800,600
 
-plot '/tmp/histplot.dat' using 2 ti col axis x1y1, '' u 3:xticlabels(1) ti col axis x1y2'''.format(output_path)
+plot 'plot.dat' using 2 ti col axis x1y1, '' u 3:xticlabels(1) ti col axis x1y2'''.format(os.path.abspath(output_path))
 
     gnuplot_script += "\n"
 
-    gnuplot_file = open("/tmp/gnuplot.script", 'w')
-    gnuplot_file.write(gnuplot_script)
-    gnuplot_file.close()
-
-    os.system("gnuplot /tmp/gnuplot.script")
+    _gnuplot(data, gnuplot_script, output_path)
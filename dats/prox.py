@@ -36,10 +36,14 @@ from time import sleep
 import logging
 import array
 
+import dats.trace as trace
+
 class prox(object):
-    def __init__(self, prox_socket):
+    def __init__(self, prox_socket, host=None):
         """ creates new prox instance """
         self._sock = prox_socket
+        # The address of the remote system, identifies it in the trace
+        self._host = host
         # sleep(1)
         # self.put_data("tot ierrors tot\n")
         # recv = self.get_data()
@@ -75,6 +79,8 @@ class prox(object):
         #   - Read the dump header and payload
         #   - Store the packet dump for later retrieval
         #   - Return True to signify a packet dump was successfully read
+        # Evaluated once per call, this method is called for every command.
+        debug = logging.root.isEnabledFor(logging.DEBUG)
         ret_str = None
         dat = ""
         done = 0
@@ -82,20 +88,24 @@ class prox(object):
             # recv() is blocking, so avoid calling it when no data is waiting.
             ready = select.select([self._sock], [], [], timeout)
             if ready[0]:
-                logging.debug("Reading from socket")
+                if debug:
+                    logging.debug("Reading from socket")
                 dat = self._sock.recv(256)
                 ret_str = ""
             else:
-                logging.debug("No data waiting on socket")
+                if debug:
+                    logging.debug("No data waiting on socket")
                 done = 1
-            logging.trace("Iterating over input buffer (%d octets)", len(dat))
+            if debug:
+                logging.trace("Iterating over input buffer (%d octets)", len(dat))
 
             i = 0
             while i < len(dat) and (done == 0):
                 if dat[i] == '\n':
                     # Terminating \n for a string reply encountered.
                     if ret_str.startswith('pktdump,'):
-                        logging.trace("Packet dump header read: [%s]", ret_str)
+                        if debug:
+                            logging.trace("Packet dump header read: [%s]", ret_str)
                         # The line is a packet dump header. Parse it, read the
                         # packet payload, store the dump for later retrieval.
                         # Skip over the packet dump and continue processing: a
@@ -108,6 +118,8 @@ class prox(object):
                         pkt_payload = array.array('B', map(ord, dat[data_start:data_end]))
                         pkt_dump = PacketDump(port_id, data_len, pkt_payload)
                         self._pkt_dumps.append(pkt_dump)
+                        if trace.sink is not None:
+                            trace.sink.packet_dump(self._host, port_id, pkt_payload)
 
                         # Reset state. Increment i with payload length and add
                         # 1 for the trailing \n.
@@ -117,24 +129,32 @@ class prox(object):
                         if pkt_dump_only:
                             # Return boolean instead of string to signal
                             # successful reception of the packet dump.
-                            logging.trace("Packet dump stored, returning")
+                            if debug:
+                                logging.trace("Packet dump stored, returning")
                             ret_str = True
                             done = 1
                     else:
                         # Regular 1-line message. Stop reading from the socket.
-                        logging.trace("Regular response read")
+                        if debug:
+                            logging.trace("Regular response read")
                         done = 1
                 else:
                     ret_str += dat[i]
 
                 i = i + 1
 
-        logging.debug("Received data from socket: [%s]", ret_str)
+        if debug:
+            logging.debug("Received data from socket: [%s]", ret_str)
+        if trace.sink is not None and ret_str is not True:
+            trace.sink.reply(self._host, ret_str)
         return ret_str
 
     def put_data(self, to_send):
         """ send data to the remote intance """
-        logging.debug("Sending data to socket: [%s]", to_send.rstrip('\n'))
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Sending data to socket: [%s]", to_send.rstrip('\n'))
+        if trace.sink is not None:
+            trace.sink.command(self._host, to_send)
         self._sock.sendall(to_send)
 
     def get_packet_dump(self):
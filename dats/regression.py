@@ -0,0 +1,250 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module detects performance regressions by comparing the results of the
+# current run with a rolling baseline of earlier runs in the results database,
+# see results_db in dats.cfg.
+#
+# Runs are only compared when they tested the same SUT, i.e. when the
+# fingerprint of their hardware inventory and of the options that affect the
+# results is the same. The baseline consists of the latest finished runs with
+# the same fingerprint. A KPI or a measurement is a regression when it falls
+# below the 95% prediction interval of its baseline values, and also drops by
+# more than the configured threshold. The threshold keeps a very stable
+# baseline from flagging insignificant changes. Values with fewer than
+# min_baseline_runs baseline values are not compared, their status is
+# 'insufficient history'.
+
+import re
+import json
+import hashlib
+
+import dats.config as config
+import dats.db as db
+import dats.stats as stats
+import dats.rstgen as rst
+
+
+# KPIs are compared when they are a single throughput, like '9.52 Mpps'.
+_KPI_RE = re.compile(r'^\s*([0-9]*\.?[0-9]+)\s*Mpps\s*$')
+
+# Options that change the results of the tests on the same SUT
+_FINGERPRINT_OPTIONS = ('toleratedLoss', 'numberOfPorts')
+
+# Status of values with too few baseline values to compare with
+INSUFFICIENT_HISTORY = 'insufficient history'
+
+
+def fingerprint(sut_information_hw):
+    """Return the fingerprint of the SUT.
+
+    Args:
+        sut_information_hw (list): The hardware description of the SUT, as
+            shown in the report.
+
+    Returns:
+        str. The fingerprint.
+    """
+    options = [str(config.getOption(option)) for option in _FINGERPRINT_OPTIONS]
+    return hashlib.sha1(json.dumps([sut_information_hw, options])).hexdigest()
+
+
+def parse_kpi(kpi):
+    """Return the throughput in a KPI, or None if the KPI isn't a throughput."""
+    if kpi is None:
+        return None
+
+    match = _KPI_RE.match(kpi)
+    if match is None:
+        return None
+    return float(match.group(1))
+
+
+def baseline_runs(fingerprint):
+    """Return the ids of the runs in the baseline, latest first."""
+    rows = db.query(
+            'SELECT id FROM runs WHERE fingerprint = ? AND finished IS NOT NULL AND id != ? '
+            'ORDER BY id DESC LIMIT ?',
+            (fingerprint, db.current_run(), int(config.getOption('baselineRuns'))))
+    return [row[0] for row in rows]
+
+
+def _kpis(run):
+    rows = db.query('SELECT module, class, descr, kpi FROM tests WHERE run_id = ? AND error IS NULL', (run,))
+    return dict(((row[0], row[1]), (row[2], parse_kpi(row[3]))) for row in rows)
+
+
+def _compare(current, baseline):
+    """Compare a value with its baseline values.
+
+    Returns:
+        (status, baseline mean, change in %). The status is 'regression',
+        'improvement', 'ok' or 'insufficient history'.
+    """
+    avg = stats.mean(baseline)
+    change = 100.0 * (current - avg) / avg if avg else 0.0
+    if len(baseline) < int(config.getOption('minBaselineRuns')):
+        return INSUFFICIENT_HISTORY, avg, change
+
+    low, high = stats.prediction_interval(baseline)
+    threshold = float(config.getOption('regressionThreshold'))
+
+    if current < low and change < -threshold:
+        return 'regression', avg, change
+    if current > high and change > threshold:
+        return 'improvement', avg, change
+    return 'ok', avg, change
+
+
+def detect(fingerprint):
+    """Compare the current run with its baseline.
+
+    Args:
+        fingerprint (str): The fingerprint of the SUT of the current run.
+
+    Returns:
+        {runs, comparisons, software}.
+        runs ([int]): The ids of the runs in the baseline.
+        comparisons ([dict]): A comparison for every KPI and measurement with
+            baseline values, with the keys test, pkt_size, value, current,
+            baseline, runs, change and status. pkt_size is None for KPIs.
+            status is 'regression', 'improvement', 'ok' or 'insufficient
+            history'.
+        software ([(str, str, str)]): The software components that changed
+            since the latest baseline run, with the old and the new version.
+    """
+    runs = baseline_runs(fingerprint)
+    result = dict(runs=runs, comparisons=[], software=[])
+    if not runs:
+        return result
+
+    current_run = db.current_run()
+
+    def add(descr, key, current, history):
+        history = [value for value in history if value is not None]
+        if current is None or not history:
+            return
+        status, avg, change = _compare(current, history)
+        result['comparisons'].append(dict(test=descr, pkt_size=key[2], value=key[3],
+                current=current, baseline=avg, runs=len(history), change=change, status=status))
+
+    kpis = [_kpis(run) for run in runs]
+    for key, (descr, kpi) in sorted(_kpis(current_run).items()):
+        add(descr, key + (None, None), kpi, [k[key][1] for k in kpis if key in k])
+
+    measurements = [db.measurements(run) for run in runs]
+    for key, (descr, measurement) in sorted(db.measurements(current_run).items()):
+        add(descr, key, measurement, [m[key][1] for m in measurements if key in m])
+
+    inventories = {}
+    for run, inventory in db.query('SELECT id, inventory FROM runs WHERE id IN (?, ?)', (current_run, runs[0])):
+        inventories[run] = dict((row[0], row[1]) for row in json.loads(inventory or '[]')[1:] if len(row) > 1)
+    old = inventories.get(runs[0], {})
+    new = inventories.get(current_run, {})
+    for component in sorted(set(old) | set(new)):
+        if old.get(component) != new.get(component):
+            result['software'].append((component, old.get(component), new.get(component)))
+
+    return result
+
+
+def _row(comparison):
+    pkt_size = 'KPI' if comparison['pkt_size'] is None else str(comparison['pkt_size'])
+    if comparison['value'] is not None:
+        pkt_size += ' @ {:g}%'.format(comparison['value'])
+    status = comparison['status']
+    if status == 'regression':
+        status = ':problematic:`regression`'
+
+    return [comparison['test'], pkt_size, '{:.2f}'.format(comparison['baseline']),
+            '{:.2f}'.format(comparison['current']), '{:+.2f}'.format(comparison['change']),
+            str(comparison['runs']), status]
+
+
+def generate_report(regressions):
+    """Return the reStructuredText section with the regressions of a run.
+
+    Args:
+        regressions (dict): The result of detect().
+    """
+    report = rst.Writer()
+    report.section('Regressions', '*', True)
+    if not regressions['runs']:
+        report.write("No earlier runs on the same SUT were found to compare with.\n\n")
+        return report.getvalue()
+
+    report.write("The results were compared with {} earlier run(s) on the same SUT ({}). ".format(
+            len(regressions['runs']), ', '.join(str(run) for run in regressions['runs'])))
+    report.write("Changes of more than {:g}% outside the 95% prediction interval of the earlier results are flagged.\n\n".format(
+            float(config.getOption('regressionThreshold'))))
+
+    compared = [c for c in regressions['comparisons'] if c['status'] != INSUFFICIENT_HISTORY]
+    flagged = [c for c in compared if c['status'] != 'ok']
+    if flagged:
+        table = [['Test', 'Packet size (B)', 'Baseline', 'Current', 'Change (%)', 'Runs', 'Status']]
+        table += [_row(comparison) for comparison in flagged]
+        report.simple_table(table)
+    elif compared:
+        report.write("No significant changes were found in {} KPIs and measurements.\n\n".format(
+                len(compared)))
+
+    insufficient = len(regressions['comparisons']) - len(compared)
+    if insufficient:
+        report.write("{} KPIs and measurements have insufficient history: they have fewer than {} earlier results and were not compared.\n\n".format(
+                insufficient, int(config.getOption('minBaselineRuns'))))
+
+    if regressions['software']:
+        report.write("The software of the SUT changed since run {}:\n\n".format(regressions['runs'][0]))
+        table = [['Component', 'Before', 'Now']]
+        table += [[component, old or '-', new or '-'] for component, old, new in regressions['software']]
+        report.simple_table(table)
+
+    return report.getvalue()
+
+
+def generate_json(regressions):
+    """Return the regressions of a run as a dictionary for the JSON summary."""
+    return dict(
+        BaselineRuns=regressions['runs'],
+        Comparisons=[dict(
+            Test=c['test'],
+            PacketSize=c['pkt_size'],
+            Value=c['value'],
+            Baseline=round(c['baseline'], 2),
+            Current=round(c['current'], 2),
+            Change=round(c['change'], 2),
+            Runs=c['runs'],
+            Status=c['status']) for c in regressions['comparisons']],
+        SoftwareChanges=[dict(Component=component, Before=old, Now=new)
+                for component, old, new in regressions['software']],
+    )
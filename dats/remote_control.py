@@ -32,14 +32,20 @@
 #
 
 import os, os.path as path
+import re
+import tempfile
 import thread
 import time
 import socket
 import logging
 import errno
+import hashlib
 
 from dats.prox import prox
 import dats.config as config
+import dats.timing as timing
+import dats.trace as trace
+import dats.replay as replay
 
 
 def ssh(user, ip, cmd):
@@ -75,10 +81,18 @@ class remote_system:
         self._dpdk_bind_script = self._dpdk_dir + "/tools/dpdk_nic_bind.py"
         self._err = False
         self._err_str = None
+        self._config_hashes = {}
 
     def run_cmd(self, cmd):
         """Execute command over ssh"""
-        return ssh(self._user, self._ip, cmd)
+        if replay.recording is not None:
+            return replay.recording.ssh(self._ip, cmd)
+
+        with timing.phase('ssh'):
+            ret = ssh(self._user, self._ip, cmd)
+        if trace.sink is not None:
+            trace.sink.ssh(self._ip, cmd, ret)
+        return ret
 
     def mount_hugepages(self, directory="/mnt/huge"):
         """Mount the hugepages on the remote system"""
@@ -155,6 +169,13 @@ class remote_system:
 
     def run_prox(self, prox_args):
         """Run and connect to prox on the remote system """
+        if replay.recording is not None:
+            return replay.recording.connect(self._ip)
+
+        with timing.phase('run_prox'):
+            return self._run_prox(prox_args)
+
+    def _run_prox(self, prox_args):
         # Deallocating a large amout of hugepages takes some time. If a new
         # PROX instance is started immediately after killing the previous one,
         # it might not be able to allocate hugepages, because they are still
@@ -198,6 +219,7 @@ class remote_system:
 
         conf_remotepath = "/tmp/" + configfile
         logging.debug("Config file local path: '%s', remote name: '%s'", conf_localpath, conf_remotepath)
+        self.hash_config(conf_localpath, configfile)
         self.scp(conf_localpath, conf_remotepath)
 
         #sock = self.connect_prox()
@@ -212,7 +234,7 @@ class remote_system:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
             sock.connect((self._ip, 8474))
-            return prox(sock)
+            return prox(sock, self._ip)
         except:
             raise Exception("Failed to connect to PROX on " + self._ip)
         return None
@@ -220,16 +242,22 @@ class remote_system:
     def scp(self, local, remote):
         """Copy a file from the local system to the remote system"""
         logging.debug("Initiating SCP: %s -> %s", local, remote)
+        if replay.recording is not None:
+            return replay.recording.scp(self._ip, remote)
+
         cmd = "scp " + local + " " + self._user + "@" + self._ip + ":" + remote
         logging.debug("SCP command: [%s]", cmd)
-        running = os.popen(cmd)
-        ret = {}
-        ret['out'] = running.read().strip()
-        ret['ret'] = running.close()
+        with timing.phase('scp'):
+            running = os.popen(cmd)
+            ret = {}
+            ret['out'] = running.read().strip()
+            ret['ret'] = running.close()
         if ret['ret'] is None:
             ret['ret'] = 0
 
         logging.debug("SCP status: %d, output: [%s]", ret['ret'], ret['out'])
+        if trace.sink is not None:
+            trace.sink.scp(self._ip, local, remote, ret)
 
         return ret
 
@@ -239,14 +267,36 @@ class remote_system:
         if not path.isfile(local):
             raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), local)
 
-        remote = "/tmp/" + filename
-        logging.debug("Config file local path: '%s', remote name: '%s'", local, remote)
-        self.scp(local, remote)
+        # The socket ids can differ per testbed. They are filled in on a copy
+        # of the file, so the workers of a parallel run don't share one.
+        with open(local) as fh:
+            content = fh.read()
+        content = re.sub(r'(?m)^tester_socket_id=.*$',
+                'tester_socket_id="' + str(config.getOption('testerSocketId')) + '"', content)
+        content = re.sub(r'(?m)^sut_socket_id=.*$',
+                'sut_socket_id="' + str(config.getOption('sutSocketId')) + '"', content)
+        with tempfile.NamedTemporaryFile(suffix='-' + filename) as fh:
+            fh.write(content)
+            fh.flush()
+
+            remote = "/tmp/" + filename
+            logging.debug("Config file local path: '%s', remote name: '%s'", local, remote)
+            self.hash_config(fh.name, filename)
+            self.scp(fh.name, remote)
+
+    def hash_config(self, local, filename):
+        """Remember the hash of a config file copied to the remote system"""
+        with open(local, 'rb') as fh:
+            self._config_hashes[filename] = hashlib.sha1(fh.read()).hexdigest()
+
+    def get_config_hashes(self):
+        """Get the hashes of all config files copied to the remote system"""
+        return self._config_hashes
 
     def get_cpu_topology(self):
-        cores = ssh(self._user, self._ip, self._dpdk_dir + "/tools/cpu_layout.py | grep 'cores'")
-        sockets = ssh(self._user, self._ip, self._dpdk_dir + "/tools/cpu_layout.py | grep 'sockets'")
-        topology = ssh(self._user, self._ip, self._dpdk_dir + "/tools/cpu_layout.py | grep 'Core [0-9]' | tr -s ' '")
+        cores = self.run_cmd(self._dpdk_dir + "/tools/cpu_layout.py | grep 'cores'")
+        sockets = self.run_cmd(self._dpdk_dir + "/tools/cpu_layout.py | grep 'sockets'")
+        topology = self.run_cmd(self._dpdk_dir + "/tools/cpu_layout.py | grep 'Core [0-9]' | tr -s ' '")
 
         # convert sockets info to a list
         sockets = sockets["out"].split("=")[1].replace("[", "").replace("]", "").replace(" ", "").split(",")
@@ -0,0 +1,228 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module runs tests offline, against a recorded trace of a previous run
+# instead of the testbed. See prox_trace in dats.cfg to record a trace.
+#
+# The remote systems are not contacted: commands over ssh return their
+# recorded output, files are not copied and PROX is replaced by ReplayProx,
+# which answers every command with the reply PROX gave in the recording.
+# Replies are served in the order they were recorded, per remote system.
+# When the commands sent differ from the recorded ones, for example because
+# a different search strategy tests other values, the replay fails with a
+# ReplayError, because the replies no longer belong to the commands. In
+# lenient mode the replies of the recording are still served in order
+# instead, so the tests run on real data, and the divergences are counted.
+#
+# Time is virtual while replaying: sleeping advances the clock without
+# waiting, so a run that took hours is replayed in seconds.
+
+import json
+import time
+import array
+import logging
+from collections import deque
+
+import dats.prox
+from dats.prox import prox, PacketDump
+
+
+# How far to look ahead in the recording for a command that was sent, to
+# catch up when the recording sent fewer commands, e.g. fewer counter polls
+LOOKAHEAD = 1000
+
+recording = None
+
+_real_time = time.time
+_offset = 0.0
+
+
+class ReplayError(Exception):
+    pass
+
+
+def _virtual_time():
+    return _real_time() + _offset
+
+
+def _virtual_sleep(seconds):
+    global _offset
+
+    _offset += max(seconds, 0)
+
+
+class Recording(object):
+    """The PROX commands, replies and ssh commands of a recorded trace."""
+
+    def __init__(self, filenames, lenient=False):
+        self._lenient = lenient
+        # {host: [record]} with the PROX commands, replies and packet dumps
+        self._prox = {}
+        self._positions = {}
+        # {(host, cmd): deque([ret])} with the output of ssh commands
+        self._ssh = {}
+        self._scp = {}
+        self.divergences = 0
+
+        for filename in filenames:
+            with open(filename) as fh:
+                for line in fh:
+                    record = json.loads(line)
+                    kind = record['kind']
+                    if kind in ('cmd', 'reply', 'pktdump'):
+                        self._prox.setdefault(record['host'], []).append(record)
+                    elif kind == 'ssh':
+                        ret = dict(out=record['out'].encode('latin-1'), ret=record['ret'])
+                        self._ssh.setdefault((record['host'], record['data']), deque()).append(ret)
+                    elif kind == 'scp':
+                        self._scp.setdefault((record['host'], record['data']), deque()).append(dict(out='', ret=record['ret']))
+
+        logging.info("Replaying %d PROX records for %s and %d ssh commands from %s",
+                sum(len(records) for records in self._prox.values()), ', '.join(sorted(self._prox)),
+                sum(len(rets) for rets in self._ssh.values()), ', '.join(filenames))
+
+    def _diverged(self, msg, *args):
+        self.divergences += 1
+        if not self._lenient:
+            raise ReplayError("Replay diverges from the recording: " + msg % args)
+
+        if self.divergences == 1:
+            logging.warning("Replay diverges from the recording: " + msg, *args)
+        else:
+            logging.verbose("Replay diverges from the recording: " + msg, *args)
+
+    def _replay(self, recorded, key, default):
+        if key not in recorded:
+            self._diverged("'%s' on %s was not recorded", key[1], key[0])
+            return dict(default)
+
+        rets = recorded[key]
+        # A command that is run more often than recorded returns the last
+        # recorded result again.
+        return dict(rets.popleft() if len(rets) > 1 else rets[0])
+
+    def ssh(self, host, cmd):
+        """Return the recorded result of an ssh command."""
+        return self._replay(self._ssh, (host, cmd), dict(out='', ret=0))
+
+    def scp(self, host, remote):
+        """Return the recorded result of copying a file."""
+        return self._replay(self._scp, (host, remote), dict(out='', ret=0))
+
+    def connect(self, host):
+        """Return a ReplayProx that replays the PROX instance on host."""
+        if host not in self._prox:
+            raise ReplayError("No PROX commands were recorded for " + host)
+        return ReplayProx(self, host)
+
+    def command(self, host, data):
+        """Advance the recording of host past a command that was sent."""
+        records = self._prox[host]
+        position = self._positions.get(host, 0)
+        data = data.rstrip('\n')
+
+        for index in range(position, min(len(records), position + LOOKAHEAD)):
+            if records[index]['kind'] == 'cmd' and records[index]['data'] == data:
+                if index != position:
+                    self._diverged("skipped %d records on %s to '%s'", index - position, host, data)
+                self._positions[host] = index + 1
+                return
+
+        if position >= len(records):
+            self._diverged("'%s' was sent to %s after the end of the recording", data, host)
+            return
+
+        self._diverged("'%s' was sent to %s instead of '%s'", data, host, records[position]['data'])
+        if records[position]['kind'] == 'cmd':
+            self._positions[host] = position + 1
+
+    def read(self, host, pkt_dumps, pkt_dump_only):
+        """Return the next reply of host, like prox.get_data().
+
+        Packet dumps in the recording are appended to pkt_dumps.
+        """
+        records = self._prox[host]
+        position = self._positions.get(host, 0)
+        try:
+            while position < len(records):
+                record = records[position]
+                position += 1
+                if record['kind'] == 'pktdump':
+                    payload = array.array('B', record['data'].decode('hex'))
+                    pkt_dumps.append(PacketDump(record['port'], len(payload), payload))
+                    if pkt_dump_only:
+                        return True
+                elif record['kind'] == 'reply':
+                    if record['data'] is None:
+                        return None
+                    return record['data'].encode('latin-1')
+                else:
+                    self._diverged("'%s' was not sent to %s", record['data'], host)
+        finally:
+            self._positions[host] = position
+
+        raise ReplayError("The recording of PROX on {} has no more replies".format(host))
+
+
+class ReplayProx(prox):
+    """A PROX instance that replays a recording."""
+
+    def __init__(self, recording, host):
+        super(ReplayProx, self).__init__(None, host)
+        self._recording = recording
+
+    def get_data(self, pkt_dump_only=False, timeout=1):
+        return self._recording.read(self._host, self._pkt_dumps, pkt_dump_only)
+
+    def put_data(self, to_send):
+        self._recording.command(self._host, to_send)
+
+
+def install(filenames, lenient=False):
+    """Replay the trace files instead of using the testbed.
+
+    Must be called before the test scripts are loaded, so that the sleep()
+    they import is the virtual one.
+
+    Args:
+        filenames ([str]): The trace files, see dats.trace. The files of all
+            testbeds when the trace was recorded on a pool of testbeds.
+        lenient (bool): Keep replaying when the commands sent differ from
+            the recording, instead of raising a ReplayError.
+    """
+    global recording
+
+    recording = Recording(filenames, lenient)
+    time.time = _virtual_time
+    time.sleep = _virtual_sleep
+    dats.prox.sleep = _virtual_sleep
@@ -0,0 +1,278 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module generates the report of every test in a background thread, as
+# soon as the test finishes and while the next test is measured:
+#
+#     report.start(report_dir)
+#     for test in tests:
+#         ...
+#         report.submit(test, results)
+#     fragments = report.finish()
+#
+# A fragment holds the reStructuredText, CSV and JSON of a test, its figures
+# are rendered by the time finish() returns. dats.py assembles the fragments
+# into summary.rst, data.csv and summary.json, which convert() then turns
+# into HTML and PDF in parallel processes.
+#
+# After every test, and every packet size of a test that calls update(), the
+# thread also rewrites data.csv and summary.json in the report directory with
+# the results so far. The files are replaced atomically, so a run that is
+# killed leaves a consistent partial report with every result up to then.
+
+import os
+import re
+import json
+import Queue
+import logging
+import threading
+import traceback
+import subprocess
+
+import dats.plot as plot
+import dats.timing as timing
+import dats.rstgen as rst
+
+
+_queue = None
+_thread = None
+_report_dir = None
+# Fragments of the tests in the order they were submitted
+_fragments = []
+# {id(test): (test, results)} of the tests that are still running
+_in_progress = {}
+
+
+def start(report_dir):
+    """Start the background thread that generates the reports of the tests.
+
+    Args:
+        report_dir (str): The directory to save the figures in.
+    """
+    global _queue, _thread, _report_dir
+
+    _report_dir = report_dir
+    del _fragments[:]
+    _in_progress.clear()
+    _queue = Queue.Queue()
+    _thread = threading.Thread(target=_worker, name='report')
+    _thread.daemon = True
+    _thread.start()
+
+
+def submit(test, results, testbeds=None):
+    """Queue the report of a finished test.
+
+    Args:
+        test (dats.test.base.TestBase): The test.
+        results: The results returned by test.run(), or the exception that
+            stopped the test.
+        testbeds ([str]): The testbeds the test ran on, None when it ran on
+            the default one.
+    """
+    fragment = dict(test=test, results=results, testbeds=testbeds)
+    _fragments.append(fragment)
+    _queue.put(fragment)
+
+
+def update(test, results):
+    """Save the results of a test that is still running.
+
+    Does nothing in a process that did not start() the report thread, like
+    the worker processes of dats.scheduler.
+
+    Args:
+        test (dats.test.base.TestBase): The test.
+        results: The results so far, in the format returned by
+            test.run_all_tests().
+    """
+    if _queue is None:
+        return
+    _queue.put(dict(test=test, results=list(results), partial=True))
+
+
+def detach():
+    """Stop sending results to the report thread of the parent process."""
+    global _queue
+
+    _queue = None
+
+
+def finish():
+    """Wait until the reports of all submitted tests are generated.
+
+    Returns:
+        [{test, results, testbeds, rst, csv, json}]. The fragments in the order the tests
+        were submitted. json is None when the test failed.
+    """
+    global _thread
+
+    _queue.put(None)
+    _thread.join()
+    _thread = None
+    return list(_fragments)
+
+
+def _worker():
+    while True:
+        fragment = _queue.get()
+        if fragment is None:
+            return
+
+        test = fragment['test']
+        timing.set_test(test)
+        if fragment.get('partial'):
+            _in_progress[id(test)] = (test, fragment['results'])
+        else:
+            _in_progress.pop(id(test), None)
+            try:
+                _generate(fragment)
+            except Exception, ex:
+                logging.error("Error while generating the report of %s: %s", test.short_descr(), ex)
+                logging.debug("Exception: %s", traceback.format_exc())
+                fragment['rst'] = '**Error while generating report:** {}\n\n'.format(ex)
+                fragment.setdefault('csv', test.short_descr() + "\n")
+                fragment.setdefault('json', None)
+
+        try:
+            with timing.phase('save_partial_report'):
+                _save_partial()
+        except Exception, ex:
+            logging.error("Error while saving the partial report: %s", ex)
+            logging.debug("Exception: %s", traceback.format_exc())
+        timing.set_test(None)
+
+
+def _save_partial():
+    csv_lines = []
+    results_dict = dict()
+    for fragment in _fragments:
+        if 'rst' not in fragment:
+            # Not generated yet
+            continue
+        csv_lines.append(fragment['csv'])
+        if fragment['json'] is not None:
+            results_dict[fragment['test'].short_descr()] = fragment['json']
+
+    for test, results in _in_progress.values():
+        csv_lines.append(test.short_descr() + "\n")
+        csv_lines.append(test.generate_csv(results))
+        results_dict[test.short_descr()] = test.generate_json(results)
+
+    write_file(_report_dir + '/' + 'data.csv', ''.join(csv_lines))
+    write_file(_report_dir + '/' + 'summary.json', json.dumps(results_dict))
+
+
+def _generate(fragment):
+    test = fragment['test']
+    results = fragment['results']
+    # Figure file names are unique per test module
+    report_prefix = 't0_' + re.sub('[^a-zA-Z0-9]', '_', test.__module__) + '_'
+
+    report = rst.Writer()
+    report.section(test.short_descr(), '=')
+
+    # Double newlines in description for proper paragraph formatting
+    report.section('Description', '-')
+    report.write(test.long_descr().replace('\n', '\n\n'))
+    report.write('\n\n')
+    if fragment.get('testbeds'):
+        report.write("This test ran on testbed {}.\n\n".format(', '.join(fragment['testbeds'])))
+
+    report.section('Result', '-')
+    if isinstance(results, Exception):
+        report.write('**Error while running test:** {}\n\n'.format(str(results)))
+        fragment['csv'] = test.short_descr() + "\n"
+        fragment['json'] = None
+    else:
+        with timing.phase('generate_report'):
+            report.write(test.generate_report(results, report_prefix, _report_dir + '/'))
+            fragment['csv'] = test.short_descr() + "\n" + test.generate_csv(results)
+            fragment['json'] = test.generate_json(results)
+        # No process pool, the main thread is measuring
+        with timing.phase('render_figures'):
+            plot.render(pool=False)
+
+    fragment['rst'] = report.getvalue()
+
+
+def write_file(filename, data):
+    """Replace the content of a file atomically.
+
+    The data is written to a temporary file that is synced to disk and then
+    renamed, so the file holds either its old or its new content, even when
+    the process or the machine dies halfway.
+
+    Args:
+        filename (str): The file to write.
+        data (str): The new content of the file.
+    """
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.rename(tmp_filename, filename)
+
+    # Make the rename itself durable
+    dir_fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def convert(rst_file):
+    """Convert a reStructuredText report to HTML and PDF.
+
+    Both conversions run at the same time, in separate processes.
+
+    Args:
+        rst_file (str): The report, its name must end in .rst.
+    """
+    base = rst_file[:-len('.rst')]
+    commands = [
+        ['rst2html', rst_file, base + '.html'],
+        ['rst2pdf', '-q', rst_file, base + '.pdf'],
+    ]
+
+    processes = []
+    for command in commands:
+        try:
+            processes.append((command[0], subprocess.Popen(command)))
+        except OSError, ex:
+            logging.error("Could not run %s: %s", command[0], ex.strerror)
+
+    for name, process in processes:
+        if process.wait() != 0:
+            logging.error("%s failed with exit status %d", name, process.returncode)
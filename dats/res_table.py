@@ -31,10 +31,47 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
+import json
+import array
+from collections import OrderedDict
+
+import dats.stats as stats
+import dats.rstgen as rst
+
+
+def _typecode(value):
+    """Return the array typecode for value, None if it needs a list."""
+    if type(value) is int:
+        return 'l'
+    if type(value) is float:
+        return 'd'
+    return None
+
+
+def _new_col(values):
+    """Create a column holding values.
+
+    Columns of only ints or only floats are stored as typed arrays, any other
+    column as a list.
+    """
+    values = list(values)
+    if len(values) != 0:
+        typecode = _typecode(values[0])
+        if typecode is not None and all(_typecode(v) == typecode for v in values):
+            return array.array(typecode, values)
+    return values
+
+
 class res_table(object):
+    """A table of results, stored column by column.
+
+    Each column is a typed array when all its values are ints or all are
+    floats, so that building and summarizing long tables stays cheap.
+    """
+
     def __init__(self, titles = []):
         self._titles = []
-        self._data = []
+        self._cols = []
         self.add_mode = 0 # not set, 1 if add_cols, 2 if add_rows, can't interleave usage
         self.col_count = 0
         if len(titles) != 0:
@@ -48,11 +85,7 @@ class res_table(object):
         """Insert titles as empty strings"""
         if len(self._titles) != 0 and len(self._titles) != count:
             raise Exception("Trying to set " + str(count) + " titles but have table with " + str(len(self._titles)) + "cols")
-        self._titles = []
-        i = 0
-        while i < count:
-            self._titles.append("")
-            i = i + 1
+        self._titles = [""] * count
 
     def set_titles(self, titles):
         """Replace all the titles of the tabel"""
@@ -66,24 +99,12 @@ class res_table(object):
             raise Exception("Used add_row in the past, can't use both add_col/add_row")
         if len(self._titles) == 0:
             raise Exception("Set titles before adding data")
-        if self.col_count == 0:
-            cnt = len(col)
-            i = 0
-            while i < cnt:
-                self._data.append([])
-                value = col[i]
-                self._data[i].append(value)
-                i = i + 1
-        else:
+        if self.col_count != 0:
             if self.col_count == len(self._titles):
                 raise Exception("Trying to add more columns than titles")
-            if len(self._data) != len(col):
-                raise Exception("Length previous colums was " + str(len(self._data)) + " but new col is " + str(len(col)))
-
-            i = 0
-            for element in col:
-                self._data[i].append(element)
-                i = i + 1
+            if len(self) != len(col):
+                raise Exception("Length previous colums was " + str(len(self)) + " but new col is " + str(len(col)))
+        self._cols.append(_new_col(col))
         self.add_mode = 1
         self.col_count = self.col_count + 1
 
@@ -93,32 +114,50 @@ class res_table(object):
             raise Exception("Used add_col in the past, can't use both add_col/add_row")
         if len(row) != len(self._titles):
             raise Exception("Trying to add row with " + str(len(row)) + " elements in table with " + str(len(self._titles)) + " cols")
-        self._data.append(row)
+        if self.add_mode == 0:
+            self._cols = [_new_col([value]) for value in row]
+            self.col_count = len(row)
+        else:
+            for i, value in enumerate(row):
+                col = self._cols[i]
+                if isinstance(col, array.array) and _typecode(value) != col.typecode:
+                    col = self._cols[i] = list(col)
+                col.append(value)
         self.add_mode = 2
 
+    def __len__(self):
+        """Return the number of rows"""
+        if len(self._cols) == 0:
+            return 0
+        return len(self._cols[0])
+
+    def _index(self, col):
+        """Return the index of a column given by index or by title"""
+        if isinstance(col, int):
+            return col
+        return self._titles.index(col)
+
+    def _formatted_cols(self):
+        """Return the columns converted to strings, one column at a time"""
+        return [map(str, col) for col in self._cols]
+
     def to_csv(self, delim = "; "):
         """Convert the table to a csv string"""
-        ret = ""
-        first = True
-        for title in self._titles:
-            if first:
-                first = False
-            else:
-                ret += delim
-            ret += title
-        ret += "\n"
-
-        for row in self._data:
-            first = True
-            for element in row:
-                if first:
-                    first = False
-                else:
-                    ret += delim
-                ret += str(element)
-            ret += "\n"
-        return ret
+        lines = [delim.join(self._titles)]
+        lines.extend(delim.join(row) for row in zip(*self._formatted_cols()))
+        lines.append("")
+        return "\n".join(lines)
 
+    def to_rst(self):
+        """Convert the table to a reStructuredText simple table"""
+        table = [[str(title) for title in self._titles]]
+        table.extend(zip(*self._formatted_cols()))
+        return rst.simple_table(table)
+
+    def to_json(self):
+        """Convert the table to a JSON object mapping each title to its column"""
+        return json.dumps(OrderedDict(
+                (title, list(col)) for title, col in zip(self._titles, self._cols)))
 
     def get_titles(self):
         """Get a list of all titles"""
@@ -126,16 +165,63 @@ class res_table(object):
 
     def get_rows(self):
         """Get a list of rows"""
-        return self._data
+        return [list(row) for row in zip(*self._cols)]
 
     def get_cols(self):
-        """Get a list of columns"""
-        ret = []
-        i = 0
-        while i < len(self._titles):
-            col = []
-            for row in self._data:
-                col.append(row[i])
-            i = i + 1
-            ret.append(col)
-        return ret
+        """Get a list of columns, as lists"""
+        if len(self._cols) == 0:
+            return [[] for title in self._titles]
+        return [list(c) for c in self._cols]
+
+    def get_col(self, col):
+        """Get a copy of the column with the given index or title.
+
+        Numeric columns are returned as array.array, other columns as lists.
+        """
+        return self._col(col)[:]
+
+    def _col(self, col):
+        return self._cols[self._index(col)]
+
+    def min(self, col):
+        """Get the minimum of a column"""
+        return min(self._col(col))
+
+    def max(self, col):
+        """Get the maximum of a column"""
+        return max(self._col(col))
+
+    def mean(self, col):
+        """Get the arithmetic mean of a column"""
+        return stats.mean(self._col(col))
+
+    def percentile(self, col, p):
+        """Get the p-th percentile of a column, see stats.percentile()"""
+        return stats.percentile(self._col(col), p)
+
+    def group_by(self, col):
+        """Split the table on the values of a column.
+
+        Args:
+            col (int or str): The index or title of the column to group on.
+
+        Returns:
+            OrderedDict. Maps each value of the column, in order of first
+            appearance, to a res_table with the rows holding that value.
+        """
+        indices = OrderedDict()
+        for i, value in enumerate(self._col(col)):
+            indices.setdefault(value, []).append(i)
+
+        groups = OrderedDict()
+        for value, rows in indices.items():
+            group = res_table(self._titles)
+            for column in self._cols:
+                if isinstance(column, array.array):
+                    group._cols.append(array.array(column.typecode, (column[i] for i in rows)))
+                else:
+                    group._cols.append([column[i] for i in rows])
+            group.add_mode = self.add_mode
+            group.col_count = self.col_count
+            groups[value] = group
+        return groups
@@ -0,0 +1,243 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module saves the results of a run in results.npz, a compressed NumPy
+# archive with a typed column per field, so that they can be analyzed without
+# parsing the formatted numbers of data.csv and summary.json:
+#
+#     tables, meta = resultsfile.load('dats-report-.../results.npz')
+#     throughput = tables['dats.test.binsearch.BinarySearch']['measurement']
+#
+# Every test is a table with a row per result, as returned by run_all_tests().
+# Nested lists, like the latency per core, become two-dimensional columns.
+# The trials of the run, from the trial cache, are the table 'trials'. meta
+# holds the description of every table and the unit of every column.
+#
+# NumPy is optional, results.npz is only written when it is installed.
+
+import io
+import json
+import logging
+
+import dats.report as report
+
+
+VERSION = 1
+TRIALS = 'trials'
+
+# Units of the fields of the results and trials
+UNITS = {
+    'pkt_size': 'B',
+    'measurement': 'Mpps',
+    'mpps': 'Mpps',
+    'stddev': 'Mpps',
+    'ci_low': 'Mpps',
+    'ci_high': 'Mpps',
+    'pkt_loss': '%',
+    'test_value': '%',
+    'duration': 's',
+    'time_saved': 's',
+    'elapsed': 's',
+    'timestamp': 's',
+    'latency_min': 'ns',
+    'latency_max': 'ns',
+    'latency_avg': 'ns',
+}
+
+_numpy = None
+
+
+def _load_numpy():
+    """Import numpy, on first use.
+
+    Returns:
+        bool. True if numpy is available.
+    """
+    global _numpy
+
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+
+    return _numpy is not False
+
+
+def available():
+    """Return True if results files can be written and loaded."""
+    return _load_numpy()
+
+
+def _column(values):
+    """Convert the values of a field to a typed array.
+
+    Missing values are None. Numbers become a float column with NaN for
+    missing values, unless they are all present and all ints or all bools.
+    Lists of numbers become a two-dimensional float column, padded with NaN.
+    Anything else is stored as text, lists and dicts as JSON.
+    """
+    np = _numpy
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, bool) for v in present) and len(present) == len(values):
+        return np.array(values, dtype=np.bool_)
+    if all(isinstance(v, (int, long)) and not isinstance(v, bool) for v in present) and len(present) == len(values):
+        return np.array(values, dtype=np.int64)
+    if all(isinstance(v, (int, long, float)) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if all(isinstance(v, (list, tuple)) and all(isinstance(x, (int, long, float)) for x in v)
+           for v in present):
+        width = max(len(v) for v in present) if present else 0
+        column = np.full((len(values), width), np.nan)
+        for i, v in enumerate(values):
+            if v is not None:
+                column[i, :len(v)] = v
+        return column
+    return np.array([u'' if v is None else unicode(json.dumps(v) if isinstance(v, (list, tuple, dict)) else v)
+                     for v in values], dtype=np.unicode_)
+
+
+def _table(rows):
+    """Convert a list of dicts to {field: array}.
+
+    The items of a dict value, like the latency, are fields of their own.
+    """
+    flat_rows = []
+    fields = []
+    for row in rows:
+        flat = {}
+        for key, value in row.items():
+            if isinstance(value, dict):
+                flat.update(value)
+            else:
+                flat[key] = value
+        for key in flat:
+            if key not in fields:
+                fields.append(key)
+        flat_rows.append(flat)
+
+    return dict((field, _column([row.get(field) for row in flat_rows])) for field in fields)
+
+
+def _load_trials(filename):
+    """Return the trials recorded in a trial cache file, see dats.trialcache."""
+    trials = []
+    with open(filename) as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if 'key' not in entry:
+                continue
+            trial = entry['trial']
+            row = dict(test=entry.get('test', '') + '.' + entry.get('test_class', ''),
+                    pkt_size=entry.get('pkt_size'), value=entry.get('value'),
+                    duration=entry.get('duration'), success=bool(trial[0]),
+                    mpps=trial[1], pkt_loss=trial[2], elapsed=entry['elapsed'],
+                    timestamp=entry['timestamp'])
+            if len(trial) > 3 and isinstance(trial[3], dict):
+                row['latency'] = trial[3]
+            trials.append(row)
+    return trials
+
+
+def save(filename, fragments, trials_filename=None):
+    """Write the results of a run to a results file.
+
+    The file is replaced atomically.
+
+    Args:
+        filename (str): The file to write, its name should end in .npz.
+        fragments ([{test, results}]): The results of the tests, as returned
+            by dats.report.finish(). Failed tests are left out.
+        trials_filename (str): The trial cache of the run, None to leave out
+            the trials.
+    """
+    if not _load_numpy():
+        logging.info("NumPy is not installed, not writing %s", filename)
+        return
+
+    arrays = {}
+    meta = dict(version=VERSION, tables={})
+    tables = []
+    for fragment in fragments:
+        test = fragment['test']
+        if isinstance(fragment['results'], Exception):
+            continue
+        rows = [result for result in fragment['results'] if isinstance(result, dict)]
+        tables.append((test.__module__ + '.' + test.__class__.__name__, test.short_descr(), rows))
+    if trials_filename is not None:
+        tables.append((TRIALS, 'Trials', _load_trials(trials_filename)))
+
+    for name, descr, rows in tables:
+        columns = _table(rows)
+        meta['tables'][name] = dict(descr=descr,
+                units=dict((field, UNITS.get(field, '')) for field in columns))
+        for field, column in columns.items():
+            arrays[name + '/' + field] = column
+
+    arrays['meta'] = _numpy.array(json.dumps(meta))
+    buf = io.BytesIO()
+    _numpy.savez_compressed(buf, **arrays)
+    report.write_file(filename, buf.getvalue())
+
+
+def load(filename):
+    """Load a results file.
+
+    Args:
+        filename (str): The results file, as written by save().
+
+    Returns:
+        (tables, meta).
+        tables ({name: {field: numpy.ndarray}}): The columns of every
+            table. The tables of the tests are named module.Class, the
+            trials are table 'trials'.
+        meta (dict): {version, tables}, where tables maps the name of every
+            table to {descr, units}, the description of the table and the
+            unit of every field, '' when it has none.
+    """
+    if not _load_numpy():
+        raise Exception("Loading a results file requires NumPy")
+
+    tables = {}
+    with _numpy.load(filename, allow_pickle=False) as archive:
+        meta = json.loads(archive['meta'].item())
+        for key in archive.files:
+            if key == 'meta':
+                continue
+            name, field = key.rsplit('/', 1)
+            tables.setdefault(name, {})[field] = archive[key]
+    return tables, meta
@@ -80,59 +80,48 @@ def simple_table(array, has_hdr = True):
     Returns:
         str. A simple table in RST format containing the array data.
     """
-    result = ''
+    return ''.join(_simple_table_lines(array, has_hdr))
 
+def _simple_table_lines(array, has_hdr):
+    """Generate the lines of a simple table, see simple_table()."""
     logging.trace('Array passed in: %s', array)
+    cells = [[str(cell) for cell in row] for row in array]
+
     # Calculate max. lengths of each column. RST tables require column
     # alignment.
-    col_widths = [0] * len(sorted(array, cmp=lambda x,y: -cmp(len(x), len(y)))[0])
-    logging.trace('Initialized col_widths with 0: %s', col_widths)
-    for row in array:
-        logging.trace('- Adjusting column widths for row %s', row)
-        for index in range(len(row)):
-            col_widths[index] = max(col_widths[index], len(str(row[index])))
-        logging.trace('  New col_widths: %s', col_widths)
-
-    # Draw top border
-    for col_width in col_widths:
-        result += '=' * col_width
-        result += '  '
-    result += '\n'
+    col_widths = []
+    for row in cells:
+        for index, cell in enumerate(row):
+            if index < len(col_widths):
+                col_widths[index] = max(col_widths[index], len(cell))
+            else:
+                col_widths.append(len(cell))
+    logging.trace('Column widths: %s', col_widths)
+
+    border = ''.join('=' * col_width + '  ' for col_width in col_widths) + '\n'
+    yield border
 
     # Draw table cells, pad every cell with appropriate amount of spaces for
     # correct alignment.
     hdr_border_drawn = False
-    for row in array:
+    for row in cells:
         if len(row) > 1:
-            for index in range(len(row)):
-                result += str(row[index]).ljust(col_widths[index])
-                result += '  '
-            result += '\n'
+            yield ''.join(cell.ljust(col_width) + '  ' for cell, col_width in zip(row, col_widths)) + '\n'
 
             # Draw table header border if needed
             if has_hdr and not hdr_border_drawn:
-                for col_width in col_widths:
-                    result += '=' * col_width
-                    result += '  '
-                result += '\n'
+                yield border
 
             hdr_border_drawn = True
         else:
-            result += row[0] + "\n"
-
-            for index in range(len(col_widths)):
-                result += '=' * col_widths[index]
-                result += '==' if index > 0 else ""
-            result += '\n'
+            yield row[0] + "\n"
+            yield ''.join('=' * col_width + ('==' if index > 0 else '')
+                    for index, col_width in enumerate(col_widths)) + '\n'
             hdr_border_drawn = True
 
     # Draw bottom border
-    for col_width in col_widths:
-        result += '=' * col_width
-        result += '  '
-    result += '\n\n'
-
-    return result
+    yield border
+    yield '\n'
 
 def include(file):
     """Generate an include directive for the specified file.
@@ -155,3 +144,38 @@ def include(file):
     result += '\n'
 
     return result
+
+
+class Writer(object):
+    """Write reStructuredText piece by piece, to a file or to a buffer.
+
+    Reports are written as a sequence of pieces instead of by concatenating
+    ever longer strings. Without a file, the pieces are kept in a list and
+    joined once by getvalue().
+    """
+
+    def __init__(self, fh=None):
+        """Create a writer.
+
+        Args:
+            fh (file): The file to write to. None to write to a buffer.
+        """
+        self._parts = []
+        self.write = self._parts.append if fh is None else fh.write
+
+    def section(self, title, adornment, overline = False):
+        """Write a section title, see section()."""
+        self.write(section(title, adornment, overline))
+
+    def simple_table(self, array, has_hdr = True):
+        """Write a simple table, see simple_table()."""
+        for line in _simple_table_lines(array, has_hdr):
+            self.write(line)
+
+    def image(self, filename):
+        """Write an image directive for filename."""
+        self.write('.. image:: ' + filename + '\n\n')
+
+    def getvalue(self):
+        """Return everything written to the buffer."""
+        return ''.join(self._parts)
@@ -0,0 +1,246 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Run tests in parallel on a pool of testbeds.
+
+The testbeds are defined in [testbed:NAME] sections of the config file. A
+worker process is started per testbed and uses that testbed for all the jobs
+it runs. A job is a test class, or a single packet size of a test class when
+schedule is 'pkt_size' in the config file.
+
+Workers send the results, the KPI and the state of the test back to the main
+process, which merges the jobs of each test class into a single test object
+to generate the report.
+"""
+
+import sys
+import imp
+import time
+import signal
+import logging
+import traceback
+import multiprocessing
+
+import dats.config as config
+import dats.db as db
+import dats.timing as timing
+import dats.trace as trace
+import dats.report as report
+import dats.test.binsearch
+import dats.test.binsearchwlatency
+import dats.test.rampbase
+
+
+# Test classes that iterate over the packet sizes and can be split by packet size
+_pkt_size_tests = (
+    dats.test.binsearch.BinarySearch,
+    dats.test.binsearchwlatency.BinarySearchWithLatency,
+    dats.test.rampbase.RampBase,
+)
+
+_testbed = None
+
+
+def _init_worker(testbed_queue):
+    """Claim a testbed for the lifetime of the worker process."""
+    global _testbed
+
+    # The main process handles keyboard interrupts and terminates the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    _testbed = testbed_queue.get()
+    config.useTestbed(_testbed)
+    db.reopen_db()
+    trace.reopen_trace(_testbed['name'])
+    report.detach()
+
+
+def _run_job(job):
+    """Run a job in a worker process.
+
+    Args:
+        job ((str, str, str, int, int)): The test name, the file of the test
+            script, the name of the test class, the packet size to run the
+            test with, or None for all packet sizes, and the id of the test in
+            the results database.
+
+    Returns:
+        {testbed, results, error, kpi, state, timing}. Results is None when
+        the test raised an exception, error is the message of that exception
+        then. timing holds the timings of the phases of the job, see
+        dats.timing.take().
+    """
+    test_name, test_file, class_name, pkt_size, test_id = job
+
+    if test_name not in sys.modules:
+        imp.load_source(test_name, test_file)
+    test = getattr(sys.modules[test_name], class_name)()
+    db.set_test(test_id)
+    timing.set_test(test)
+
+    pkt_sizes = config.getOption('pktSizes')
+    if pkt_size is not None:
+        config.configuration['pktSizes'] = str(pkt_size)
+
+    logging.info("Running test %s - %s on testbed %s%s", class_name, test.short_descr(),
+            _testbed['name'], '' if pkt_size is None else ' with packet size ' + str(pkt_size))
+
+    results = None
+    error = None
+    try:
+        results = test.run()
+        logging.trace('Test results: %s', results)
+    except IOError, ex:
+        error = "I/O error ({0}): {1}: {2}".format(ex.errno, ex.filename, ex.strerror)
+        logging.error(error)
+    except Exception, ex:
+        error = str(ex)
+        logging.error(ex)
+        logging.debug("Exception: %s", traceback.format_exc())
+    finally:
+        config.configuration['pktSizes'] = pkt_sizes
+        db.flush()
+
+    return dict(testbed=_testbed['name'], results=results, error=error,
+            kpi=test._kpi, state=test.get_state(), timing=timing.take(test))
+
+
+def make_jobs(test_name, test_file, test_class, test_id=None):
+    """Return the jobs to run test_class with.
+
+    Args:
+        test_name (str): The name of the test the class is defined in.
+        test_file (str): The file of the test script.
+        test_class (class): The test class.
+        test_id (int): The id of the test in the results database.
+
+    Returns:
+        [(test_name, test_file, class_name, pkt_size, test_id)]. A job for the
+        whole test class, or a job per packet size if schedule is 'pkt_size'
+        in the config file and the test class supports it.
+    """
+    if config.getOption('schedule') == 'pkt_size' and issubclass(test_class, _pkt_size_tests):
+        return [(test_name, test_file, test_class.__name__, int(pkt_size), test_id)
+                for pkt_size in config.getOption('pktSizes').split(',')]
+
+    return [(test_name, test_file, test_class.__name__, None, test_id)]
+
+
+def run_parallel(test_classes, testbeds):
+    """Run test classes in parallel on a pool of testbeds.
+
+    The test modules must be loaded before calling this function, so that
+    the worker processes inherit them.
+
+    Args:
+        test_classes ([(str, str, class)]): The test name, the file of the
+            test script and the test class for every test class to run.
+        testbeds ([dict]): The testbeds, as returned by config.getTestbeds().
+
+    Returns:
+        [{test, results, testbeds}]. A dict per test class, in the order of
+        test_classes. test is a new test object with the merged state of the
+        jobs, results is the merged list of results of the jobs or an
+        Exception if a job failed and testbeds are the names of the testbeds
+        the jobs ran on. When interrupted by keyboard, the test classes that
+        did not complete get an Exception as results.
+    """
+    testbed_queue = multiprocessing.Queue()
+    for testbed in testbeds:
+        testbed_queue.put(testbed)
+
+    logging.info("Running tests on %d testbeds: %s", len(testbeds),
+            ', '.join(testbed['name'] for testbed in testbeds))
+
+    # The tests are added to the results database by the main process, the
+    # workers only add the trials.
+    test_ids = [db.add_test(test_class()) for _, _, test_class in test_classes]
+
+    # The workers must not inherit buffered trace records
+    trace.flush()
+    pool = multiprocessing.Pool(len(testbeds), _init_worker, (testbed_queue,))
+    pending = []
+    for (test_name, test_file, test_class), test_id in zip(test_classes, test_ids):
+        jobs = make_jobs(test_name, test_file, test_class, test_id)
+        pending.append((test_class, [pool.apply_async(_run_job, (job,)) for job in jobs]))
+    pool.close()
+
+    summaries = []
+    try:
+        for test_class, async_results in pending:
+            outcomes = [_wait(async_result) for async_result in async_results]
+            summaries.append(_merge(test_class, outcomes))
+    except KeyboardInterrupt:
+        logging.error("Test run interrupted by keyboard. Generating partial report.")
+        pool.terminate()
+        for test_class, _ in pending[len(summaries):]:
+            summaries.append(dict(test=test_class(), results=Exception('Test run interrupted by user'), testbeds=[]))
+    pool.join()
+
+    for summary, test_id in zip(summaries, test_ids):
+        db.finish_test(test_id, summary['test'], summary['results'])
+
+    return summaries
+
+
+def _wait(async_result):
+    """Wait for a job to finish and return its outcome.
+
+    The wait is done in short steps with a timeout, which keeps it
+    interruptible by keyboard without limiting how long a job may run.
+    """
+    while not async_result.ready():
+        async_result.wait(1)
+    return async_result.get()
+
+
+def _merge(test_class, outcomes):
+    """Merge the outcomes of the jobs of a test class into a test summary."""
+    test = test_class()
+    results = []
+    for outcome in outcomes:
+        test.set_state(outcome['state'])
+        timing.merge(test, outcome['timing'])
+        if outcome['error'] is not None:
+            results = Exception(outcome['error'])
+        elif not isinstance(results, Exception):
+            results += outcome['results']
+
+    # The jobs ran in packet size order, the KPI of the last job that set one
+    # is the KPI a sequential run would have ended with.
+    kpis = [outcome['kpi'] for outcome in outcomes if outcome['kpi'] is not None]
+    test._kpi = kpis[-1] if kpis else None
+
+    return dict(test=test, results=results,
+            testbeds=sorted(set(outcome['testbed'] for outcome in outcomes)))
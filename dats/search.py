@@ -0,0 +1,324 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Search strategies used by the test engines.
+
+A search strategy decides which value to test next. The test engine runs the
+search loop:
+
+    while not strategy.done():
+        value = strategy.propose()
+        ... run a trial with value ...
+        strategy.observe(value, success, metrics)
+
+and retrieves the outcome of the search from the strategy when it is done.
+Strategies don't run trials themselves, so they can be benchmarked offline
+against recorded or synthetic SUT responses, see bench_search.py.
+"""
+
+import abc
+
+
+class SearchStrategy(object):
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def propose(self):
+        """Return the next value to test.
+
+        Must only be called when done() returns False.
+
+        Returns:
+            float. The value to test.
+        """
+        return
+
+    @abc.abstractmethod
+    def observe(self, value, success, metrics=()):
+        """Feed the result of a trial back to the strategy.
+
+        Args:
+            value (float): The value that was tested.
+            success (bool): Whether the trial succeeded.
+            metrics (tuple): Measured quantities the strategy may use to
+                shape the search, like throughput and latency.
+        """
+        return
+
+    @abc.abstractmethod
+    def done(self):
+        """Return True when the search is complete."""
+        return
+
+
+class BinarySearchStrategy(SearchStrategy):
+    """Search the maximum successful value by bisection.
+
+    Binary search assumes the lower value of the interval is successful and
+    the upper value is a failure. The first value that is tested, is the
+    maximum value. If that succeeds, no more searching is needed. If it
+    fails, a regular binary search is performed.
+
+    The test value used for the first iteration of binary search is adjusted
+    so that the delta between this test value and the upper bound is a
+    power-of-2 multiple of precision. In the optimistic situation where this
+    first test value results in a success, the binary search will complete
+    on an integer multiple of the precision, rather than on a fraction of it.
+    """
+    def __init__(self, lower, upper, precision):
+        self.lower = lower
+        self.upper = upper
+        self._precision = precision
+
+        adjust = precision
+        while upper - lower > adjust:
+            adjust *= 2
+        self._adjust = (upper - lower - adjust) / 2
+        self._next = upper
+
+    def propose(self):
+        return self._next
+
+    def observe(self, value, success, metrics=()):
+        if success:
+            self.lower = value
+        else:
+            self.upper = value
+
+        self._next = self.lower + (self.upper - self.lower) / 2 + self._adjust
+        self._adjust = 0
+
+    def done(self):
+        return self.upper - self.lower < self._precision
+
+    def value(self):
+        """Return the maximum value found to be successful."""
+        return self.lower
+
+
+class GallopingSearchStrategy(BinarySearchStrategy):
+    """Search the maximum successful value by galloping down from the upper bound.
+
+    The upper bound is tested first. While trials fail, the distance to the
+    upper bound is doubled, starting at precision. The first success brackets
+    the maximum successful value, which is then found by bisection.
+
+    This needs fewer trials than plain bisection when the maximum is close to
+    the upper bound, and more when it is far below it.
+    """
+    def __init__(self, lower, upper, precision):
+        super(GallopingSearchStrategy, self).__init__(lower, upper, precision)
+        self._adjust = 0
+        self._step = precision
+        self._galloping = True
+        self._next = upper
+
+    def observe(self, value, success, metrics=()):
+        if not self._galloping:
+            return super(GallopingSearchStrategy, self).observe(value, success, metrics)
+
+        if success:
+            self.lower = value
+            self._galloping = False
+            self._next = self.lower + (self.upper - self.lower) / 2
+        else:
+            self.upper = value
+            self._next = max(self.upper - self._step, self.lower)
+            self._step *= 2
+            if self._next == self.lower:
+                # The lower bound is assumed to succeed, bisect from here.
+                self._galloping = False
+                self._next = self.lower + (self.upper - self.lower) / 2
+
+
+class BackoffStrategy(SearchStrategy):
+    """Confirm a value, backing off on failure.
+
+    The value is tested first. When a trial fails, the value is lowered in
+    steps that double in size, starting at precision, until a trial succeeds
+    or the lower bound is reached.
+    """
+    def __init__(self, value, lower, precision):
+        self._next = value
+        self._lower = lower
+        self._step = precision
+        self._confirmed = None
+
+    def propose(self):
+        return self._next
+
+    def observe(self, value, success, metrics=()):
+        if success:
+            self._confirmed = value
+        else:
+            self._next = max(value - self._step, self._lower)
+            self._step *= 2
+
+    def done(self):
+        return self._confirmed is not None or self._next <= self._lower
+
+    def value(self):
+        """Return the confirmed value, or None if no value was confirmed."""
+        return self._confirmed
+
+
+class LinearStrategy(SearchStrategy):
+    """Step through a range of values with a fixed step size."""
+    def __init__(self, start, step, end=100):
+        self._next = start
+        self._step = step
+        self._end = end
+
+    def propose(self):
+        return self._next
+
+    def observe(self, value, success, metrics=()):
+        self._next = value + self._step
+
+    def done(self):
+        return self._next > self._end
+
+
+class AdaptiveRampStrategy(SearchStrategy):
+    """Measure a curve with adaptive step refinement.
+
+    A coarse ramp from start to end is measured first, using half of the
+    budget. Every remaining value is inserted in the middle of the interval
+    between two measured values where the measured curves change fastest,
+    i.e. where the sum of the curvature at both ends of the interval and the
+    change over it is largest. All metrics passed to observe() are curves
+    and are normalized to their maximum.
+
+    Intervals narrower than twice min_width are not refined.
+    """
+    def __init__(self, start, budget, min_width, end=100):
+        n_coarse = max(2, budget // 2)
+        self._coarse = [round(start + (end - start) * float(i) / (n_coarse - 1), 2) for i in range(n_coarse)]
+        self._budget = budget
+        self._min_width = min_width
+        self._points = []
+        self._next = None
+
+    def propose(self):
+        if self._coarse:
+            return self._coarse[0]
+        return self._next
+
+    def observe(self, value, success, metrics=()):
+        if self._coarse and value == self._coarse[0]:
+            self._coarse.pop(0)
+
+        self._points.append((value, tuple(metrics)))
+        self._points.sort()
+
+        if not self._coarse and len(self._points) < self._budget:
+            interval = self._steepest_interval()
+            if interval is None:
+                self._next = None
+            else:
+                self._next = round((self._points[interval][0] + self._points[interval + 1][0]) / 2, 2)
+
+    def done(self):
+        if self._coarse:
+            return False
+        return len(self._points) >= self._budget or self._next is None
+
+    def _steepest_interval(self):
+        """Return the index i of the interval between points i and i + 1 to refine next."""
+        xs = [point[0] for point in self._points]
+        curves = []
+        for metric in range(len(self._points[0][1])):
+            ys = [point[1][metric] for point in self._points]
+            scale = max(abs(y) for y in ys) or 1.0
+            curves.append([y / scale for y in ys])
+
+        x_scale = (xs[-1] - xs[0]) or 1.0
+
+        def slope(ys, i):
+            return (ys[i + 1] - ys[i]) / ((xs[i + 1] - xs[i]) / x_scale)
+
+        def curvature(ys, i):
+            # Change of slope at point i, 0 at both ends of the curve
+            if i == 0 or i == len(xs) - 1:
+                return 0.0
+            return abs(slope(ys, i) - slope(ys, i - 1))
+
+        best = None
+        best_score = -1.0
+        for i in range(len(xs) - 1):
+            width = xs[i + 1] - xs[i]
+            if width < 2 * self._min_width:
+                continue
+
+            # The error of linear interpolation over the interval grows with
+            # the curvature at its ends and with its width. The change over
+            # the interval keeps steep but straight parts of the curve from
+            # being ignored completely.
+            score = 0.0
+            for ys in curves:
+                score += (curvature(ys, i) + curvature(ys, i + 1)) / 2 * width / x_scale
+                score += 0.25 * abs(ys[i + 1] - ys[i])
+
+            if score > best_score:
+                best, best_score = i, score
+
+        return best
+
+
+# Strategies for finding the maximum successful value, by name as used for
+# search_strategy in the config file.
+strategies = {
+    'binary': BinarySearchStrategy,
+    'galloping': GallopingSearchStrategy,
+}
+
+
+def get_strategy(name, lower, upper, precision):
+    """Create a strategy for finding the maximum successful value.
+
+    Args:
+        name (str): The name of the strategy, a key of strategies.
+        lower (float): The lower bound, assumed to succeed.
+        upper (float): The upper bound.
+        precision (float): The search stops when the interval containing the
+            maximum is narrower than this.
+
+    Returns:
+        SearchStrategy. The strategy.
+    """
+    if name not in strategies:
+        raise Exception("Unknown search strategy '{}', valid strategies are: {}"
+                .format(name, ', '.join(sorted(strategies))))
+
+    return strategies[name](lower, upper, precision)
@@ -0,0 +1,180 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Helper functions for descriptive statistics on repeated measurements.
+"""
+
+import math
+
+
+# Two-sided critical values of Student's t-distribution for a 95% confidence
+# level, indexed by the degrees of freedom. For more than 30 degrees of
+# freedom the normal approximation is used.
+_T_95 = [
+    None, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+    2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093,
+    2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045,
+    2.042,
+]
+
+
+def t_critical(dof):
+    """Return the critical value of the t-distribution for a 95% confidence level.
+
+    Args:
+        dof (int): The degrees of freedom, must be at least 1.
+
+    Returns:
+        float. The two-sided critical value.
+    """
+    if dof < len(_T_95):
+        return _T_95[dof]
+    return 1.960
+
+
+def mean(values):
+    """Return the arithmetic mean of values."""
+    return sum(values) / float(len(values))
+
+
+def stddev(values):
+    """Return the sample standard deviation of values.
+
+    Returns 0 when there are fewer than two values.
+    """
+    if len(values) < 2:
+        return 0.0
+
+    avg = mean(values)
+    return math.sqrt(sum((v - avg) ** 2 for v in values) / (len(values) - 1))
+
+
+def summarize(values):
+    """Summarize a list of measurements.
+
+    Args:
+        values ([float]): The measurements, at least one.
+
+    Returns:
+        {mean, stddev, ci_low, ci_high, repetitions}.
+        mean (float): The mean of the measurements.
+        stddev (float): The sample standard deviation.
+        ci_low (float): The lower end of the 95% confidence interval of the
+            mean.
+        ci_high (float): The upper end of the 95% confidence interval of the
+            mean.
+        repetitions (int): The number of measurements.
+    """
+    avg = mean(values)
+    dev = stddev(values)
+
+    if len(values) < 2:
+        half_width = 0.0
+    else:
+        half_width = t_critical(len(values) - 1) * dev / math.sqrt(len(values))
+
+    return dict(
+        mean=avg,
+        stddev=dev,
+        ci_low=avg - half_width,
+        ci_high=avg + half_width,
+        repetitions=len(values),
+    )
+
+
+def prediction_interval(values):
+    """Return the 95% prediction interval for a new measurement.
+
+    A new measurement from the same distribution as values falls within the
+    interval with a probability of 95%.
+
+    Args:
+        values ([float]): The earlier measurements, at least one.
+
+    Returns:
+        (low, high). The interval. It is empty, i.e. low equals high, when
+        there are fewer than two values.
+    """
+    avg = mean(values)
+    if len(values) < 2:
+        return avg, avg
+
+    half_width = t_critical(len(values) - 1) * stddev(values) * math.sqrt(1 + 1.0 / len(values))
+    return avg - half_width, avg + half_width
+
+
+def percentile(values, p):
+    """Return the p-th percentile of values.
+
+    Values between two measurements are interpolated linearly.
+
+    Args:
+        values ([float]): The measurements, at least one.
+        p (float): The percentile, between 0 and 100.
+
+    Returns:
+        float. The percentile.
+    """
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * p / 100.0
+    low = int(math.floor(pos))
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def significant_difference(a, b):
+    """Test whether two repeated measurements differ, with Welch's t-test.
+
+    Args:
+        a ((mean, stddev, repetitions)): The summary of the first
+            measurement.
+        b ((mean, stddev, repetitions)): The summary of the second
+            measurement.
+
+    Returns:
+        bool. True if the means differ at a 95% confidence level, None when
+        either measurement was not repeated or neither varied.
+    """
+    (mean_a, dev_a, n_a), (mean_b, dev_b, n_b) = a, b
+    if n_a is None or n_b is None or n_a < 2 or n_b < 2:
+        return None
+
+    var_a = dev_a ** 2 / float(n_a)
+    var_b = dev_b ** 2 / float(n_b)
+    if var_a + var_b == 0:
+        return None
+
+    t = abs(mean_a - mean_b) / math.sqrt(var_a + var_b)
+    dof = (var_a + var_b) ** 2 / (var_a ** 2 / (n_a - 1) + var_b ** 2 / (n_b - 1))
+    return t > t_critical(max(1, int(dof)))
@@ -60,10 +60,17 @@ The test run looks like:
 
 import abc
 import sys
+import time
+import pickle
 import logging
 
 from dats.remote_control import remote_system
 import dats.config as config
+import dats.stats as stats
+import dats.trialcache as trialcache
+import dats.db as db
+import dats.timing as timing
+import dats.report as report
 
 
 class TestBase(object):
@@ -132,6 +139,13 @@ class TestBase(object):
         self._kpi = None
         self._remotes = {}
         self._n_ports = config.getOption('numberOfPorts')
+        self._time_saved = 0.0
+        # (pkt_size, speed, trial) of the previous trial when the SUT is
+        # still set up for it, None otherwise
+        self._warm_state = None
+        # (timestamp, rx, tx) snapshots of the packet counters during the
+        # measurement window of the current trial
+        self._counter_samples = []
 
         return
 
@@ -186,6 +200,42 @@ class TestBase(object):
         return self._remotes[remote_name]
 
 
+    def get_state(self):
+        """Return the state of the test that can be passed between processes.
+
+        When tests run in parallel on a pool of testbeds, see dats.scheduler,
+        the state is sent from the worker process that ran the test to the
+        main process, which restores it with set_state() in a new test object
+        to generate the report.
+
+        Returns:
+            {name: str}. The attributes of the test object, pickled. The
+            remotes are left out, as are attributes that cannot be pickled,
+            like open connections. Their names are logged.
+        """
+        state = {}
+        dropped = []
+        for name, value in vars(self).items():
+            if name == '_remotes':
+                continue
+            try:
+                # Sending the pickled values keeps the pool from pickling
+                # everything a second time
+                state[name] = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                dropped.append(name)
+
+        if dropped:
+            logging.verbose("Attributes of %s not passed to the main process: %s",
+                    self.__class__.__name__, ', '.join(sorted(dropped)))
+
+        return state
+
+    def set_state(self, state):
+        """Restore the state returned by get_state()."""
+        for name, value in state.items():
+            setattr(self, name, pickle.loads(value))
+
     def kpi(self):
         """Return the Key Performance Indicator (KPI) for the test.
 
@@ -240,6 +290,272 @@ class TestBase(object):
         """
         pass
 
+    def change_rate(self, **kwargs):
+        """Change the rate of a test the previous trial has set up already.
+
+        Called by run_trial() instead of setup_test() when the previous trial
+        used the same packet size and warm_state_valid() accepts the state it
+        left behind, so that state like ARP tables and packet header values
+        can be kept and the speed only has to ramp from the previous speed.
+
+        This method may be overridden by specific test cases. The default
+        performs a full setup_test().
+
+        Args:
+            **kwargs: pkt_size, prev_speed and speed
+        """
+        self.setup_test(pkt_size=kwargs['pkt_size'], speed=kwargs['speed'])
+
+    def warm_state_valid(self, pkt_size, trial):
+        """Return whether the state left by the previous trial can be kept.
+
+        This method may be overridden by specific test cases, for example to
+        force a full setup_test() after a trial with heavy packet loss.
+
+        Args:
+            pkt_size (int): The packet size of the previous trial
+            trial (tuple): The results of run_test() for the previous trial
+
+        Returns:
+            bool. True if change_rate() can be used for the next trial.
+        """
+        return True
+
+    def run(self):
+        """Set up the test class, run all tests and tear the test class down.
+
+        The time taken by each of these phases is recorded in the trial
+        cache, so the planner can estimate the duration of future runs. The
+        phases are also timed for the time breakdown of the report, see
+        dats.timing.
+
+        Returns:
+            The results of run_all_tests().
+        """
+        start_time = time.time()
+        with timing.phase('setup_class'):
+            self.setup_class()
+        self._record_timing('setup_class', time.time() - start_time)
+
+        start_time = time.time()
+        with timing.phase('run_all_tests'):
+            results = self.run_all_tests()
+        self._record_timing('run_all_tests', time.time() - start_time,
+                pkt_sizes=config.getOption('pktSizes'))
+
+        start_time = time.time()
+        with timing.phase('teardown_class'):
+            self.teardown_class()
+        self._record_timing('teardown_class', time.time() - start_time)
+
+        return results
+
+    def save_partial_results(self, results):
+        """Save the results of the packet sizes tested so far.
+
+        Called by run_all_tests() after every packet size, so the results
+        are in the report directory even when the test run is killed.
+
+        Args:
+            results: The results so far, in the format returned by
+                run_all_tests().
+        """
+        report.update(self, results)
+
+    def _record_timing(self, phase, elapsed, **kwargs):
+        trialcache.record_timing(phase, elapsed, test=self.__module__,
+                test_class=self.__class__.__name__, **kwargs)
+
+    def run_trial(self, pkt_size, duration, value):
+        """Set up, run and tear down a single trial.
+
+        Args:
+            pkt_size (int): The packet size to use for this trial
+            duration (float): The duration in seconds of the trial
+            value (float): The value to test with
+
+        When the previous trial used the same packet size, the test is only
+        changed to the new rate with change_rate() instead of being set up
+        from scratch, see warm_trials in the config file.
+
+        The trial is looked up in the trial cache first. If it was run
+        already, as recorded when resuming an interrupted run, the cached
+        results are returned instead. Otherwise the results are recorded in
+        the cache.
+
+        Returns:
+            tuple. The results of run_test() for the trial.
+        """
+        key = self.trial_key(pkt_size, duration, value)
+        trial = trialcache.lookup(key)
+        if trial is not None:
+            logging.info("Using cached result for value %s", value)
+            # Nothing was set up on the SUT for this trial
+            self._warm_state = None
+            db.record_trial(pkt_size, value, duration, trial, 0.0, cached=True)
+            return trial
+
+        start_time = time.time()
+        self._counter_samples = []
+        warm_state, self._warm_state = self._warm_state, None
+        if (int(config.getOption('warmTrials')) and warm_state is not None
+                and warm_state[0] == pkt_size
+                and self.warm_state_valid(pkt_size, warm_state[2])):
+            logging.verbose("Changing rate from %s to %s", warm_state[1], value)
+            with timing.phase('change_rate'):
+                self.change_rate(pkt_size=pkt_size, prev_speed=warm_state[1], speed=value)
+        else:
+            with timing.phase('setup_test'):
+                self.setup_test(pkt_size=pkt_size, speed=value)
+        with timing.phase('run_test'):
+            trial = self.run_test(pkt_size, duration, value)
+        with timing.phase('teardown_test'):
+            self.teardown_test(pkt_size=pkt_size)
+        self._warm_state = (pkt_size, value, trial)
+
+        elapsed = time.time() - start_time
+        trialcache.record(key, trial, elapsed,
+                test=self.__module__, test_class=self.__class__.__name__,
+                pkt_size=pkt_size, value=value, duration=duration)
+        db.record_trial(pkt_size, value, duration, trial, elapsed, counters=self._counter_samples)
+
+        return trial
+
+    def trial_key(self, pkt_size, duration, value):
+        """Return the key identifying a trial in the trial cache.
+
+        The key covers the test, the config files copied to the remotes, the
+        tolerated loss and the trial parameters.
+
+        Returns:
+            str. The key of the trial.
+        """
+        config_hashes = {}
+        for remote_name, remote in self._remotes.items():
+            for filename, digest in remote.get_config_hashes().items():
+                config_hashes[remote_name + '/' + filename] = digest
+        config_hashes['toleratedLoss'] = str(config.getOption('toleratedLoss'))
+
+        return trialcache.make_key(self.__module__, self.__class__.__name__,
+                config_hashes, pkt_size, value, duration)
+
+    def repeat_measurement(self, first, measure):
+        """Repeat a measurement until its confidence interval is narrow enough.
+
+        The measurement is repeated until the configured maximum number of
+        repetitions is reached or, after the minimum number of repetitions,
+        the 95% confidence interval of the mean is narrow enough.
+
+        A repetition for which measure returns None failed. It counts towards
+        the maximum number of repetitions, but is left out of the statistics.
+
+        Args:
+            first (float): The value of the measurement that was already done.
+            measure (callable): Performs one more measurement and returns its
+                value, or None if the measurement failed.
+
+        Returns:
+            {mean, stddev, ci_low, ci_high, repetitions, measurements, failed}.
+            See dats.stats.summarize() for a description of the keys.
+            measurements ([float]) contains the individual values.
+            failed (int) is the number of failed repetitions.
+        """
+        max_repetitions = int(config.getOption('repetitions'))
+        min_repetitions = int(config.getOption('minRepetitions'))
+        width = config.getOption('confidenceWidth')
+
+        measurements = [first]
+        failed = 0
+        summary = stats.summarize(measurements)
+        while len(measurements) + failed < max_repetitions:
+            if width is not None and len(measurements) >= min_repetitions:
+                ci_width = summary['ci_high'] - summary['ci_low']
+                if ci_width <= float(width) * abs(summary['mean']) / 100.0:
+                    break
+
+            repetition = len(measurements) + failed + 1
+            logging.info("Repetition %d (at most %d)", repetition, max_repetitions)
+            value = measure()
+            if value is None:
+                logging.warning("Repetition %d failed, leaving it out of the statistics", repetition)
+                failed += 1
+                continue
+
+            measurements.append(value)
+            summary = stats.summarize(measurements)
+
+        logging.info("Mean of %d repetitions: %.2f, 95%% confidence interval [%.2f, %.2f]",
+                summary['repetitions'], summary['mean'], summary['ci_low'], summary['ci_high'])
+
+        summary['measurements'] = measurements
+        summary['failed'] = failed
+        return summary
+
+    def measurement_window(self, duration, loss_counters):
+        """Wait for the measurement window of a trial to elapse.
+
+        When early abort is enabled in the config file, the loss counters are
+        polled during the window. As soon as the packets lost so far exceed
+        the loss that is tolerated for the whole duration, the window is cut
+        short and the time that was not spent is added to the time saved by
+        the current search.
+
+        The counters are also polled when counter_samples is enabled in the
+        config file. The results database records the snapshots with the
+        trial.
+
+        Args:
+            duration (float): The duration of the measurement window in
+                seconds.
+            loss_counters (callable): Returns a tuple (rx, tx) with the
+                number of packets received and sent since the statistics
+                were reset.
+
+        Returns:
+            bool. True if the trial was aborted because too many packets were
+            lost, False if the full window elapsed.
+        """
+        with timing.phase('measurement'):
+            return self._measurement_window(duration, loss_counters)
+
+    def _measurement_window(self, duration, loss_counters):
+        early_abort = int(config.getOption('earlyAbort'))
+        if not early_abort and not int(config.getOption('counterSamples')):
+            time.sleep(duration)
+            return False
+
+        interval = float(config.getOption('earlyAbortInterval'))
+        slack = float(config.getOption('earlyAbortSlack'))
+        tolerated = float(config.getOption('toleratedLoss')) / 100.0
+
+        rx, tx_start = loss_counters()
+        start = time.time()
+        self._counter_samples.append((start, rx, tx_start))
+        end = start + duration
+        now = start
+        while now < end:
+            time.sleep(min(interval, end - now))
+            now = time.time()
+            rx, tx = loss_counters()
+            self._counter_samples.append((now, rx, tx))
+
+            elapsed = now - start
+            if not early_abort or tx <= tx_start or elapsed <= 0:
+                continue
+
+            # Extrapolate the number of packets sent at the end of the window
+            # at the current rate. The loss budget is relative to that, plus
+            # the packets that may still be in flight.
+            tx_rate = (tx - tx_start) / elapsed
+            budget = (tx + tx_rate * (end - now)) * tolerated + tx_rate * slack
+            if tx - rx > budget:
+                logging.verbose("Lost %d packets after %.1f s, budget for the trial is %d. Aborting trial.",
+                        tx - rx, elapsed, budget)
+                self._time_saved += end - now
+                return True
+
+        return False
+
     @abc.abstractmethod
     def run_all_tests(self):
         """Run all the tests in the script.
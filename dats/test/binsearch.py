@@ -46,6 +46,7 @@ import logging
 
 import dats.test.base
 import dats.config as config
+import dats.search as search
 import dats.plot
 import dats.utils as utils
 import dats.rstgen as rst
@@ -104,6 +105,10 @@ class BinarySearch(dats.test.base.TestBase):
             following keys are added to the dicts:
             pkt_size (int): The packet size used when measuring
             duration (float): The duration of the search in seconds
+            time_saved (float): Measurement time saved by aborting trials
+                early, in seconds
+            When measurements are repeated, the keys added by
+            repeat_search() are present as well.
         """
         results = []
 
@@ -116,13 +121,21 @@ class BinarySearch(dats.test.base.TestBase):
 
             # time duration of a single step
             duration = float(config.getOption('testDuration'))
+            self._time_saved = 0.0
             start_time = time.time()
             result = self.run_test_with_pkt_size(pkt_size, duration)
+            if int(config.getOption('repetitions')) > 1:
+                self.repeat_search(pkt_size, duration, result)
             stop_time = time.time()
             result['pkt_size'] = pkt_size
             result['duration'] = stop_time - start_time
+            result['time_saved'] = self._time_saved
+            if self._time_saved > 0:
+                logging.info("Early abort saved %.1f s while testing with packet size %d",
+                        self._time_saved, pkt_size)
 
             results.append(result)
+            self.save_partial_results(results)
 
         return results
 
@@ -134,70 +147,152 @@ class BinarySearch(dats.test.base.TestBase):
             duration (int): The duration for each try.
 
         Returns:
-            {lower_bound, upper_bound, measurement}.
+            {lower_bound, upper_bound, value, measurement}.
             lower_bound (long): The lower bound of the search interval.
             upper_bound (long): The upper bound of the search interval.
-            measurement (long): The maximum value in the interval that yields
+            value (float): The maximum value in the interval that yields
             success.
+            measurement (long): The throughput measured at that value.
+            The keys returned by trial_result() are added as well.
         """
         precision = float(config.getOption('testPrecision'))
 
-        lower = self.lower_bound(pkt_size)
-        upper = self.upper_bound(pkt_size)
+        # Explore with short probe trials if requested. The value found is
+        # then confirmed with a trial of the full duration below.
+        probe_duration = config.getOption('probeDuration')
+        search_duration = duration if probe_duration is None else float(probe_duration)
 
         logging.info("Testing with packet size %d", pkt_size)
 
-        # Binary search assumes the lower value of the interval is
-        # successful and the upper value is a failure.
-        # The first value that is tested, is the maximum value. If that
-        # succeeds, no more searching is needed. If it fails, a regular
-        # binary search is performed.
-        # The test_value used for the first iteration of binary search
-        # is adjusted so that the delta between this test_value and the
-        # upper bound is a power-of-2 multiple of precision. In the
-        # optimistic situation where this first test_value results in a
-        # success, the binary search will complete on an integer multiple
-        # of the precision, rather than on a fraction of it.
-        adjust = precision
-        while upper - lower > adjust:
-            adjust *= 2
-        adjust = (upper - lower - adjust) / 2
-
-        test_value = upper
-
-        # throughput and packet loss from the last successfull test
-        successfull_throughput = 0
-        successfull_pkt_loss = 0
-        while upper - lower >= precision:
+        # The strategy decides which value to test next, see dats.search.
+        strategy = search.get_strategy(config.getOption('searchStrategy'),
+                self.lower_bound(pkt_size), self.upper_bound(pkt_size), precision)
+
+        # the last successfull trial and the last trial of the search
+        successfull_trial = None
+        last_trial = None
+        while not strategy.done():
             logging.verbose("New interval [%s, %s), precision: %d",
-                lower, upper, upper - lower)
+                strategy.lower, strategy.upper, strategy.upper - strategy.lower)
+            test_value = strategy.propose()
             logging.info("Testing with value %s", test_value)
 
-            self.setup_test(pkt_size=pkt_size, speed=test_value)
-            success, throughput, pkt_loss = self.run_test(pkt_size, duration, test_value)
-            self.teardown_test(pkt_size=pkt_size)
+            last_trial = self.run_trial(pkt_size, search_duration, test_value)
+            success, throughput = last_trial[0], last_trial[1]
+            strategy.observe(test_value, success, (throughput,))
 
             if success:
                 logging.verbose("Success! Increasing lower bound")
-                lower = test_value
-                successfull_throughput = throughput
-                successfull_pkt_loss = pkt_loss
+                successfull_trial = last_trial
             else:
                 logging.verbose("Failure... Decreasing upper bound")
-                upper = test_value
 
-            test_value = lower + (upper - lower) / 2 + adjust
-            adjust = 0
+        lower = strategy.value()
+
+        confirm_durations = []
+        if probe_duration is not None:
+            confirm_durations.append(duration)
+        if config.getOption('soakDuration') is not None:
+            confirm_durations.append(float(config.getOption('soakDuration')))
+
+        for confirm_duration in confirm_durations:
+            if lower <= self.lower_bound(pkt_size):
+                break
 
-        successfull_throughput = round(successfull_throughput, 2)
-        self.update_kpi(dict(pkt_size=pkt_size, measurement=successfull_throughput))
+            lower, successfull_trial = self.confirm_value(pkt_size, lower, confirm_duration, precision)
 
-        return dict(
+        result = dict(
             lower_bound=self.lower_bound(pkt_size),
             upper_bound=self.upper_bound(pkt_size),
-            measurement=successfull_throughput,
-            pkt_loss=successfull_pkt_loss
+            value=lower,
         )
+        result.update(self.trial_result(successfull_trial, last_trial))
+        self.update_kpi(dict(pkt_size=pkt_size, measurement=result['measurement']))
+
+        return result
+
+    def trial_result(self, trial, last_trial):
+        """Return the results of a search taken from its trials.
+
+        Tests whose run_test() returns more than the throughput and the
+        packet loss override this method to add the other results.
+
+        Args:
+            trial (tuple): The results of run_trial() for the trial that
+                defined the value found, None if no trial succeeded.
+            last_trial (tuple): The results of run_trial() for the last trial
+                of the search.
+
+        Returns:
+            {measurement, pkt_loss}. The throughput and the packet loss of
+            trial, 0 if no trial succeeded.
+        """
+        if trial is None:
+            return dict(measurement=0.0, pkt_loss=0)
+
+        return dict(measurement=round(trial[1], 2), pkt_loss=trial[2])
+
+    def repeat_search(self, pkt_size, duration, result):
+        """Repeat the measurement for a packet size and add its statistics to result.
+
+        Depending on repeat_mode in the config file, either the complete
+        search is repeated, or only a full-duration trial at the value found
+        by the first search. The search is repeated when that search found no
+        successful value. Trials that fail are repetitions that failed, see
+        repeat_measurement().
+
+        The measurement in result is replaced by the mean of all repetitions
+        and the keys returned by repeat_measurement() are added.
+
+        Args:
+            pkt_size (int): The packet size to test with.
+            duration (float): The duration of a trial.
+            result (dict): The result of the first search, as returned by
+                run_test_with_pkt_size().
+        """
+        if config.getOption('repeatMode') == 'trial' and result['value'] > self.lower_bound(pkt_size):
+            def measure():
+                trial = self.run_trial(pkt_size, duration, result['value'])
+                return round(trial[1], 2) if trial[0] else None
+        else:
+            measure = lambda: self.run_test_with_pkt_size(pkt_size, duration)['measurement']
+
+        result.update(self.repeat_measurement(result['measurement'], measure))
+        result['measurement'] = round(result['mean'], 2)
+        self.update_kpi(dict(pkt_size=pkt_size, measurement=result['measurement']))
+
+    def confirm_value(self, pkt_size, value, duration, precision):
+        """Confirm the result of a search with a trial of the given duration.
+
+        If the trial fails, the value is backed off in steps that double in
+        size, starting at precision, until a trial succeeds or the lower bound
+        is reached.
+
+        Args:
+            pkt_size (int): The packet size to test with.
+            value (float): The value found by the search.
+            duration (float): The duration of the confirmation trials.
+            precision (float): The size of the first back-off step.
+
+        Returns:
+            (value, trial). The confirmed value and the results of run_test()
+            for the trial that confirmed it. If no value could be confirmed,
+            the lower bound and None are returned.
+        """
+        strategy = search.BackoffStrategy(value, self.lower_bound(pkt_size), precision)
+        trial = None
+        while not strategy.done():
+            value = strategy.propose()
+            logging.info("Confirming value %s with a %g s trial", value, duration)
+            trial = self.run_trial(pkt_size, duration, value)
+            strategy.observe(value, trial[0])
+            if not trial[0]:
+                logging.verbose("Confirmation failed, backing off")
+
+        if strategy.value() is None:
+            return self.lower_bound(pkt_size), None
+
+        return strategy.value(), trial
 
     @abc.abstractmethod
     def run_test(self, pkt_size, duration, value):
@@ -236,7 +331,10 @@ class BinarySearch(dats.test.base.TestBase):
         dats.plot.bar_plot(table, dir + prefix + 'results.png')
 
         # Generate table
+        repeated = len(results) > 0 and 'stddev' in results[0]
         table = [['Packet size (B)', 'Throughput (Mpps)', 'Theoretical Max (Mpps)', 'Duration (s)', 'Packet loss (%)']]
+        if repeated:
+            table[0] += ['Stddev (Mpps)', '95% CI (Mpps)', 'Repetitions', 'Failed']
         for result in results:
             # TODO move formatting to <typeof(measurement)>.__str__
             table.append([
@@ -246,14 +344,55 @@ class BinarySearch(dats.test.base.TestBase):
                 "{:.1f}".format(round(result['duration'], 1)),
                 "{:.5f}".format(round(result['pkt_loss'], 5)),
             ])
+            if repeated:
+                table[-1] += [
+                    "{:.2f}".format(result['stddev']),
+                    "{:.2f} - {:.2f}".format(result['ci_low'], result['ci_high']),
+                    result['repetitions'],
+                    result['failed'],
+                ]
 
         # Generate reStructuredText report
-        report = ''
-        report += '.. image:: ' + prefix + 'results.png\n'
-        report += '\n'
-        report += rst.simple_table(table)
+        report = rst.Writer()
+        report.image(prefix + 'results.png')
+        report.simple_table(table)
+        if repeated and any(result['failed'] for result in results):
+            report.write('Failed repetitions are left out of the throughput, the stddev and the CI.\n\n')
+        self.report_sla(report)
+
+        time_saved = sum(result['time_saved'] for result in results)
+        if time_saved > 0:
+            report.write('Aborting trials early saved {:.1f} s of measurement time.\n\n'.format(time_saved))
+
+        self.report_details(report, results, prefix, dir)
+
+        return report.getvalue()
+
+    def report_sla(self, report):
+        """Write the SLA the throughput in the report has to meet.
+
+        Does nothing by default. Tests with an SLA beyond the tolerated
+        packet loss override this method.
+
+        Args:
+            report (dats.rstgen.Writer): The report to write to.
+        """
+        pass
+
+    def report_details(self, report, results, prefix, dir):
+        """Write the results that are not part of the throughput table.
+
+        Does nothing by default. Tests that return more than the throughput
+        and the packet loss override this method.
+
+        Args:
+            report (dats.rstgen.Writer): The report to write to.
+            results ([{...}]): The results, as returned by run_all_tests().
+            prefix (str): The prefix of the file names of the figures.
+            dir (str): The directory to write the figures to.
+        """
+        pass
 
-        return report
     def generate_json(self, results):
         test_results = dict()
         index = 0
@@ -264,20 +403,35 @@ class BinarySearch(dats.test.base.TestBase):
             result_dict['TheoreticalMax(Mpps)'] = "{:.2f}".format(round(utils.line_rate_to_pps(result['pkt_size'], float(self._n_ports)) / 1000000, 2))
             result_dict['Duration(s)'] = "{:.1f}".format(round(result['duration'], 1))
             result_dict['PacketLoss(%)'] = round(result['pkt_loss'], 5)
+            result_dict['TimeSaved(s)'] = "{:.1f}".format(result['time_saved'])
+            if 'stddev' in result:
+                result_dict['Stddev(Mpps)'] = "{:.2f}".format(result['stddev'])
+                result_dict['CILow(Mpps)'] = "{:.2f}".format(result['ci_low'])
+                result_dict['CIHigh(Mpps)'] = "{:.2f}".format(result['ci_high'])
+                result_dict['Repetitions'] = result['repetitions']
+                result_dict['FailedRepetitions'] = result['failed']
             test_results["pkt_test_" + str(index)] = result_dict
             index += 1
         return test_results
 
     def generate_csv(self, results):
-        csv_string = 'Packet size (B),Throughput (Mpps),Theoretical Max (Mpps),Duration (s),Packet loss (%)\n'
-        
+        repeated = len(results) > 0 and 'stddev' in results[0]
+        header = 'Packet size (B),Throughput (Mpps),Theoretical Max (Mpps),Duration (s),Packet loss (%)'
+        if repeated:
+            header += ',Stddev (Mpps),CI low (Mpps),CI high (Mpps),Repetitions,Failed repetitions'
+        lines = [header + '\n']
+
         # add data lines
         for result in results:
-            csv_string += "{},{:.2f},{:.2f},{:.1f},{:.5f}\n".format(result['pkt_size'],
+            line = "{},{:.2f},{:.2f},{:.1f},{:.5f}".format(result['pkt_size'],
                 result['measurement'],
                 round(utils.line_rate_to_pps(result['pkt_size'], 4) / 1000000, 2),
                 round(result['duration'], 1),
                 round(result['pkt_loss'], 5))
+            if repeated:
+                line += ",{:.2f},{:.2f},{:.2f},{},{}".format(result['stddev'],
+                    result['ci_low'], result['ci_high'], result['repetitions'], result['failed'])
+            lines.append(line + '\n')
 
-        return csv_string
+        return ''.join(lines)
 
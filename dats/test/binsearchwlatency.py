@@ -32,26 +32,23 @@
 #
 
 """
-The interface for the tests that perform a binary search.
+The interface for the tests that perform a binary search with latency.
 
-This abstract base class defines the common properties and methods for tests
-that perform a binary search.
-
-The binary search algorithm is also implemented here.
+This abstract base class extends BinarySearch for tests that measure the
+latency on some of their cores as well. run_test() returns the latency
+results as a fourth element. A trial only succeeds when the latency SLA is
+met, and the latency is added to the results and reports.
 """
 
 import abc
-import time
 import logging
 
-import dats.test.base
+import dats.test.binsearch
 import dats.config as config
 import dats.plot
-import dats.utils as utils
-import dats.rstgen as rst
 
 
-class BinarySearchWithLatency(dats.test.base.TestBase):
+class BinarySearchWithLatency(dats.test.binsearch.BinarySearch):
     __metaclass__ = abc.ABCMeta
 
     def __init__(self):
@@ -59,41 +56,6 @@ class BinarySearchWithLatency(dats.test.base.TestBase):
         """
         super(BinarySearchWithLatency, self).__init__()
 
-    @abc.abstractproperty
-    def lower_bound(self, pkt_size):
-        """Return the lower bound of the interval for the binary search.
-
-        Args:
-            pkt_size (int): The packet size to get the lower bound for.
-
-        Returns:
-            long. The lower bound of the interval to search in.
-        """
-        return
-
-    @abc.abstractproperty
-    def upper_bound(self, pkt_size):
-        """Return the upper bound of the interval for the binary search.
-
-        Args:
-            pkt_size (int): The packet size to get the upper bound for.
-
-        Returns:
-            long. The upper bound of the interval to search in.
-        """
-        return
-
-    def min_pkt_size(self):
-        """Return the minimum required packet size for the test.
-
-        Defaults to 64. Individual test must override this method if they have
-        other requirements.
-
-        Returns:
-            int. The minimum required packet size for the test.
-        """
-        return 64
-
     @abc.abstractproperty
     def latency_cores(self):
         """Returns the cores running on latency modeself.
@@ -106,167 +68,90 @@ class BinarySearchWithLatency(dats.test.base.TestBase):
         """
         return []
 
-    def run_all_tests(self):
-        """Iterate over requested packet sizes and search for the maximum value that yields success.
-
-        Returns:
-            [{...}]. An array with a dict per packet size the test has run
-            with.
-            See run_test_with_pkt_size() for a description of the dicts. The
-            following keys are added to the dicts:
-            pkt_size (int): The packet size used when measuring
-            duration (float): The duration of the search in seconds
-        """
-        results = []
+    def latency_sla(self, core):
+        """Return the latency SLA a trial must meet on a latency core.
 
-        pkt_sizes = map(int, config.getOption('pktSizes').split(','))
-        for pkt_size in pkt_sizes:
-            # Adjust packet size upwards if it's less than the minimum
-            # required packet size for the test.
-            if pkt_size < self.min_pkt_size():
-                pkt_size += self.min_pkt_size() - 64
-
-            # time duration of a single step
-            duration = float(config.getOption('testDuration'))
-            start_time = time.time()
-            result = self.run_test_with_pkt_size(pkt_size, duration)
-            stop_time = time.time()
-            result['pkt_size'] = pkt_size
-            result['duration'] = stop_time - start_time
-
-            results.append(result)
-
-        return results
-
-    def run_test_with_pkt_size(self, pkt_size, duration):
-        """Run the test for a single packet size.
+        Defaults to the limits set in the config file for all cores. Tests can
+        override this method to set different limits per core.
 
         Args:
-            pkt_size (int): The packet size to test with.
-            duration (int): The duration for each try.
+            core (int): The latency core.
 
         Returns:
-            {lower_bound, upper_bound, measurement}.
-            lower_bound (long): The lower bound of the search interval.
-            upper_bound (long): The upper bound of the search interval.
-            measurement (long): The maximum value in the interval that yields
-            success.
+            {latency_avg, latency_max}. The maximum average latency and the
+            maximum latency in ns. None if there is no limit.
         """
-        precision = float(config.getOption('testPrecision'))
-
-        lower = self.lower_bound(pkt_size)
-        upper = self.upper_bound(pkt_size)
-
-        logging.info("Testing with packet size %d", pkt_size)
-
-        # Binary search assumes the lower value of the interval is
-        # successful and the upper value is a failure.
-        # The first value that is tested, is the maximum value. If that
-        # succeeds, no more searching is needed. If it fails, a regular
-        # binary search is performed.
-        # The test_value used for the first iteration of binary search
-        # is adjusted so that the delta between this test_value and the
-        # upper bound is a power-of-2 multiple of precision. In the
-        # optimistic situation where this first test_value results in a
-        # success, the binary search will complete on an integer multiple
-        # of the precision, rather than on a fraction of it.
-        adjust = precision
-        while upper - lower > adjust:
-            adjust *= 2
-        adjust = (upper - lower - adjust) / 2
-
-        test_value = upper
-
-        # throughput and packet loss from the last successfull test
-        successfull_throughput = 0
-        successfull_pkt_loss = 0
-        while upper - lower >= precision:
-            logging.verbose("New interval [%s, %s), precision: %d", lower, upper, upper - lower)
-            logging.info("Testing with value %s", test_value)
-
-            self.setup_test(pkt_size=pkt_size, speed=test_value)
-            success, throughput, pkt_loss, lat = self.run_test(pkt_size, duration, test_value)
-            self.teardown_test(pkt_size=pkt_size)
-
-            if success:
-                logging.verbose("Success! Increasing lower bound")
-                lower = test_value
-                successfull_throughput = throughput
-                successfull_pkt_loss = pkt_loss
-            else:
-                logging.verbose("Failure... Decreasing upper bound")
-                upper = test_value
-
-            test_value = lower + (upper - lower) / 2 + adjust
-            adjust = 0
-
-        successfull_throughput = round(successfull_throughput, 2)
-        self.update_kpi(dict(pkt_size=pkt_size, measurement=successfull_throughput))
+        max_avg = config.getOption('latencyMaxAvg')
+        max_lat = config.getOption('latencyMax')
 
         return dict(
-            lower_bound=self.lower_bound(pkt_size),
-            upper_bound=self.upper_bound(pkt_size),
-            measurement=successfull_throughput,
-            pkt_loss=successfull_pkt_loss,
-            latency=lat
+            latency_avg=None if max_avg is None else float(max_avg),
+            latency_max=None if max_lat is None else float(max_lat),
         )
 
-    @abc.abstractmethod
-    def run_test(self, pkt_size, duration, value):
-        """Execute a test run with the specified duration and packet size.
+    def has_latency_sla(self):
+        """Return True if any latency core has a latency SLA."""
+        for core in self.latency_cores():
+            if any(limit is not None for limit in self.latency_sla(core).values()):
+                return True
+        return False
+
+    def meets_latency_sla(self, latency):
+        """Check the latency measured in a trial against the latency SLA.
 
         Args:
-            pkt_size (int): The packet size to use for this test run
-            duration (int): The duration in seconds for the test
-            value (long): The value to test with.
+            latency (dict): The latency results of the trial, as returned by
+                run_test().
 
         Returns:
-            bool. True if test succeeds, False if test fails.
-            int throughput in Mpps
-            int total packet loss
+            bool. True if the latency SLA is met on all latency cores.
+        """
+        for core in self.latency_cores():
+            for key, limit in self.latency_sla(core).items():
+                if limit is not None and latency[key][core] > limit:
+                    logging.verbose("Latency SLA not met on core %d: %s is %d ns, limit %d ns",
+                            core, key, latency[key][core], limit)
+                    return False
+        return True
+
+    def run_trial(self, pkt_size, duration, value):
+        """Run a single trial, see TestBase.run_trial().
+
+        A trial only succeeds when the latency SLA is met as well.
         """
-        return
-
-    def get_cpu_id(self, cpu_map, core_id, socket_id, is_hyperthread):
-        try:
-            return cpu_map[socket_id][core_id][1 if is_hyperthread else 0]
-        except:
-            raise Exception("Core {}{} on socket {} does not exist"
-                            .format(str(core_id), "h" if is_hyperthread else "", str(socket_id)))
-
-    def generate_report(self, results, prefix, dir):
-        # Generate graph of results
-        table = [['Packet size (B)', 'Throughput (Mpps)', 'Theoretical Max (Mpps)']]
-        for result in results:
-            # TODO move formatting to <typeof(measurement)>.__str__
-            table.append([
-                result['pkt_size'],
-                result['measurement'],
-                round(utils.line_rate_to_pps(result['pkt_size'], float(self._n_ports)) / 1000000, 2),
-            ])
-        dats.plot.bar_plot(table, dir + prefix + 'results.png')
-
-        # Generate table
-        table = [['Packet size (B)', 'Throughput (Mpps)', 'Theoretical Max (Mpps)', 'Duration (s)', 'Packet loss (%)']]
-        for result in results:
-            # TODO move formatting to <typeof(measurement)>.__str__
-            table.append([
-                result['pkt_size'],
-                "{:.2f}".format(result['measurement']),
-                "{:.2f}".format(round(utils.line_rate_to_pps(result['pkt_size'], float(self._n_ports)) / 1000000, 2)),
-                "{:.1f}".format(round(result['duration'], 1)),
-                "{:.5f}".format(round(result['pkt_loss'], 5)),
-            ])
-
-        # Generate reStructuredText report
-        report = ''
-        report += '.. image:: ' + prefix + 'results.png\n'
-        report += '\n'
-        report += rst.simple_table(table)
-
-        # latency
-        report += '\n\n'
-        report += rst.section('Latency', '-')
+        success, throughput, pkt_loss, lat = super(BinarySearchWithLatency, self).run_trial(pkt_size, duration, value)
+
+        return success and self.meets_latency_sla(lat), throughput, pkt_loss, lat
+
+    def trial_result(self, trial, last_trial):
+        """Add the latency to the results of a search, see BinarySearch.trial_result().
+
+        Report the latency of the trial that defined the result. Fall back to
+        the last trial when no trial succeeded.
+        """
+        result = super(BinarySearchWithLatency, self).trial_result(trial, last_trial)
+        result['latency'] = (trial if trial is not None else last_trial)[3]
+
+        return result
+
+    def report_sla(self, report):
+        """Write the latency SLA, see BinarySearch.report_sla()."""
+        if self.has_latency_sla():
+            report.write('The throughput is the maximum throughput meeting both the packet loss and the latency SLA:\n\n')
+            sla_table = [['Latency core', 'Max. average latency (ns)', 'Max. latency (ns)']]
+            for core in self.latency_cores():
+                sla = self.latency_sla(core)
+                sla_table.append([
+                    core,
+                    '-' if sla['latency_avg'] is None else '{:g}'.format(sla['latency_avg']),
+                    '-' if sla['latency_max'] is None else '{:g}'.format(sla['latency_max']),
+                ])
+            report.simple_table(sla_table)
+
+    def report_details(self, report, results, prefix, dir):
+        """Write the latency per core, see BinarySearch.report_details()."""
+        report.write('\n\n')
+        report.section('Latency', '-')
 
         cores = self.latency_cores()
         for core in cores:
@@ -295,26 +180,14 @@ class BinarySearchWithLatency(dats.test.base.TestBase):
 
             dats.plot.bar_plot(plot_table, dir + prefix + 'latency_results_{}.png'.format(core))
 
-            report += rst.section('On Core {}'.format(core), '-')
-            report += '.. image:: ' + prefix + 'latency_results_{}.png\n'.format(core)
-            report += '\n'
-            report += rst.simple_table(data_table)
-            report += '\n\n'
-
-        return report
+            report.section('On Core {}'.format(core), '-')
+            report.image(prefix + 'latency_results_{}.png'.format(core))
+            report.simple_table(data_table)
+            report.write('\n\n')
 
     def generate_csv(self, results):
-        csv_string = 'Packet size (B),Throughput (Mpps),Theoretical Max (Mpps),Duration (s),Packet loss (%)\n'
-
-        # add data lines
-        for result in results:
-            csv_string += "{},{:.2f},{:.2f},{:.1f},{:.5f}\n".format(result['pkt_size'],
-                                                                    result['measurement'],
-                                                                    round(utils.line_rate_to_pps(result['pkt_size'], 4) / 1000000, 2),
-                                                                    round(result['duration'], 1),
-                                                                    round(result['pkt_loss'], 5))
-
-        csv_string += ',\n,\n'
+        lines = [super(BinarySearchWithLatency, self).generate_csv(results)]
+        lines.append(',\n,\n')
 
         cores = self.latency_cores()
         for core in cores:
@@ -327,49 +200,44 @@ class BinarySearchWithLatency(dats.test.base.TestBase):
                 lat_max = latency['latency_max']
                 lat_avg = latency['latency_avg']
 
-                csv_string += latency_table_header
-                csv_string += "{},{},{:.2f},{:.2f},{:.2f},{:.1f}\n".format(
+                lines.append(latency_table_header)
+                lines.append("{},{},{:.2f},{:.2f},{:.2f},{:.1f}\n".format(
                     core,
                     result['pkt_size'],
                     lat_min[core],
                     lat_max[core],
                     lat_avg[core],
                     round(result['duration'], 1)
-                )
-            csv_string += ',\n,\n'
+                ))
+            lines.append(',\n,\n')
 
-        return csv_string
+        return ''.join(lines)
 
     def generate_json(self, results):
-        test_results = dict()
-        index = 0
-        for result in results:
-            result_dict = dict()
-            result_dict['PacketSize(B)'] = "{}".format(result['pkt_size'])
-            result_dict['Throughput(Mpps)'] = "{:.2f}".format(result['measurement'])
-            result_dict['TheoreticalMax(Mpps)'] = "{:.2f}".format(round(utils.line_rate_to_pps(result['pkt_size'], 4) / 1000000, 2))
-            result_dict['Duration(s)'] = "{:.1f}".format(round(result['duration'], 1))
-            result_dict['PacketLoss(%)'] = round(result['pkt_loss'], 5)
-            test_results["pkt_test_" + str(index)] = result_dict
-            index += 1
-
-            cores = self.latency_cores()
-            for core in cores:
-                for result in results:
-                    # TODO move formatting to <typeof(measurement)>.__str__
-                    latency = result['latency']
-                    lat_min = latency['latency_min']
-                    lat_max = latency['latency_max']
-                    lat_avg = latency['latency_avg']
-
-                    lat_result = dict()
-                    lat_result["core"] = "{}".format(core)
-                    lat_result["PacketSize(B)"] = "{}".format(result['pkt_size'])
-                    lat_result['MinimumLatency(ns)'] = "{:.2f}".format(lat_min[core])
-                    lat_result['MaximumLatency(ns)'] = "{:.2f}".format(lat_max[core])
-                    lat_result['AverageLatency(ns)'] = "{:.2f}".format(lat_avg[core])
-                    lat_result['Duration(s)'] = "{:.1f}".format(round(result['duration'], 1))
-
-                    test_results["lat_core_" + str(core)] = lat_result
+        test_results = super(BinarySearchWithLatency, self).generate_json(results)
+
+        for index, result in enumerate(results):
+            for core in self.latency_cores():
+                # TODO move formatting to <typeof(measurement)>.__str__
+                latency = result['latency']
+                lat_min = latency['latency_min']
+                lat_max = latency['latency_max']
+                lat_avg = latency['latency_avg']
+
+                lat_result = dict()
+                lat_result["core"] = "{}".format(core)
+                lat_result["PacketSize(B)"] = "{}".format(result['pkt_size'])
+                lat_result['MinimumLatency(ns)'] = "{:.2f}".format(lat_min[core])
+                lat_result['MaximumLatency(ns)'] = "{:.2f}".format(lat_max[core])
+                lat_result['AverageLatency(ns)'] = "{:.2f}".format(lat_avg[core])
+                lat_result['Duration(s)'] = "{:.1f}".format(round(result['duration'], 1))
+                sla = self.latency_sla(core)
+                if sla['latency_avg'] is not None:
+                    lat_result['SLAMaxAverageLatency(ns)'] = "{:.2f}".format(sla['latency_avg'])
+                if sla['latency_max'] is not None:
+                    lat_result['SLAMaxLatency(ns)'] = "{:.2f}".format(sla['latency_max'])
+
+                # One entry per core and packet size, numbered like pkt_test_N
+                test_results["lat_core_" + str(core) + "_pkt_test_" + str(index)] = lat_result
 
         return test_results
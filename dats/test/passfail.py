@@ -43,6 +43,7 @@ import time
 import logging
 import inspect
 import sys
+import linecache
 import os.path as path
 
 import dats.test.base
@@ -112,13 +113,11 @@ class PassFail(dats.test.base.TestBase):
             table.append([result['name'], '\ ', result['descr']])
 
             for test in result['results']:
-                table.append(['\ ', 'Pass' if test['result'] else ':problematic:`Fail`', test['msg']])
+                msg = test['msg'] if test['msg'] is not None else statement(test)
+                table.append(['\ ', 'Pass' if test['result'] else ':problematic:`Fail`', msg])
 
         # Generate reStructuredText report
-        report = ''
-        report += rst.simple_table(table)
-
-        return report
+        return rst.simple_table(table)
 
 
     ## Assertions
@@ -150,31 +149,51 @@ class PassFail(dats.test.base.TestBase):
     ## Helper methods
     def _add_result(self, assertion, result, msg):
         logging.verbose("- (%s) assertion: %s", 'pass' if result else 'FAIL', msg)
-        # Retrieve test source for debugging and diagnostic information. The
-        # caller frame of interest is 2 up: once for the assertion that called
-        # _add_result() and once for the call to the assertion itself.
+        # Remember where the assertion was made, for debugging and diagnostic
+        # information. The caller frame of interest is 2 up: once for the
+        # assertion that called _add_result() and once for the call to the
+        # assertion itself. The source line is only read by statement(), when
+        # it is needed.
         caller = sys._getframe(2)
-        lineno = caller.f_lineno
-
-        # inspect.getsourcelines(...) returns an list of source lines, and the
-        # line number of the start of the source line.
-        # lineno retrieved above is used to pick the source line that called
-        # one of the assertions.
-        # Leading and trailing whitespace is stripped.
-        source = inspect.getsourcelines(caller)
-        source = source[0][lineno - source[1]]
-        source = source.strip()
+        source = caller.f_code.co_filename
 
         self._results[-1]['results'].append(dict(
             assertion=assertion,
             result=result,
             msg=msg,
             lineno=caller.f_lineno,
-            filename=path.splitext(path.basename(caller.f_code.co_filename))[0],
-            stmt=source,
+            filename=_module_name(source),
+            source=source,
         ))
 
 
+_module_names = {}
+
+
+def _module_name(source):
+    """Return the name of the module in source file, e.g. test_01 for tests/test_01.py."""
+    name = _module_names.get(source)
+    if name is None:
+        name = _module_names[source] = path.splitext(path.basename(source))[0]
+    return name
+
+
+def statement(result):
+    """Return the source line of the assertion that produced a result.
+
+    The source files are read once and cached by linecache.
+
+    Args:
+        result (dict): The result of an assertion, as in the results of
+            PassFail.run_all_tests().
+
+    Returns:
+        str. The statement, with leading and trailing whitespace stripped.
+        Empty if the source is not available.
+    """
+    return linecache.getline(result['source'], result['lineno']).strip()
+
+
 def passfailtest(f=None, setup=None, teardown=None):
     """Decorator to mark functions that execute pass/fail tests.
 
@@ -47,6 +47,7 @@ import logging
 
 import dats.test.base
 import dats.config as config
+import dats.search as search
 import dats.plot
 import dats.utils as utils
 import dats.rstgen as rst
@@ -105,6 +106,9 @@ class RampBase(dats.test.base.TestBase):
             following keys are added to the dicts:
             pkt_size (int): The packet size used when measuring
             duration (float): The duration of the search in seconds
+            test_value (float): The value tested with
+            When measurements are repeated, the keys returned by
+            repeat_measurement() are present as well.
         """
         results = []
 
@@ -116,21 +120,73 @@ class RampBase(dats.test.base.TestBase):
                 pkt_size += self.min_pkt_size() - 64
 
             logging.info("Testing with packet size %d", pkt_size)
-            test_value = self.start_interval()
             duration = float(config.getOption('testDuration'))
 
-            while test_value <= 100:
-                start_time = time.time()
-                result = self.run_test_with_pkt_size(pkt_size, duration, test_value)
-                stop_time = time.time()
-                result['pkt_size'] = pkt_size
-                result['duration'] = stop_time - start_time
-                result['test_value'] = test_value
-                results.append(result)
-                test_value = test_value + self.step_interval()
+            if config.getOption('rampTrialBudget') is not None:
+                strategy = search.AdaptiveRampStrategy(self.start_interval(),
+                        int(config.getOption('rampTrialBudget')),
+                        float(config.getOption('testPrecision')))
+            else:
+                strategy = search.LinearStrategy(self.start_interval(), self.step_interval())
+
+            results += self.run_ramp(pkt_size, duration, strategy)
+            self.save_partial_results(results)
 
         return results
 
+    def run_ramp_step(self, pkt_size, duration, test_value):
+        """Measure a single step of the ramp.
+
+        Returns:
+            {...}. The result of run_test_with_pkt_size(), with the keys
+            described in run_all_tests() added.
+        """
+        start_time = time.time()
+        result = self.run_test_with_pkt_size(pkt_size, duration, test_value)
+        if int(config.getOption('repetitions')) > 1:
+            measure = lambda: self.run_test_with_pkt_size(pkt_size, duration, test_value)['measurement']
+            result.update(self.repeat_measurement(result['measurement'], measure))
+            result['measurement'] = result['mean']
+        stop_time = time.time()
+        result['pkt_size'] = pkt_size
+        result['duration'] = stop_time - start_time
+        result['test_value'] = test_value
+
+        return result
+
+    def run_ramp(self, pkt_size, duration, strategy):
+        """Measure the ramp for a packet size.
+
+        The strategy decides which steps of the ramp are measured. The
+        throughput and the average latency of every step are passed to it,
+        so that adaptive strategies can refine the ramp where these curves
+        change fastest, see dats.search.AdaptiveRampStrategy.
+
+        Args:
+            pkt_size (int): The packet size to test with.
+            duration (float): The duration of a ramp step.
+            strategy (SearchStrategy): The strategy proposing the steps.
+
+        Returns:
+            [{...}]. The results of the ramp steps, sorted by test value.
+        """
+        results = []
+        while not strategy.done():
+            test_value = strategy.propose()
+            result = self.run_ramp_step(pkt_size, duration, test_value)
+            strategy.observe(test_value, result['success'],
+                    (result['measurement'], self.average_latency(result)))
+            results.append(result)
+
+        return sorted(results, key=lambda result: result['test_value'])
+
+    def average_latency(self, result):
+        """Return the average latency over all latency cores for a ramp step."""
+        cores = self.latency_cores()
+        lat_avg = result['latency']['latency_avg']
+
+        return sum(lat_avg[core] for core in cores) / len(cores)
+
     def run_test_with_pkt_size(self, pkt_size, duration, test_value):
         """Run the test for a single packet size.
 
@@ -149,9 +205,7 @@ class RampBase(dats.test.base.TestBase):
 
         logging.info("Testing with value %s", test_value)
 
-        self.setup_test(pkt_size=pkt_size, speed=test_value)
-        success, throughput, pkt_loss, lat = self.run_test(pkt_size, duration, test_value)
-        self.teardown_test(pkt_size=pkt_size)
+        success, throughput, pkt_loss, lat = self.run_trial(pkt_size, duration, test_value)
 
         if success:
             logging.verbose("Success! Increasing lower bound")
@@ -159,6 +213,7 @@ class RampBase(dats.test.base.TestBase):
             logging.verbose("Failure... Decreasing upper bound")
 
         return dict(
+            success=success,
             measurement=throughput,
             pkt_loss=pkt_loss,
             latency=lat
@@ -191,27 +246,22 @@ class RampBase(dats.test.base.TestBase):
         # latency cores
         cores = self.latency_cores()
 
-        report = ''
+        report = rst.Writer()
+        repeated = len(results) > 0 and 'stddev' in results[0]
 
-        # Create a list of pkt_sizes contained in results[]
-        pkt_sizes = []
-        for result in results:
-            if result['pkt_size'] not in pkt_sizes:
-                pkt_sizes.append(result['pkt_size'])
-
-        for pkt_size in pkt_sizes:
+        for pkt_size, pkt_results in self._group_by_pkt_size(results):
 
             # Table for each pkt_size
             table = [[
                 'Packet size (B)', 'Test Value (%)', 'Throughput (Mpps)', 'Theoretical Max (Mpps)',
                 'Average Latency (ns)', 'Duration (s)', 'Packet loss (%)'
             ]]
+            if repeated:
+                table[0] += ['Stddev (Mpps)', '95% CI (Mpps)', 'Repetitions']
 
             plot_table = [['', '', '']]
 
-            for result in results:
-                if (result['pkt_size'] != pkt_size):
-                    continue
+            for result in pkt_results:
                 latency = result['latency']
                 lat_avg = latency['latency_avg']
                 total_avg_lat = 0
@@ -227,6 +277,12 @@ class RampBase(dats.test.base.TestBase):
                     "{:.2f}".format(total_avg_lat),
                     "{:.1f}".format(round(result['duration'], 1)),
                     "{:.5f}".format(round(result['pkt_loss'], 5))])
+                if repeated:
+                    table[-1] += [
+                        "{:.2f}".format(result['stddev']),
+                        "{:.2f} - {:.2f}".format(result['ci_low'], result['ci_high']),
+                        result['repetitions'],
+                    ]
 
                 plot_table.append([
                     result['test_value'],
@@ -236,32 +292,44 @@ class RampBase(dats.test.base.TestBase):
             # Generate reStructuredText report
             dats.plot.plot_throughput_latency(plot_table, dir + prefix + 'ramp_results_{}.png'.format(pkt_size))
 
-            report += rst.section('Packet Size {}'.format(pkt_size), '-')
-            report += '.. image:: ' + prefix + 'ramp_results_{}.png\n'.format(pkt_size)
-            report += '\n'
-            report += rst.simple_table(table)
-            report += '\n\n'
+            report.section('Packet Size {}'.format(pkt_size), '-')
+            report.image(prefix + 'ramp_results_{}.png'.format(pkt_size))
+            report.simple_table(table)
+            report.write('\n\n')
+
+        return report.getvalue()
 
-        return report
+    def _group_by_pkt_size(self, results):
+        """Group results by packet size.
+
+        Returns:
+            [(pkt_size, [result])]. The packet sizes in the order they first
+            appear in results.
+        """
+        groups = []
+        by_pkt_size = {}
+        for result in results:
+            if result['pkt_size'] not in by_pkt_size:
+                by_pkt_size[result['pkt_size']] = []
+                groups.append((result['pkt_size'], by_pkt_size[result['pkt_size']]))
+            by_pkt_size[result['pkt_size']].append(result)
+
+        return groups
 
     def generate_csv(self, results):
         # latency cores
         cores = self.latency_cores()
 
-        table_header = 'Packet size (B),Test Value (%),Throughput (Mpps),Theoretical Max (Mpps),Average Latency (ns),Duration (s),Packet loss (%)\n'
-        csv_string = ''
-
-        # Create a list of pkt_sizes contained in results[]
-        pkt_sizes = []
-        for result in results:
-            if result['pkt_size'] not in pkt_sizes:
-                pkt_sizes.append(result['pkt_size'])
+        repeated = len(results) > 0 and 'stddev' in results[0]
+        table_header = 'Packet size (B),Test Value (%),Throughput (Mpps),Theoretical Max (Mpps),Average Latency (ns),Duration (s),Packet loss (%)'
+        if repeated:
+            table_header += ',Stddev (Mpps),CI low (Mpps),CI high (Mpps),Repetitions'
+        table_header += '\n'
+        lines = []
 
-        for pkt_size in pkt_sizes:
-            csv_string += table_header
-            for result in results:
-                if (result['pkt_size'] != pkt_size):
-                    continue
+        for pkt_size, pkt_results in self._group_by_pkt_size(results):
+            lines.append(table_header)
+            for result in pkt_results:
                 latency = result['latency']
                 lat_avg = latency['latency_avg']
                 total_avg_lat = 0
@@ -269,7 +337,7 @@ class RampBase(dats.test.base.TestBase):
                     total_avg_lat = total_avg_lat + lat_avg[core]
                 total_avg_lat = total_avg_lat / len(cores)
 
-                csv_string += "{},{},{:.2f},{:.2f},{:.2f},{:.1f},{:.5f}\n".format(
+                line = "{},{},{:.2f},{:.2f},{:.2f},{:.1f},{:.5f}".format(
                     result['pkt_size'],
                     result['test_value'],
                     result['measurement'],
@@ -277,26 +345,22 @@ class RampBase(dats.test.base.TestBase):
                     total_avg_lat,
                     round(result['duration'], 1),
                     round(result['pkt_loss'], 5))
+                if repeated:
+                    line += ",{:.2f},{:.2f},{:.2f},{}".format(result['stddev'],
+                        result['ci_low'], result['ci_high'], result['repetitions'])
+                lines.append(line + "\n")
 
-            csv_string += ",\n,\n"
+            lines.append(",\n,\n")
 
-        return csv_string
+        return ''.join(lines)
 
     def generate_json(self, results):
         cores = self.latency_cores()
         test_results = dict()
 
-        # Create a list of pkt_sizes contained in results[]
-        pkt_sizes = []
-        for result in results:
-            if result['pkt_size'] not in pkt_sizes:
-                pkt_sizes.append(result['pkt_size'])
-
         index = 0
-        for pkt_size in pkt_sizes:
-            for result in results:
-                if (result['pkt_size'] != pkt_size):
-                    continue
+        for pkt_size, pkt_results in self._group_by_pkt_size(results):
+            for result in pkt_results:
                 latency = result['latency']
                 lat_avg = latency['latency_avg']
                 total_avg_lat = 0
@@ -312,6 +376,11 @@ class RampBase(dats.test.base.TestBase):
                 result_dict['AverageLatency(ns)'] = total_avg_lat
                 result_dict['Duration(s)'] = "{:.1f}".format(round(result['duration'], 1))
                 result_dict['PacketLoss(%)'] = round(result['pkt_loss'], 5)
+                if 'stddev' in result:
+                    result_dict['Stddev(Mpps)'] = "{:.2f}".format(result['stddev'])
+                    result_dict['CILow(Mpps)'] = "{:.2f}".format(result['ci_low'])
+                    result_dict['CIHigh(Mpps)'] = "{:.2f}".format(result['ci_high'])
+                    result_dict['Repetitions'] = result['repetitions']
                 test_results["rmp_test_" + str(index)] = result_dict
                 index += 1
 
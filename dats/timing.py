@@ -0,0 +1,186 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module measures where the time of a test run goes. Code that runs a
+# phase, like starting PROX, copying a file or waiting for a measurement
+# window, wraps it in a timer:
+#
+#     with timing.phase('scp'):
+#         ...
+#
+# The time of each phase is added up per test class. Phases can be nested,
+# the time of an inner phase is not counted in the outer phase. The phases
+# of a test therefore add up to the time the test took, and the time of a
+# phase like run_all_tests only covers what no inner phase accounts for.
+#
+# A timer costs two calls to time.time(), it is cheap enough to wrap every
+# ssh command.
+
+import time
+import logging
+import threading
+import contextlib
+
+import dats.rstgen as rst
+
+
+# Label of the phases outside of tests, like retrieving the SUT information
+OUTSIDE_TESTS = 'Outside of tests'
+
+# {(module, class): (descr, {phase: [calls, seconds]})}
+_timings = {}
+# The current test and the stack of phases are kept per thread, the report
+# of a test is generated in a background thread while the next test runs.
+_local = threading.local()
+
+
+def _key(test):
+    if test is None:
+        return None
+    return (test.__module__, test.__class__.__name__)
+
+
+def set_test(test):
+    """Set the test that the phases of this thread are accounted to, None for no test."""
+    current = _local.current = _key(test)
+    if current is not None and current not in _timings:
+        _timings[current] = (test.short_descr(), {})
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a phase of the current test."""
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    # [time spent in inner phases]
+    inner = [0.0]
+    stack.append(inner)
+    start = time.time()
+    try:
+        yield
+    finally:
+        elapsed = time.time() - start
+        stack.pop()
+        if stack:
+            stack[-1][0] += elapsed
+        add(name, elapsed - inner[0])
+
+
+def add(name, seconds, calls=1):
+    """Add the time of a phase to the current test."""
+    current = getattr(_local, 'current', None)
+    if current not in _timings:
+        _timings[current] = (OUTSIDE_TESTS, {})
+
+    totals = _timings[current][1].setdefault(name, [0, 0.0])
+    totals[0] += calls
+    totals[1] += seconds
+
+
+def take(test):
+    """Return and forget the timings of a test.
+
+    Used by the worker processes of dats.scheduler to send the timings of a
+    job to the main process, which adds them with merge().
+
+    Returns:
+        {phase: [calls, seconds]}.
+    """
+    return _timings.pop(_key(test), (None, {}))[1]
+
+
+def merge(test, timings):
+    """Add the timings returned by take() in another process to a test."""
+    previous = getattr(_local, 'current', None)
+    set_test(test)
+    for name, (calls, seconds) in timings.items():
+        add(name, seconds, calls)
+    _local.current = previous
+
+
+def breakdown():
+    """Return the timings of all tests.
+
+    Returns:
+        [(descr, [(phase, calls, seconds)])]. The phases of every test, the
+        longest phase first. The phases outside of tests come last.
+    """
+    result = []
+    for key, (descr, phases) in sorted(_timings.items(), key=lambda item: item[0] is None):
+        phases = sorted(((name, calls, seconds) for name, (calls, seconds) in phases.items()),
+                key=lambda phase: -phase[2])
+        result.append((descr, phases))
+
+    return result
+
+
+def log_summary():
+    total = 0.0
+    per_phase = {}
+    for descr, phases in breakdown():
+        for name, calls, seconds in phases:
+            per_phase[name] = per_phase.get(name, 0.0) + seconds
+            total += seconds
+
+    if total > 0:
+        logging.info("Time breakdown: %s", ', '.join('{} {:.0f}%'.format(name, 100.0 * seconds / total)
+                for name, seconds in sorted(per_phase.items(), key=lambda item: -item[1])))
+
+
+def generate_report():
+    """Return the reStructuredText section with the time breakdown."""
+    report = rst.Writer()
+    report.section('Time Breakdown', '*', True)
+    report.write("Time spent in each phase of the tests, in seconds. The time of "
+                 "a phase does not include the phases it contains, so "
+                 "run_all_tests is the time of the tests not covered by any "
+                 "other phase.\n\n")
+
+    table = [['Test', 'Phase', 'Calls', 'Time (s)', 'Share (%)']]
+    for descr, phases in breakdown():
+        total = sum(phase[2] for phase in phases)
+        for name, calls, seconds in phases:
+            table.append([descr, name, str(calls), '{:.1f}'.format(seconds),
+                    '{:.1f}'.format(100.0 * seconds / total if total else 0.0)])
+    report.simple_table(table)
+
+    return report.getvalue()
+
+
+def generate_json():
+    """Return the time breakdown as a dictionary for the JSON summary."""
+    return dict((descr, dict((name, dict(Calls=calls, Time=round(seconds, 3)))
+                for name, calls, seconds in phases))
+            for descr, phases in breakdown())
@@ -0,0 +1,176 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module writes a trace of the communication with PROX, see prox_trace
+# in dats.cfg. Every command sent to PROX, every reply and every packet dump
+# is written as a JSON object on a single line, with a monotonic timestamp in
+# seconds:
+#
+#     {"t": 12.345678, "host": "10.0.0.1", "kind": "cmd", "data": "tot stats"}
+#
+# kind is 'cmd' for a command, 'reply' for a reply, which is null when no
+# reply arrived before the timeout, and 'pktdump' for a packet dump, with the
+# port and the payload in hex. The first line of a trace has kind 'start' and
+# the wall clock time at the start of the trace, to relate the timestamps to
+# the log file.
+#
+# Commands run over ssh and files copied with scp are traced as well, with
+# kind 'ssh' and the output and exit status of the command, and kind 'scp'.
+# With these, dats.replay can run the tests again without the testbed.
+#
+# Lines are written to a buffer that is flushed when it is full and when the
+# trace is closed. When tracing is off, sink is None and the only cost for
+# dats.prox is checking that.
+
+import json
+import time
+import logging
+
+# Size of the write buffer in bytes
+BUFFER_SIZE = 1 << 16
+
+sink = None
+_filename = None
+
+
+def _monotonic_clock():
+    """Return a function that reads a monotonic clock in seconds.
+
+    Python 2 has no time.monotonic(), clock_gettime() is called through ctypes
+    instead. Falls back to time.time() where that isn't available.
+    """
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1', use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1
+
+        ts = timespec()
+        def monotonic():
+            clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts))
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+
+        monotonic()
+        return monotonic
+    except Exception:
+        return time.time
+
+monotonic = _monotonic_clock()
+
+
+class TraceSink(object):
+    """Writes trace records to a file."""
+
+    def __init__(self, filename):
+        self._file = open(filename, 'a', BUFFER_SIZE)
+        self._write(dict(t=monotonic(), kind='start', time=time.time()))
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def command(self, host, data):
+        self._write(dict(t=monotonic(), host=host, kind='cmd', data=data.rstrip('\n').decode('latin-1')))
+
+    def reply(self, host, data):
+        if data is not None:
+            data = data.decode('latin-1')
+        self._write(dict(t=monotonic(), host=host, kind='reply', data=data))
+
+    def packet_dump(self, host, port_id, payload):
+        self._write(dict(t=monotonic(), host=host, kind='pktdump', port=port_id, data=payload.tostring().encode('hex')))
+
+    def ssh(self, host, cmd, ret):
+        self._write(dict(t=monotonic(), host=host, kind='ssh', data=cmd,
+                out=ret['out'].decode('latin-1'), ret=ret['ret']))
+
+    def scp(self, host, local, remote, ret):
+        self._write(dict(t=monotonic(), host=host, kind='scp', data=remote, local=local, ret=ret['ret']))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def open_trace(filename):
+    """Start tracing the communication with PROX to filename."""
+    global sink, _filename
+
+    close_trace()
+    _filename = filename
+    sink = TraceSink(filename)
+    logging.info("Tracing PROX commands to %s", filename)
+
+
+def reopen_trace(suffix):
+    """Trace to a file of its own after forking a worker process.
+
+    The trace file of the parent process must be flushed before forking.
+
+    Args:
+        suffix (str): Added to the name of the trace file, before the
+            extension.
+    """
+    global sink
+
+    if sink is None:
+        return
+
+    # The file object is a copy of the one of the parent process, with an
+    # empty buffer. Closing it doesn't affect the parent.
+    sink.close()
+    base, dot, extension = _filename.rpartition('.')
+    sink = TraceSink(base + '-' + suffix + dot + extension if dot else _filename + '-' + suffix)
+
+
+def flush():
+    if sink is not None:
+        sink.flush()
+
+
+def close_trace():
+    global sink
+
+    if sink is not None:
+        sink.close()
+        sink = None
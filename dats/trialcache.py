@@ -0,0 +1,167 @@
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+# This module keeps a persistent record of every trial that was run, so an
+# interrupted test run can be resumed without measuring the same trials again.
+#
+# Every trial is appended as a JSON object on a single line to the cache file
+# as soon as it completes. When resuming, the records of the previous run are
+# loaded and served again, in order, for trials with the same key.
+#
+# The time taken by the phases of a test class that are not trials, like
+# setup_class(), is recorded in the same file. The planner uses these records
+# and the trials to estimate how long future runs will take.
+
+import json
+import os
+import time
+import logging
+
+
+_cache_file = None
+_cached = {}
+
+
+def open_cache(filename, resume=False):
+    """Open the trial cache file.
+
+    Args:
+        filename (str): The file to record trials in.
+        resume (bool): Load the trials recorded in the file by a previous
+            run, so they can be replayed, and append new trials to it.
+    """
+    global _cache_file
+
+    _cached.clear()
+    if resume:
+        if os.path.isfile(filename):
+            n_trials = 0
+            with open(filename) as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partially written last line when the previous
+                        # run was killed.
+                        logging.warning("Ignoring corrupt entry in trial cache %s", filename)
+                        continue
+                    if 'key' not in entry:
+                        # Timing of a test phase, see record_timing()
+                        continue
+                    _cached.setdefault(entry['key'], []).append(entry)
+                    n_trials += 1
+            logging.info("Loaded %d cached trials from %s", n_trials, filename)
+        else:
+            logging.warning("No trial cache %s found, nothing to resume", filename)
+
+    _cache_file = open(filename, 'a' if resume else 'w')
+
+
+def close_cache():
+    """Close the trial cache file."""
+    global _cache_file
+
+    if _cache_file is not None:
+        _cache_file.close()
+        _cache_file = None
+
+
+def make_key(test_module, test_class, config_hashes, pkt_size, value, duration):
+    """Return the key that identifies a trial in the cache.
+
+    Args:
+        test_module (str): The name of the test module.
+        test_class (str): The name of the test class.
+        config_hashes ({str: str}): The hashes of the configuration files
+            used for the test, by file name.
+        pkt_size (int): The packet size of the trial.
+        value (float): The value tested with.
+        duration (float): The duration of the trial.
+
+    Returns:
+        str. The key of the trial.
+    """
+    configs = ','.join('{}={}'.format(name, config_hashes[name]) for name in sorted(config_hashes))
+    return '{}:{}:{}:{}:{}:{}'.format(test_module, test_class, configs,
+            pkt_size, repr(float(value)), repr(float(duration)))
+
+
+def lookup(key):
+    """Return the next cached trial with the given key.
+
+    Trials with the same key are returned in the order they were recorded,
+    so repeated trials are replayed as often as they were run.
+
+    Returns:
+        tuple. The results of run_test() for the trial, or None if no more
+        cached trials with this key are available.
+    """
+    entries = _cached.get(key)
+    if not entries:
+        return None
+
+    return tuple(entries.pop(0)['trial'])
+
+
+def record(key, trial, elapsed, **kwargs):
+    """Append a completed trial to the cache file.
+
+    Args:
+        key (str): The key of the trial, as returned by make_key().
+        trial (tuple): The results of run_test() for the trial.
+        elapsed (float): The wall clock time the trial took, in seconds.
+        **kwargs: Additional fields to store with the trial.
+    """
+    if _cache_file is None:
+        return
+
+    entry = dict(kwargs, key=key, trial=list(trial), elapsed=elapsed, timestamp=time.time())
+    _cache_file.write(json.dumps(entry) + '\n')
+    _cache_file.flush()
+    os.fsync(_cache_file.fileno())
+
+
+def record_timing(phase, elapsed, **kwargs):
+    """Append the time taken by a phase of a test class to the cache file.
+
+    Args:
+        phase (str): The name of the phase, e.g. 'setup_class'.
+        elapsed (float): The wall clock time the phase took, in seconds.
+        **kwargs: Additional fields to store with the timing.
+    """
+    if _cache_file is None:
+        return
+
+    entry = dict(kwargs, phase=phase, elapsed=elapsed, timestamp=time.time())
+    _cache_file.write(json.dumps(entry) + '\n')
+    _cache_file.flush()
@@ -40,3 +40,19 @@ def calc_line_rate(arr, n_ports = 1):
 def line_rate_to_pps(pkt_size, n_ports):
     # FIXME Don't hardcode 10Gb/s
     return n_ports * float(10000000000 / 8) / (pkt_size + 20)
+
+def text_table(table):
+    """Format a table as plain text, with a line under the header.
+
+    Args:
+        table ([[hdr1, hdr2, ...], [...], ...]): The rows of the table, the
+            first row contains the header names of the columns.
+
+    Returns:
+        str. The table, with the columns aligned.
+    """
+    widths = [max(len(str(row[col])) for row in table) for col in range(len(table[0]))]
+    lines = ['  '.join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip()
+             for row in table]
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python2.7
+
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Compare the results of several DATS runs, e.g. of the same tests on two kernel
+or DPDK versions.
+
+    dats_compare.py REPORT_DIR REPORT_DIR...
+    dats_compare.py --db dats.db RUN RUN...
+
+A run is a report directory, or the id of a run in the results database given
+with --db ('last' for the latest run). Every run is compared with the first
+one. The comparison is printed and saved as a report with overlaid plots in
+the directory given with -r.
+"""
+
+import os
+import sys
+import logging
+import argparse
+from datetime import datetime
+
+import dats.config as config
+import dats.db as db
+import dats.compare as compare
+import dats.report as report
+import dats.utils as utils
+
+
+def parse_source(connection, source):
+    """Return a report directory as is, or the id of a run in the database."""
+    if os.path.isdir(source):
+        return source
+    if connection is not None:
+        if source == 'last':
+            return connection.execute('SELECT MAX(id) FROM runs').fetchone()[0]
+        if source.isdigit():
+            return int(source)
+    raise ValueError("{} is not a report directory{}".format(
+            source, '' if connection is None else ' or a run in the database'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dataplane Automated Testing System Run Comparison")
+
+    parser.add_argument('runs', nargs='+', metavar='RUN',
+                        help="A report directory, or the id of a run in the database given with --db, or 'last'")
+    parser.add_argument('-f', '--config', default='./dats.cfg',
+                        help='Configuration file name, ./dats.cfg by default. Only plot_backend is used.')
+    parser.add_argument('--db', metavar='FILE',
+                        help='The results database to take runs from')
+    parser.add_argument('-l', '--label', action='append', dest='labels', metavar='LABEL',
+                        help='Name of a run in the report, once per run in order. The report directory or run id by default.')
+    parser.add_argument('-r', '--report', default=datetime.now().strftime('dats-comparison-%Y%m%d_%H%M%S'),
+                        metavar='DIRECTORY', dest='report_dir',
+                        help='Where to save the comparison report. A new directory with timestamp in its name is created by default.')
+
+    args = parser.parse_args()
+    # dats.plot and dats.rstgen log at the custom levels of dats.py
+    logging.verbose = logging.debug
+    logging.trace = logging.debug
+
+    config.configuration.update((option[0], option[3]) for option in config.configurationOptions)
+    if os.path.isfile(args.config):
+        config.parseFile(args.config)
+
+    connection = db.connect(args.db) if args.db else None
+    try:
+        sources = [parse_source(connection, source) for source in args.runs]
+        table = compare.load(sources, connection)
+    except ValueError, ex:
+        print(str(ex))
+        return 1
+    finally:
+        if connection is not None:
+            connection.close()
+
+    labels = list(args.labels or [])
+    for source in sources[len(labels):]:
+        labels.append('Run {}'.format(source) if isinstance(source, int) else os.path.basename(os.path.normpath(source)))
+
+    comparison = compare.compare(table, len(sources))
+
+    text = [['Test', 'Packet size (B)', 'Value'] + labels]
+    for test, rows in comparison.items():
+        for row in rows:
+            text.append([test, row['pkt_size'], '-' if row['value'] is None else '{:g}'.format(row['value'])]
+                    + compare.cells(row))
+    print(utils.text_table(text))
+
+    filename = compare.generate_report(comparison, labels, sources, args.report_dir)
+    report.convert(filename)
+    print("Comparison saved in '" + args.report_dir + "/'")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python2.7
+
+#
+# Dataplane Automated Testing System
+#
+# Copyright (c) 2016, Viosoft Corporation.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in
+#     the documentation and/or other materials provided with the
+#     distribution.
+#   * Neither the name of Intel Corporation nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Query the results database written by DATS, see results_db in dats.cfg.
+
+    dats_db.py runs                  List the runs in the database
+    dats_db.py show RUN              Show the results of a run
+    dats_db.py compare RUN RUN       Compare the results of two runs
+    dats_db.py trials RUN            List the trials of a run
+    dats_db.py html RUN FILE         Write the interactive HTML report of a run
+
+RUN is the id of a run, as listed by 'runs', or 'last' for the latest run.
+"""
+
+import sys
+import argparse
+from datetime import datetime
+
+import dats.db as db
+import dats.htmlreport as htmlreport
+import dats.utils as utils
+
+
+def timestamp(seconds):
+    if seconds is None:
+        return '-'
+    return datetime.fromtimestamp(seconds).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def number(value, fmt='{:.2f}'):
+    return '-' if value is None else fmt.format(value)
+
+
+def run_id(connection, run):
+    if run == 'last':
+        row = connection.execute('SELECT MAX(id) FROM runs').fetchone()
+        if row[0] is None:
+            raise ValueError("The database contains no runs")
+        return row[0]
+
+    return int(run)
+
+
+def cmd_runs(connection, args):
+    table = [['Run', 'Started', 'Finished', 'Host', 'Tests', 'Report']]
+    for row in connection.execute(
+            'SELECT runs.id, started, finished, hostname, report_dir, '
+            '(SELECT COUNT(*) FROM tests WHERE run_id = runs.id) '
+            'FROM runs ORDER BY runs.id DESC LIMIT ?', (args.limit,)):
+        table.append([row[0], timestamp(row[1]), timestamp(row[2]), row[3], row[5], row[4]])
+
+    return table
+
+
+def cmd_show(connection, args):
+    table = [['Test', 'Packet size (B)', 'Value', 'Measurement', 'Packet loss (%)', 'KPI']]
+    for row in connection.execute(
+            'SELECT tests.descr, results.pkt_size, results.value, results.measurement, '
+            'results.pkt_loss, tests.kpi, tests.error FROM tests '
+            'LEFT JOIN results ON results.test_id = tests.id '
+            'WHERE tests.run_id = ? ORDER BY tests.id, results.pkt_size, results.value',
+            (run_id(connection, args.run),)):
+        kpi = row[5] if row[6] is None else 'Error: ' + row[6]
+        table.append([row[0], number(row[1], '{}'), number(row[2]), number(row[3]), number(row[4], '{:.5f}'), kpi])
+
+    return table
+
+
+def cmd_compare(connection, args):
+    base = db.measurements(run_id(connection, args.run), connection)
+    other = db.measurements(run_id(connection, args.other), connection)
+
+    table = [['Test', 'Packet size (B)', 'Value', 'Run ' + args.run, 'Run ' + args.other, 'Delta (%)']]
+    for key in sorted(set(base) | set(other)):
+        descr = (base.get(key) or other.get(key))[0]
+        a = base[key][1] if key in base else None
+        b = other[key][1] if key in other else None
+        delta = None
+        if a and b is not None:
+            delta = 100.0 * (b - a) / a
+        table.append([descr, number(key[2], '{}'), number(key[3]), number(a), number(b), number(delta, '{:+.2f}')])
+
+    return table
+
+
+def cmd_trials(connection, args):
+    query = ('SELECT tests.class, trials.pkt_size, trials.value, trials.duration, trials.success, '
+             'trials.mpps, trials.pkt_loss, trials.elapsed, trials.cached, '
+             '(SELECT AVG(avg) FROM latency WHERE trial_id = trials.id) '
+             'FROM trials JOIN tests ON trials.test_id = tests.id WHERE tests.run_id = ?')
+    params = [run_id(connection, args.run)]
+    if args.test is not None:
+        query += ' AND tests.class = ?'
+        params.append(args.test)
+    if args.pkt_size is not None:
+        query += ' AND trials.pkt_size = ?'
+        params.append(args.pkt_size)
+
+    table = [['Test', 'Packet size (B)', 'Value', 'Duration (s)', 'Success', 'Throughput (Mpps)',
+              'Packet loss (%)', 'Average latency (ns)', 'Elapsed (s)']]
+    for row in connection.execute(query + ' ORDER BY trials.id', params):
+        table.append([row[0], row[1], number(row[2]), number(row[3], '{:g}'),
+                      'yes' if row[4] else 'no', number(row[5]), number(row[6], '{:.5f}'),
+                      number(row[9]), number(row[7], '{:.1f}') + (' (cached)' if row[8] else '')])
+
+    return table
+
+
+def cmd_html(connection, args):
+    run = run_id(connection, args.run)
+    htmlreport.generate(run, args.file, args.points, connection)
+
+    return [['Run', 'Report'], [run, args.file]]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dataplane Automated Testing System Results Database")
+
+    parser.add_argument('--db', default='dats.db', metavar='FILE',
+                        help='The results database, ./dats.db by default')
+
+    subparsers = parser.add_subparsers(dest='command')
+
+    runs = subparsers.add_parser('runs', help='List the runs in the database')
+    runs.add_argument('-n', '--limit', type=int, default=20, help='Number of runs to list, latest first')
+    runs.set_defaults(handler=cmd_runs)
+
+    show = subparsers.add_parser('show', help='Show the results of a run')
+    show.add_argument('run', help="Id of the run, or 'last'")
+    show.set_defaults(handler=cmd_show)
+
+    compare = subparsers.add_parser('compare', help='Compare the results of two runs')
+    compare.add_argument('run', help="Id of the run to compare with, or 'last'")
+    compare.add_argument('other', help="Id of the run to compare, or 'last'")
+    compare.set_defaults(handler=cmd_compare)
+
+    trials = subparsers.add_parser('trials', help='List the trials of a run')
+    trials.add_argument('run', help="Id of the run, or 'last'")
+    trials.add_argument('-t', '--test', metavar='CLASS', help='Only list the trials of this test class')
+    trials.add_argument('-s', '--pkt-size', type=int, dest='pkt_size', help='Only list the trials with this packet size')
+    trials.set_defaults(handler=cmd_trials)
+
+    html = subparsers.add_parser('html', help='Write the interactive HTML report of a run')
+    html.add_argument('run', help="Id of the run, or 'last'")
+    html.add_argument('file', help='The HTML file to write')
+    html.add_argument('-p', '--points', type=int, default=1000,
+                      help='Maximum number of points of a time series, 1000 by default')
+    html.set_defaults(handler=cmd_html)
+
+    args = parser.parse_args()
+
+    connection = db.connect(args.db)
+    try:
+        table = args.handler(connection, args)
+    except ValueError, ex:
+        print(str(ex))
+        return 1
+    finally:
+        connection.close()
+
+    print(utils.text_table(table))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
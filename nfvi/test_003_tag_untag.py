@@ -107,7 +107,7 @@ class MplsTagUntag(dats.test.binsearchwlatency.BinarySearchWithLatency):
         tsc_hz = self._tester.hz()
         sleep(2)
         rx_start, tx_start, tsc_start = self._tester.tot_stats()
-        sleep(duration)
+        aborted = self.measurement_window(duration, lambda: self._tester.port_stats([0, 1])[6:8])
         # Get stats before stopping the cores. Stopping cores takes some time
         # and might skew results otherwise.
         rx_stop, tx_stop, tsc_stop = self._tester.tot_stats()
@@ -134,4 +134,4 @@ class MplsTagUntag(dats.test.binsearchwlatency.BinarySearchWithLatency):
         pps = (value / 100.0) * utils.line_rate_to_pps(pkt_size, float(self._n_ports))
         logging.verbose("Mpps configured: %f; Mpps effective %f", (pps/1000000.0), mpps)
 
-        return (tx_total - rx_total <= can_be_lost), mpps, 100.0*(tx_total - rx_total)/float(tx_total), latency
+        return (not aborted and tx_total - rx_total <= can_be_lost), mpps, 100.0*(tx_total - rx_total)/float(tx_total), latency
@@ -35,34 +35,101 @@
 
 # ToDo: Group Headers Together at the Top of the report
 
+# The stitched report directory keeps a manifest of the reports it holds, so
+# stitching again only adds the reports that are new since the last time.
+# The reports are prepared in parallel: their images are hard-linked into the
+# stitched report, or copied when that is not possible, and their summary.rst
+# is rewritten to refer to the new image names in a single pass.
+
 import sys
 import os
 import re
+import json
+import sqlite3
 import argparse
+import multiprocessing
 from shutil import copyfile
 from datetime import datetime
 from os import path
 
+import dats.report as report
+
+
+MANIFEST = 'manifest.json'
+
+
+def link_or_copy(src, dst):
+    """Hard-link src to dst, or copy it when they are on different file systems."""
+    if path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        copyfile(src, dst)
+
 
 def add_report(report_path, stitched_report_path, index):
+    """Add the images of a report to the stitched report.
+
+    Returns:
+        (str, dict). The summary.rst of the report with the names of the
+        images changed to those in the stitched report, and the content of
+        its summary.json, None if it has none.
+    """
     with open(report_path + "/summary.rst", 'r') as summary_file:
         summary_file_data = summary_file.read()
-    summary_file.close()
 
+    new_names = {}
     for file in os.listdir(report_path):
         if file.endswith(".png"):
             pre, ext = os.path.splitext(file)
-            old_image_name = file
-            new_image_name = pre + '.' + str(index) + ext
-            copyfile(report_path + '/' + old_image_name, stitched_report_path + '/' + new_image_name)
-            summary_file_data = summary_file_data.replace(old_image_name, new_image_name)
+            new_names[file] = pre + '.' + str(index) + ext
+            link_or_copy(report_path + '/' + file, stitched_report_path + '/' + new_names[file])
 
-    # Open and Append to Final
-    with open(stitched_report_path + "/summary.rst", "a") as stitched_report:
-        if (index > 0):
-            stitched_report.write("\n\n\n")
-        stitched_report.write(summary_file_data)
-    stitched_report.close()
+    if new_names:
+        # Longest names first, so a name that is part of another one does not
+        # match first
+        names = sorted(new_names, key=len, reverse=True)
+        pattern = re.compile('|'.join(re.escape(name) for name in names))
+        summary_file_data = pattern.sub(lambda m: new_names[m.group(0)], summary_file_data)
+
+    results = None
+    if path.isfile(report_path + "/summary.json"):
+        with open(report_path + "/summary.json", 'r') as json_file:
+            results = json.load(json_file)
+
+    return summary_file_data, results
+
+
+def _add_report(job):
+    return add_report(*job)
+
+
+def load_manifest(stitched_report_path):
+    """Return the reports already in the stitched report, in order."""
+    filename = stitched_report_path + '/' + MANIFEST
+    if not path.isfile(filename):
+        return []
+    with open(filename, 'r') as manifest_file:
+        return json.load(manifest_file)['reports']
+
+
+def write_sqlite(filename, reports, results):
+    """Write the results of the reports to an SQLite database.
+
+    Every test of every report is a row in table results, with the results
+    of the test as JSON, as in summary.json.
+    """
+    connection = sqlite3.connect(filename)
+    connection.execute("CREATE TABLE IF NOT EXISTS results ("
+            "report TEXT, idx INTEGER, test TEXT, results TEXT, "
+            "PRIMARY KEY (report, test))")
+    with connection:
+        for index, folder in enumerate(reports):
+            for test, test_results in results.get(folder, {}).items():
+                connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                        (folder, index, test, json.dumps(test_results)))
+    connection.close()
 
 
 def main():
@@ -71,7 +138,13 @@ def main():
 
     parser.add_argument('-r', '--report', default=datetime.now().strftime('dats-stitched-report-%Y%m%d_%H%M%S'),
                         metavar='DIRECTORY', dest='report_dir',
-                        help='Where to save the report. A new directory with timestamp in its name is created by default.')
+                        help='Where to save the report. A new directory with timestamp in its name is created by default. When it holds a stitched report already, only the new reports are added.')
+    parser.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help='Number of reports to prepare in parallel. Default: the number of CPUs.')
+    parser.add_argument('--json', action='store_true',
+                        help='Also combine the summary.json of all reports in summary.json, keyed by report directory.')
+    parser.add_argument('--sqlite', action='store_true',
+                        help='Also save the results of all reports in the SQLite database results.db.')
 
     args = parser.parse_args()
 
@@ -79,18 +152,50 @@ def main():
     if not os.path.exists(stitched_report_path):
         os.makedirs(stitched_report_path)
 
+    stitched = load_manifest(stitched_report_path)
+
     p = re.compile('^dats-report-[0-9]{8}[_][0-9]{6}', re.IGNORECASE)
-    folders = filter(path.isdir, os.listdir("."))
-    index = 0
+    folders = sorted(folder for folder in os.listdir(".")
+            if path.isdir(folder) and p.match(folder) and folder not in stitched)
+    jobs = [(folder, stitched_report_path, len(stitched) + i) for i, folder in enumerate(folders)]
     for folder in folders:
-        if (p.match(folder)):
-            print("Stitching Report " + folder + "...")
-            add_report(folder, stitched_report_path, index)
-            index += 1
+        print("Stitching Report " + folder + "...")
+
+    if len(jobs) > 1 and args.jobs > 1:
+        pool = multiprocessing.Pool(min(args.jobs, len(jobs)))
+        try:
+            added = pool.map(_add_report, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        added = map(_add_report, jobs)
+
+    # Open and Append to Final
+    with open(stitched_report_path + "/summary.rst", "a") as stitched_report:
+        for i, (summary_file_data, results) in enumerate(added):
+            if len(stitched) + i > 0:
+                stitched_report.write("\n\n\n")
+            stitched_report.write(summary_file_data)
+
+    results = {}
+    if path.isfile(stitched_report_path + '/summary.json'):
+        with open(stitched_report_path + '/summary.json', 'r') as json_file:
+            results = json.load(json_file)
+    for folder, (summary_file_data, report_results) in zip(folders, added):
+        if report_results is not None:
+            results[folder] = report_results
+
+    stitched += folders
+    if args.json:
+        report.write_file(stitched_report_path + '/summary.json', json.dumps(results))
+    if args.sqlite:
+        write_sqlite(stitched_report_path + '/results.db', stitched, results)
+    report.write_file(stitched_report_path + '/' + MANIFEST, json.dumps(dict(reports=stitched)))
 
     # Convert Final Output
-    os.system('rst2pdf ' + stitched_report_path + '/' + 'summary.rst ' + stitched_report_path + '/' + 'summary.pdf')
-    os.system('rst2html ' + stitched_report_path + '/' + 'summary.rst ' + stitched_report_path + '/' + 'summary.html')
+    if folders:
+        report.convert(stitched_report_path + '/' + 'summary.rst')
     print("Reports Stitched in '" + stitched_report_path + "/'")
 
 
@@ -108,31 +108,15 @@ class lw_AFTR(dats.test.binsearch.BinarySearch):
 
         self._step_delta = 5
         self._step_time = 0.5
+        # Packet loss (%) above which the next trial is set up from scratch
+        self._warm_max_loss = 1.0
 
     def teardown_class(self):
         pass
 
     def setup_test(self, pkt_size, speed):
-        # Calculate the target upload and download speed. The upload and
-        # download packets have different packet sizes, so in order to get
-        # equal bandwidth usage, the ratio of the speeds has to match the ratio
-        # of the packet sizes.
         cpe_pkt_size = pkt_size
         inet_pkt_size  = pkt_size - 40
-        ratio = 1.0 * (cpe_pkt_size + 20) / (inet_pkt_size + 20)
-
-        curr_up_speed = curr_down_speed = 0
-        max_up_speed = max_down_speed = speed
-        if ratio < 1:
-            max_down_speed = speed * ratio
-        else:
-            max_up_speed = speed / ratio
-
-        # Adjust speed when multiple cores per port are used to generate traffic
-        if len(self._cpe_ports) != len(self._cpe_cores):
-            max_down_speed *= 1.0 * len(self._cpe_ports) / len(self._cpe_cores)
-        if len(self._inet_ports) != len(self._inet_cores):
-            max_up_speed *= 1.0 * len(self._inet_ports) / len(self._inet_cores)
 
         # Initialize cores
         logging.verbose("Initializing tester")
@@ -164,6 +148,24 @@ class lw_AFTR(dats.test.binsearch.BinarySearch):
         # UDP length (byte 42): 42 for MAC(12), EthType(2), IP(20), UPD(8), CRC(4)
         self._tester.set_value(self._inet_cores, 38, inet_pkt_size - 38, 2)
 
+        self.ramp_up(pkt_size, 0, speed)
+
+    def change_rate(self, pkt_size, prev_speed, speed):
+        # The previous trial left the packet headers set up and flushed the
+        # NIC RX buffers. Only the speed needs to ramp from the previous speed
+        # to the new one.
+        self._tester.reset_stats()
+        self.ramp_up(pkt_size, min(prev_speed, speed), speed)
+
+    def warm_state_valid(self, pkt_size, trial):
+        # Heavy packet loss may leave the SUT in a state that affects the next
+        # trial, start from scratch then.
+        return trial[2] <= self._warm_max_loss
+
+    def ramp_up(self, pkt_size, start_speed, speed):
+        curr_up_speed, curr_down_speed = self.target_speeds(pkt_size, start_speed)
+        max_up_speed, max_down_speed = self.target_speeds(pkt_size, speed)
+
         self._tester.set_speed(self._inet_cores, curr_up_speed)
         self._tester.set_speed(self._cpe_cores, curr_down_speed)
 
@@ -187,6 +189,29 @@ class lw_AFTR(dats.test.binsearch.BinarySearch):
             sleep(self._step_time)
         logging.verbose("Target speeds reached. Starting real test.")
 
+    def target_speeds(self, pkt_size, speed):
+        # Calculate the target upload and download speed. The upload and
+        # download packets have different packet sizes, so in order to get
+        # equal bandwidth usage, the ratio of the speeds has to match the ratio
+        # of the packet sizes.
+        cpe_pkt_size = pkt_size
+        inet_pkt_size  = pkt_size - 40
+        ratio = 1.0 * (cpe_pkt_size + 20) / (inet_pkt_size + 20)
+
+        max_up_speed = max_down_speed = speed
+        if ratio < 1:
+            max_down_speed = speed * ratio
+        else:
+            max_up_speed = speed / ratio
+
+        # Adjust speed when multiple cores per port are used to generate traffic
+        if len(self._cpe_ports) != len(self._cpe_cores):
+            max_down_speed *= 1.0 * len(self._cpe_ports) / len(self._cpe_cores)
+        if len(self._inet_ports) != len(self._inet_cores):
+            max_up_speed *= 1.0 * len(self._inet_ports) / len(self._inet_cores)
+
+        return max_up_speed, max_down_speed
+
     def run_test(self, pkt_size, duration, value):
         # Tester is sending packets at the required speed already after
         # setup_test(). Just get the current statistics, sleep the required
@@ -195,7 +220,7 @@ class lw_AFTR(dats.test.binsearch.BinarySearch):
         # Getting statistics to calculate PPS at right speed....
         tsc_hz = self._tester.hz()
         rx_start, tx_start, tsc_start = self._tester.tot_stats()
-        sleep(duration)
+        aborted = self.measurement_window(duration, lambda: self._tester.rx_stats(self._all_stats_cores)[:2])
         # Get stats before stopping the cores. Stopping cores takes some time
         # and might skew results otherwise.
         rx_stop, tx_stop, tsc_stop = self._tester.tot_stats()
@@ -221,4 +246,4 @@ class lw_AFTR(dats.test.binsearch.BinarySearch):
         can_be_lost = int(tx_tot * float(config.getOption('toleratedLoss')) / 100.0)
         logging.verbose("RX: %d; TX: %d; drop: %d; TX-RX: %d (tolerated: %d)", rx_tot, tx_tot, drop_tot, tx_tot - rx_tot, can_be_lost)
 
-        return (tx_tot - rx_tot <= can_be_lost), mpps, 100.0*(tx_tot - rx_tot)/float(tx_tot)
+        return (not aborted and tx_tot - rx_tot <= can_be_lost), mpps, 100.0*(tx_tot - rx_tot)/float(tx_tot)